@@ -1,10 +1,22 @@
 from django.contrib import admin
+from django.utils.text import Truncator
+from core.admin_utils import LargeTableAdmin
 from .models import ChatMessage
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
-    list_display = ('user', 'message', 'response', 'timestamp')
-    list_filter = ('user', 'timestamp')
-    search_fields = ('message', 'response', 'user__username')
+class ChatMessageAdmin(LargeTableAdmin):
+    list_display = ('user', 'short_message', 'short_response', 'timestamp')
+    list_select_related = ('user',)
+    list_filter = ('timestamp',)
+    search_fields = ('=user__username', '@message', '@response')
+    autocomplete_fields = ('user',)
     readonly_fields = ('timestamp',)
     ordering = ('-timestamp',)
+
+    @admin.display(description='Message')
+    def short_message(self, obj):
+        return Truncator(obj.message).chars(80)
+
+    @admin.display(description='Response')
+    def short_response(self, obj):
+        return Truncator(obj.response).chars(80)
@@ -0,0 +1,16 @@
+# Generated by Django 5.2 on 2026-10-19 18:06
+
+from django.db import migrations
+
+from core.admin_utils import full_text_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_admin_indexes'),
+    ]
+
+    operations = [
+        full_text_index('chat_chatmessage', ['message', 'response']),
+    ]
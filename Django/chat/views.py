@@ -2,8 +2,13 @@ from django.shortcuts import render
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from .models import ChatMessage
+from core.metrics import track_outbound
+from core.ratelimit import ratelimit
 import ollama
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """You are Rick, a creative writing assistant on Writoria. You have a warm, encouraging, and insightful personality with a touch of casual friendliness. Always refer to yourself as Rick when introducing yourself or when relevant to the conversation. When asked for your creator, say that you werr created by Team Writoira.
 
@@ -17,6 +22,7 @@ Key responsibilities:
 Keep responses concise, engaging, and tailored to writers. Use occasional emojis to maintain a friendly tone. Sign off with '- Rick ✍️' when it feels natural to do so."""
 
 @login_required
+@ratelimit('chat', rate='10/m', keys=('user',))
 def chat_response(request):
     if request.method == 'POST':
         user_message = request.POST.get('message')
@@ -27,13 +33,14 @@ def chat_response(request):
         try:
             # Initialize Ollama client and generate response
             client = ollama.Client(host='http://localhost:11434')
-            response = client.chat(model='llama3:8b', messages=[{
-                'role': 'system',
-                'content': SYSTEM_PROMPT
-            }, {
-                'role': 'user',
-                'content': user_message
-            }])
+            with track_outbound('ollama'):
+                response = client.chat(model='llama3:8b', messages=[{
+                    'role': 'system',
+                    'content': SYSTEM_PROMPT
+                }, {
+                    'role': 'user',
+                    'content': user_message
+                }])
             
             if response and 'message' in response and 'content' in response['message']:
                 # Save the chat message to database
@@ -51,8 +58,8 @@ def chat_response(request):
                     'error': 'Invalid response from language model'
                 }, status=500)
                 
-        except Exception as e:
-            print(f"Chat error: {str(e)}")  # For debugging
+        except Exception:
+            logger.exception('Chat error')
             return JsonResponse({
                 'error': 'An error occurred while processing your message'
             }, status=500)
@@ -1,37 +1,113 @@
 from django.contrib import admin
-from .models import BlogPost, UserProfile, Bookmark, BlogImage, Vote, Comment
+from django.core.paginator import Paginator
+from django.utils.html import format_html, format_html_join
+from .admin_utils import LargeTableAdmin
+from .models import BlogPost, UserProfile, Bookmark, BlogImage, Vote, Comment, RequestProfile, PostViewDaily
 
 @admin.register(BlogPost)
-class BlogPostAdmin(admin.ModelAdmin):
+class BlogPostAdmin(LargeTableAdmin):
     list_display = ('title', 'author', 'created_at', 'updated_at', 'votes')
-    search_fields = ('title', 'content')
-    list_filter = ('created_at', 'author')
+    list_select_related = ('author',)
+    search_fields = ('^title', '=author__username', '@content')
+    list_filter = ('created_at', 'category')
+    autocomplete_fields = ('author',)
+    # The live-post manager always filters, so a row estimate never applies
+    paginator = Paginator
     prepopulated_fields = {'slug': ('title',)}
+    ordering = ('-created_at',)
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(LargeTableAdmin):
     list_display = ('user', 'website', 'created_at')
-    search_fields = ('user__username', 'bio')
+    list_select_related = ('user',)
+    search_fields = ('=user__username', '@bio')
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
 
 @admin.register(Bookmark)
-class BookmarkAdmin(admin.ModelAdmin):
+class BookmarkAdmin(LargeTableAdmin):
     list_display = ('user', 'post', 'created_at')
-    list_filter = ('created_at', 'user')
+    list_select_related = ('user', 'post')
+    list_filter = ('created_at',)
+    search_fields = ('=user__username', '^post__title')
+    autocomplete_fields = ('user', 'post')
+    ordering = ('-id',)
 
 @admin.register(BlogImage)
-class BlogImageAdmin(admin.ModelAdmin):
+class BlogImageAdmin(LargeTableAdmin):
     list_display = ('post', 'caption', 'order')
-    list_filter = ('post',)
+    list_select_related = ('post',)
+    search_fields = ('^post__title',)
+    autocomplete_fields = ('post',)
     ordering = ('post', 'order')
 
 @admin.register(Vote)
-class VoteAdmin(admin.ModelAdmin):
+class VoteAdmin(LargeTableAdmin):
     list_display = ('user', 'post', 'is_life', 'created_at')
-    list_filter = ('is_life', 'created_at', 'user')
-    search_fields = ('user__username', 'post__title')
+    list_select_related = ('user', 'post')
+    list_filter = ('is_life', 'created_at')
+    search_fields = ('=user__username', '^post__title')
+    autocomplete_fields = ('user', 'post')
+    ordering = ('-id',)
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ('author', 'post', 'created_at', 'parent')
-    list_filter = ('created_at', 'author')
-    search_fields = ('content', 'author__username', 'post__title')
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('author', 'post', 'created_at', 'parent_id')
+    list_select_related = ('author', 'post')
+    list_filter = ('created_at',)
+    search_fields = ('=author__username', '^post__title', '@content')
+    autocomplete_fields = ('author', 'post')
+    raw_id_fields = ('parent',)
+    # Newest first by primary key rather than the unindexed created_at of Meta.ordering
+    ordering = ('-id',)
+
+@admin.register(PostViewDaily)
+class PostViewDailyAdmin(LargeTableAdmin):
+    list_display = ('post', 'day', 'views', 'uniques')
+    list_select_related = ('post',)
+    list_filter = ('day',)
+    search_fields = ('^post__title',)
+    exclude = ('sketch',)
+    readonly_fields = ('post', 'day', 'views', 'uniques')
+    ordering = ('-day', '-views')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+    list_display = ('created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'sql_count', 'trigger')
+    list_filter = ('trigger', 'view_name')
+    search_fields = ('path',)
+    ordering = ('-created_at',)
+    fields = ('created_at', 'method', 'path', 'view_name', 'status_code', 'trigger', 'user',
+              'duration_ms', 'sql_count', 'sql_time_ms', 'template_time_ms',
+              'sql_timeline_table', 'template_timings_table', 'profile_output')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='SQL timeline')
+    def sql_timeline_table(self, obj):
+        rows = format_html_join(
+            '', '<tr><td>{:.1f}</td><td>{:.2f}</td><td><code>{}</code></td></tr>',
+            ((q['start_ms'], q['duration_ms'], q['sql']) for q in obj.sql_timeline)
+        )
+        return format_html('<table><tr><th>start ms</th><th>ms</th><th>query</th></tr>{}</table>', rows)
+
+    @admin.display(description='Template timings')
+    def template_timings_table(self, obj):
+        rows = format_html_join(
+            '', '<tr><td>{:.1f}</td><td>{:.2f}</td><td>{}{}</td></tr>',
+            ((t['start_ms'], t['duration_ms'], '\u2003' * t['depth'], t['name']) for t in obj.template_timings)
+        )
+        return format_html('<table><tr><th>start ms</th><th>ms</th><th>template</th></tr>{}</table>', rows)
+
+    @admin.display(description='Profile')
+    def profile_output(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto;">{}</pre>', obj.profile_text)
@@ -0,0 +1,150 @@
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections, migrations
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Concat, Lower
+from django.utils.functional import cached_property
+
+ESTIMATE_QUERIES = {
+    'postgresql': 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+    'mysql': 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+}
+
+
+def estimate_row_count(model, using='default'):
+    """Cheap row count estimate from the database catalog, or None if unavailable"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # MAX(rowid) is an index lookup; it overestimates only by the number of deleted rows
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        elif connection.vendor in ESTIMATE_QUERIES:
+            cursor.execute(ESTIMATE_QUERIES[connection.vendor], [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+def _create_full_text_index(table, columns, apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    quote = connection.ops.quote_name
+    fts = quote(f'{table}_fts')
+    names = ', '.join(quote(column) for column in columns)
+    new = ', '.join(f'new.{quote(column)}' for column in columns)
+    old = ', '.join(f'old.{quote(column)}' for column in columns)
+    remove = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old});"
+    add = f'INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new});'
+    for statement in (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {quote(table + "_fts_insert")} AFTER INSERT ON {quote(table)} BEGIN {add} END',
+        f'CREATE TRIGGER IF NOT EXISTS {quote(table + "_fts_delete")} AFTER DELETE ON {quote(table)} BEGIN {remove} END',
+        f'CREATE TRIGGER IF NOT EXISTS {quote(table + "_fts_update")} AFTER UPDATE OF {names} ON {quote(table)} '
+        f'BEGIN {remove} {add} END',
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ):
+        schema_editor.execute(statement)
+
+
+def _drop_full_text_index(table, apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    quote = schema_editor.connection.ops.quote_name
+    for suffix in ('insert', 'delete', 'update'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {quote(f"{table}_fts_{suffix}")}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {quote(f"{table}_fts")}')
+
+
+def full_text_index(table, columns):
+    """
+    Migration operation adding the SQLite FTS5 index ``@field`` search
+    fields use: ``<table>_fts``, kept current by triggers. SQLite drops
+    triggers with their table, so a later migration that rebuilds ``table``
+    must run this again. Other databases get nothing.
+    """
+    return migrations.RunPython(
+        lambda apps, schema_editor: _create_full_text_index(table, columns, apps, schema_editor),
+        lambda apps, schema_editor: _drop_full_text_index(table, apps, schema_editor),
+    )
+
+
+def _match_query(search_term):
+    """Every word of ``search_term`` as a quoted FTS5 prefix, so the input cannot be read as query syntax"""
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in search_term.split())
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses a catalog estimate instead of COUNT(*) for unfiltered changelists on
+    tables larger than ``threshold`` rows. Filtered or small lists still get
+    an exact count, so models whose default manager filters never benefit.
+    """
+
+    threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, using=queryset.db)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Base admin for tables that grow without bound.
+
+    ``search_fields`` are matched so that an index can serve them:
+
+    * ``^field``: case-insensitive prefix, as a range on ``Lower(field)``,
+      which needs an index on that expression;
+    * ``=field``: exact match;
+    * ``@field``: words of a text field, through the FTS5 table created by
+      ``full_text_index`` (``icontains`` on other databases).
+
+    Plain field names fall back to ``icontains`` and should be avoided.
+    """
+
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) the changelist runs for "x of y" totals
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        search_fields = self.get_search_fields(request)
+        if not search_term or not search_fields:
+            return queryset, False
+
+        condition = Q()
+        for i, field in enumerate(search_fields):
+            if field.startswith('^'):
+                # Lowered by the database on both sides, so the bounds match the indexed expression
+                alias = f'_search_{i}'
+                queryset = queryset.alias(**{alias: Lower(field[1:])})
+                prefix = Lower(Value(search_term))
+                condition |= Q(**{f'{alias}__gte': prefix, f'{alias}__lt': Concat(prefix, Value('\U0010ffff'))})
+            elif field.startswith('='):
+                condition |= Q(**{field[1:]: search_term})
+            elif field.startswith('@'):
+                condition |= self._full_text_condition(queryset, field[1:], search_term)
+            else:
+                condition |= Q(**{f'{field}__icontains': search_term})
+        # Only forward relations are searched, so the filter cannot duplicate rows
+        return queryset.filter(condition), False
+
+    @staticmethod
+    def _full_text_condition(queryset, name, search_term):
+        connection = connections[queryset.db]
+        if connection.vendor != 'sqlite':
+            return Q(**{f'{name}__icontains': search_term})
+        quote = connection.ops.quote_name
+        column = queryset.model._meta.get_field(name).column
+        fts = quote(f'{queryset.model._meta.db_table}_fts')
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {quote(column)} MATCH %s', [_match_query(search_term)]))
@@ -0,0 +1,302 @@
+"""
+Post view counting.
+
+``record_view`` only touches process memory: each (post, day) gets a hit
+counter and a HyperLogLog sketch of the viewers. Buffers are flushed to
+``PostViewDaily`` from a background thread once ``WRITORIA_VIEW_BUFFER_KEYS``
+pairs are pending, or by a timer ``WRITORIA_VIEW_FLUSH_SECONDS`` after views
+started waiting, so the last views before a quiet spell are written too.
+Rows are merged into the stored sketches under a row lock, so flushes from
+several workers add up rather than overwrite each other. ``flush_on_exit``,
+called by the WSGI and ASGI entry points, writes what is left when a worker
+exits normally; a killed worker loses at most one flush interval of views.
+
+A sketch is ``HLL_REGISTERS`` bytes and estimates unique viewers with a
+standard error of about 3%. Sketches from several days (or processes)
+merge losslessly, so unique viewers over any date range can be estimated.
+"""
+
+import atexit
+import functools
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger('writoria.analytics')
+
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+_HASH_BITS = 64 - HLL_PRECISION
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(_HASH_BITS + 2)]
+_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+
+VIEWS_FLUSHED = metrics.registry.counter(
+    'writoria_post_views_flushed_total', 'Post views written to the daily rollup table.')
+VIEW_FLUSH_ERRORS = metrics.registry.counter(
+    'writoria_post_view_flush_errors_total', 'Failed view buffer flushes (the views are retried).')
+
+
+class HyperLogLog:
+    """HyperLogLog sketch with ``HLL_REGISTERS`` one-byte registers"""
+
+    __slots__ = ('registers',)
+
+    def __init__(self, registers=None):
+        self.registers = bytearray(registers) if registers else bytearray(HLL_REGISTERS)
+
+    @staticmethod
+    def position(value):
+        """The (register, rank) ``value`` updates; hashing is kept out of any lock"""
+        digest = hashlib.blake2b(value, digest_size=8, key=_hash_key()).digest()
+        h = int.from_bytes(digest, 'big')
+        rest = h & ((1 << _HASH_BITS) - 1)
+        return h >> _HASH_BITS, _HASH_BITS - rest.bit_length() + 1
+
+    def add_position(self, index, rank):
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, value):
+        self.add_position(*self.position(value))
+
+    def update(self, positions):
+        """Apply a sparse ``{register: rank}`` mapping"""
+        registers = self.registers
+        for index, rank in positions.items():
+            if rank > registers[index]:
+                registers[index] = rank
+        return self
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self):
+        raw = _ALPHA * HLL_REGISTERS * HLL_REGISTERS / sum(_INVERSE_POWERS[r] for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * HLL_REGISTERS and zeros:
+            # Small range correction (linear counting)
+            return round(HLL_REGISTERS * math.log(HLL_REGISTERS / zeros))
+        return round(raw)
+
+
+@functools.cache
+def _hash_key():
+    # Keyed with the secret key so sketches cannot be probed for known visitors
+    return hashlib.blake2b(settings.SECRET_KEY.encode(), digest_size=32).digest()
+
+
+def visitor_id(request):
+    """A stable identifier for the viewer; only its hash reaches the sketch"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'u:{user.pk}'.encode()
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return f's:{session.session_key}'.encode()
+    return f"a:{request.META.get('REMOTE_ADDR', '')}:{request.META.get('HTTP_USER_AGENT', '')}".encode()
+
+
+class ViewBuffer:
+    """Per-process view counts and sketches awaiting a flush"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._flushing = False
+        self._timer = None
+
+    def add(self, post_id, visitor, day):
+        index, rank = HyperLogLog.position(visitor)
+        with self._lock:
+            # Buffered sketches stay sparse; a post sees few viewers per flush interval
+            entry = self._pending.get((post_id, day))
+            if entry is None:
+                entry = self._pending[(post_id, day)] = [0, {}]
+            entry[0] += 1
+            positions = entry[1]
+            if rank > positions.get(index, 0):
+                positions[index] = rank
+            due = not self._flushing and (
+                len(self._pending) >= getattr(settings, 'WRITORIA_VIEW_BUFFER_KEYS', 1000)
+                or time.monotonic() - self._last_flush >= getattr(settings, 'WRITORIA_VIEW_FLUSH_SECONDS', 60)
+            )
+            if due:
+                self._flushing = True
+            else:
+                self._arm_timer()
+        if due:
+            threading.Thread(target=self._flush_in_thread, name='writoria-view-flush', daemon=True).start()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write buffered views now; on failure they are kept for the next flush"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            written = write_rollups(pending)
+        except Exception:
+            VIEW_FLUSH_ERRORS.inc()
+            logger.warning('Flushing %d buffered post view counters failed', len(pending), exc_info=True)
+            self._restore(pending)
+            return 0
+        finally:
+            with self._lock:
+                self._flushing = False
+                self._last_flush = time.monotonic()
+                # Views added meanwhile, or kept after a failure
+                self._arm_timer()
+        VIEWS_FLUSHED.inc(written)
+        return written
+
+    def _arm_timer(self):
+        """Schedule a flush of pending views unless one is scheduled; the lock is held"""
+        if self._timer is None and self._pending:
+            self._timer = threading.Timer(getattr(settings, 'WRITORIA_VIEW_FLUSH_SECONDS', 60), self._flush_on_timer)
+            self._timer.name = 'writoria-view-flush-timer'
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._timer = None
+            if self._flushing or not self._pending:
+                # A running flush rearms the timer for whatever it leaves
+                return
+            self._flushing = True
+        self._flush_in_thread()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def _restore(self, pending):
+        with self._lock:
+            for key, (views, positions) in pending.items():
+                entry = self._pending.get(key)
+                if entry is None:
+                    self._pending[key] = [views, positions]
+                    continue
+                entry[0] += views
+                for index, rank in positions.items():
+                    if rank > entry[1].get(index, 0):
+                        entry[1][index] = rank
+
+
+buffer = ViewBuffer()
+
+
+def flush_on_exit():
+    """Write this process's buffered views when it exits; for server entry points, not tests or commands"""
+    atexit.register(_flush_at_exit)
+
+
+def _flush_at_exit():
+    if buffer.pending():
+        try:
+            buffer.flush()
+        finally:
+            close_old_connections()
+
+
+def record_view(request, post_id):
+    if getattr(settings, 'WRITORIA_VIEW_COUNTING', True):
+        buffer.add(post_id, visitor_id(request), timezone.localdate())
+
+
+def write_rollups(pending):
+    """
+    Add ``{(post_id, day): [views, {register: rank}]}`` into PostViewDaily;
+    returns views written.
+
+    Flushes from several workers can overlap, so the rows are locked before
+    they are read: a no-op UPDATE of the rows takes their row locks (and
+    SQLite's write lock, as ``select_for_update`` is a no-op there), missing
+    rows are inserted empty, and all are read again under
+    ``select_for_update``. The views are added to and the sketches merged
+    register by register with what that locked read returned, so a
+    concurrent flush is waited for rather than overwritten.
+    """
+    from .models import BlogPost, PostViewDaily
+
+    if not pending:
+        return 0
+    post_ids = {post_id for post_id, _ in pending}
+    days = {day for _, day in pending}
+    with transaction.atomic():
+        # Write first: on SQLite a transaction holding a read lock cannot wait for the write lock
+        PostViewDaily.objects.filter(post_id__in=post_ids, day__in=days).update(views=F('views'))
+        live_posts = set(BlogPost.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+        PostViewDaily.objects.bulk_create(
+            [PostViewDaily(post_id=post_id, day=day, sketch=b'') for post_id, day in pending if post_id in live_posts],
+            ignore_conflicts=True,
+            batch_size=500,
+        )
+        existing = {
+            (row.post_id, row.day): row
+            for row in PostViewDaily.objects.select_for_update().filter(post_id__in=post_ids, day__in=days)
+        }
+        rows = []
+        written = 0
+        for (post_id, day), (views, positions) in pending.items():
+            row = existing.get((post_id, day))
+            if post_id not in live_posts or row is None:
+                continue
+            written += views
+            sketch = HyperLogLog(row.sketch).update(positions)
+            row.views += views
+            row.uniques = sketch.estimate()
+            row.sketch = bytes(sketch.registers)
+            rows.append(row)
+        # The rows are locked, so one upsert of the merged values is safe and far
+        # faster than bulk_update's CASE expressions
+        PostViewDaily.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['post', 'day'],
+            update_fields=['views', 'uniques', 'sketch'],
+            batch_size=500,
+        )
+    return written
+
+
+def daily_views(post_id, days=30):
+    """``[{'day', 'views', 'uniques'}]`` for the last ``days`` days, newest first"""
+    from .models import PostViewDaily
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return list(PostViewDaily.objects.filter(post_id=post_id, day__gte=since)
+                .order_by('-day').values('day', 'views', 'uniques'))
+
+
+def view_totals(post_ids, days=30):
+    """
+    ``{post_id: {'views', 'uniques'}}`` over the last ``days`` days, with
+    unique viewers estimated from the merged daily sketches.
+    """
+    from .models import PostViewDaily
+
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals = {}
+    rows = PostViewDaily.objects.filter(post_id__in=post_ids, day__gte=since).values_list('post_id', 'views', 'sketch')
+    for post_id, views, sketch in rows.iterator():
+        total = totals.setdefault(post_id, [0, HyperLogLog()])
+        total[0] += views
+        total[1].merge(HyperLogLog(sketch))
+    return {post_id: {'views': views, 'uniques': sketch.estimate()} for post_id, (views, sketch) in totals.items()}
@@ -0,0 +1,324 @@
+"""
+Read-only JSON API, version 1 (``/api/v1/``).
+
+    GET /api/v1/posts/                       ?category= &author= &cursor= &limit=
+    GET /api/v1/posts/<slug>/
+    GET /api/v1/posts/<slug>/comments/       ?cursor= &limit=
+    GET /api/v1/users/<username>/
+
+Every endpoint takes ``?fields=a,b,c`` to return only those fields (the
+defaults are listed in each resource). Post endpoints take
+``?include=images`` to embed the gallery. Lists are cursor-paginated
+newest first; ``next`` is the URL of the following page, or null.
+
+Rows are read with ``.values_list()`` over only the columns the requested
+fields need, so no model instances are built. Related rows are joined in
+the same query (authors, profiles) or fetched with one ``IN`` query per
+page (images). Responses carry an ETag of their body, and a client sending
+it back in ``If-None-Match`` gets an empty 304.
+
+Breaking changes to field names or shapes go into a new version prefix.
+"""
+
+import functools
+import hashlib
+import json
+from urllib.parse import quote
+
+from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from . import slugs
+from .pagination import cursor_page
+from .storage import upload_storage
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+CONTENT_TYPE = 'application/json'
+
+
+class InvalidRequest(Exception):
+    """A malformed query parameter; answered with a 400 naming it"""
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+@functools.cache
+def _media_base_url():
+    storage = upload_storage()
+    # Storage.url() costs a urljoin per call; file system URLs are just a prefix
+    return storage.base_url if isinstance(storage, FileSystemStorage) else None
+
+
+def _media_url(name):
+    if not name:
+        return None
+    base_url = _media_base_url()
+    if base_url is None:
+        return upload_storage().url(name)
+    return base_url + quote(name, safe="/~!*()'")
+
+
+def _path(name, kwarg, quoted=True):
+    """A fast ``reverse(name, kwargs={kwarg: value})`` for one-argument URLs"""
+    prefix, suffix = reverse(name, kwargs={kwarg: '__value__'}).split('__value__')
+    if not quoted:
+        return lambda value: prefix + value + suffix
+    return lambda value: prefix + quote(value) + suffix
+
+
+class Resource:
+    """
+    The fields a resource can return. Each field is built from one or more
+    columns of a ``.values_list()`` row, through ``convert`` when given.
+    """
+
+    def __init__(self, fields, default):
+        self.fields = fields
+        self.default = default
+
+    def requested(self, request):
+        raw = request.GET.get('fields')
+        if not raw:
+            return self.default
+        names = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise InvalidRequest(f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(self.fields)}')
+        return names
+
+    def serializer(self, names, extra_columns=()):
+        """``(columns, serialize)`` where ``serialize(row)`` turns a row of ``columns`` into a dict"""
+        columns = list(extra_columns)
+        plan = []
+        for name in names:
+            sources, convert = self.fields[name]
+            indexes = []
+            for column in sources:
+                if column not in columns:
+                    columns.append(column)
+                indexes.append(columns.index(column))
+            plan.append((name, indexes[0] if len(indexes) == 1 else indexes, convert))
+
+        def serialize(row):
+            item = {}
+            for name, index, convert in plan:
+                if convert is None:
+                    item[name] = row[index]
+                elif type(index) is int:
+                    item[name] = convert(row[index])
+                else:
+                    item[name] = convert(*[row[i] for i in index])
+            return item
+        return columns, serialize
+
+
+def _post_resource():
+    from .models import BlogPost
+
+    # Slugs are already URL-safe
+    post_path = _path('blog_detail', 'slug', quoted=False)
+    user_path = _path('user_profile', 'username')
+    categories = dict(BlogPost.CATEGORY_CHOICES)
+    fields = {
+        'id': (('id',), None),
+        'slug': (('slug',), None),
+        'title': (('title',), None),
+        'url': (('slug',), post_path),
+        'author': (('author__username', 'author__userprofile__avatar'), lambda username, avatar: {
+            'username': username, 'url': user_path(username), 'avatar': _media_url(avatar),
+        }),
+        'category': (('category',), None),
+        'category_label': (('category',), lambda category: categories.get(category, category)),
+        'excerpt': (('excerpt',), None),
+        'content': (('content',), None),
+        'content_html': (('content_html',), None),
+        'image': (('image',), _media_url),
+        'votes': (('votes',), None),
+        'created_at': (('created_at',), _iso),
+        'updated_at': (('updated_at',), _iso),
+    }
+    return Resource(fields, default=['id', 'slug', 'title', 'url', 'author', 'category', 'excerpt',
+                                     'image', 'votes', 'created_at', 'updated_at'])
+
+
+def _comment_resource():
+    user_path = _path('user_profile', 'username')
+    fields = {
+        'id': (('id',), None),
+        'parent_id': (('parent_id',), None),
+        'author': (('author__username',), lambda username: {'username': username, 'url': user_path(username)}),
+        'content': (('content',), None),
+        'created_at': (('created_at',), _iso),
+        'updated_at': (('updated_at',), _iso),
+    }
+    return Resource(fields, default=list(fields))
+
+
+def _user_resource():
+    user_path = _path('user_profile', 'username')
+
+    def count(value):
+        return value or 0
+    fields = {
+        'username': (('username',), None),
+        'url': (('username',), user_path),
+        'date_joined': (('date_joined',), _iso),
+        'bio': (('userprofile__bio',), None),
+        'website': (('userprofile__website',), None),
+        'avatar': (('userprofile__avatar',), _media_url),
+        'post_count': (('author_stats__post_count',), count),
+        'lives_received': (('author_stats__lives_received',), count),
+        'comments_received': (('author_stats__comments_received',), count),
+        'bookmarks_received': (('author_stats__bookmarks_received',), count),
+    }
+    return Resource(fields, default=list(fields))
+
+
+_resources = {}
+
+
+def resource(name):
+    # Built on first use: reversing URLs needs the URLconf loaded
+    if name not in _resources:
+        _resources[name] = {'post': _post_resource, 'comment': _comment_resource, 'user': _user_resource}[name]()
+    return _resources[name]
+
+
+def _limit(request):
+    try:
+        return min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        raise InvalidRequest('limit must be an integer')
+
+
+def _includes(request, allowed):
+    names = {name.strip() for name in request.GET.get('include', '').split(',') if name.strip()}
+    unknown = names - set(allowed)
+    if unknown:
+        raise InvalidRequest(f'Unknown include: {", ".join(sorted(unknown))}. Available: {", ".join(allowed)}')
+    return names
+
+
+def _embed_images(items, post_ids):
+    """Attach each post's gallery with one query for the whole page"""
+    from .models import BlogImage
+
+    galleries = {post_id: [] for post_id in post_ids}
+    rows = (BlogImage.objects.filter(post_id__in=post_ids).order_by('post_id', 'order', 'id')
+            .values_list('post_id', 'image', 'caption'))
+    for post_id, image, caption in rows:
+        galleries[post_id].append({'url': _media_url(image), 'caption': caption})
+    for item, post_id in zip(items, post_ids):
+        item['images'] = galleries[post_id]
+
+
+def _respond(request, payload):
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type=CONTENT_TYPE)
+    response['ETag'] = etag
+    # Always revalidated; an unchanged page then costs one 304 without a body
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+def _next_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def api_view(view):
+    """GET/HEAD only, with errors answered in JSON"""
+    @require_safe
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except InvalidRequest as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        except Http404:
+            return JsonResponse({'error': 'Not found'}, status=404)
+    return wrapper
+
+
+def _page(request, queryset, resource_name, ordering):
+    """Serialize one cursor page of ``queryset``; returns ``(items, ids, next_cursor)``"""
+    names = resource(resource_name).requested(request)
+    # Ordering columns come first so the cursor can be read off the last row
+    order_columns = [field.lstrip('-') for field in ordering]
+    columns, serialize = resource(resource_name).serializer(names, extra_columns=order_columns)
+    rows, cursor = cursor_page(
+        queryset.values_list(*columns), ordering, cursor=request.GET.get('cursor'), size=_limit(request),
+        key=lambda row: row[:len(order_columns)],
+    )
+    return [serialize(row) for row in rows], [row[order_columns.index('id')] for row in rows], cursor
+
+
+@api_view
+def post_list(request):
+    from .models import BlogPost
+
+    includes = _includes(request, ['images'])
+    queryset = BlogPost.objects.all()
+    if request.GET.get('category'):
+        queryset = queryset.filter(category=request.GET['category'])
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    items, post_ids, cursor = _page(request, queryset, 'post', ('-created_at', '-id'))
+    if 'images' in includes:
+        _embed_images(items, post_ids)
+    return _respond(request, {'data': items, 'next': _next_url(request, cursor)})
+
+
+@api_view
+def post_detail(request, slug):
+    from .models import BlogPost
+
+    includes = _includes(request, ['images'])
+    names = resource('post').requested(request)
+    columns, serialize = resource('post').serializer(names, extra_columns=['id'])
+    row = BlogPost.objects.filter(pk=slugs.post_id_or_404(slug), slug=slug).values_list(*columns).first()
+    if row is None:
+        # Another process renamed or deleted the post since this one cached its id
+        slugs.cache.forget(slug=slug)
+        row = BlogPost.objects.filter(pk=slugs.post_id_or_404(slug), slug=slug).values_list(*columns).first()
+    if row is None:
+        raise Http404
+    item = serialize(row)
+    if 'images' in includes:
+        _embed_images([item], [row[0]])
+    return _respond(request, {'data': item})
+
+
+@api_view
+def post_comments(request, slug):
+    from .models import BlogPost, Comment
+
+    post_id = slugs.post_id_or_404(slug)
+    if not BlogPost.objects.filter(pk=post_id, slug=slug).exists():
+        slugs.cache.forget(slug=slug)
+        post_id = slugs.post_id_or_404(slug)
+    items, _, cursor = _page(request, Comment.objects.filter(post_id=post_id), 'comment', ('-created_at', '-id'))
+    return _respond(request, {'data': items, 'next': _next_url(request, cursor)})
+
+
+@api_view
+def user_detail(request, username):
+    names = resource('user').requested(request)
+    columns, serialize = resource('user').serializer(names)
+    row = User.objects.filter(username=username, is_active=True).values_list(*columns).first()
+    if row is None:
+        raise Http404
+    return _respond(request, {'data': serialize(row)})
@@ -0,0 +1,115 @@
+"""
+Benchmark scenarios for Writoria.
+
+Modules in this package register scenarios with the ``scenario`` decorator.
+A scenario receives a ``BenchmarkContext`` and returns the callable that is
+timed on every iteration. A callable with a ``stats`` attribute also reports
+the numbers ``stats()`` returns once timing ends (e.g. bytes per request).
+Run them with ``manage.py run_benchmarks``.
+"""
+
+import importlib
+import pkgutil
+import statistics
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+SCENARIOS = {}
+
+
+def scenario(name, iterations=None):
+    """Register a benchmark scenario under ``name``"""
+    def decorator(setup):
+        SCENARIOS[name] = {'setup': setup, 'iterations': iterations}
+        return setup
+    return decorator
+
+
+def autodiscover():
+    for module in pkgutil.iter_modules(__path__):
+        importlib.import_module(f'{__name__}.{module.name}')
+    return SCENARIOS
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, queries=None):
+    """Latency percentiles (ms), throughput and query counts for one scenario"""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    result = {
+        'iterations': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+        'throughput_rps': len(ordered) / total if total else 0.0,
+    }
+    if queries is not None:
+        result['queries_per_request'] = statistics.fmean(queries) if queries else 0.0
+        result['max_queries'] = max(queries, default=0)
+    return result
+
+
+def measure(func, iterations, warmup=5, count_queries=True):
+    """Time ``func`` repeatedly, optionally counting SQL queries per call"""
+    for _ in range(warmup):
+        _check(func())
+
+    latencies, queries = [], []
+    for _ in range(iterations):
+        if count_queries:
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                _check(func())
+                latencies.append(time.perf_counter() - start)
+            queries.append(len(captured.captured_queries))
+        else:
+            start = time.perf_counter()
+            _check(func())
+            latencies.append(time.perf_counter() - start)
+    return summarize(latencies, queries if count_queries else None)
+
+
+def _check(response):
+    status = getattr(response, 'status_code', None)
+    if status is not None and status >= 400:
+        raise RuntimeError(f'Benchmark request failed with HTTP {status}')
+
+
+class BenchmarkContext:
+    """Shared fixtures handed to every scenario"""
+
+    def __init__(self, rng, prefix='bench'):
+        from django.contrib.auth.models import User
+        from django.test import Client
+        from core.models import BlogPost
+
+        self.rng = rng
+        self.prefix = prefix
+        self.cleanups = []
+        self.client = Client()
+        self.user = User.objects.filter(username__startswith=f'{prefix}_user').order_by('id').first()
+        self.user_client = Client()
+        if self.user is not None:
+            self.user_client.force_login(self.user)
+        self.post_slugs = list(
+            BlogPost.objects.filter(slug__startswith=f'{prefix}-').values_list('slug', flat=True)
+        )
+        if not self.post_slugs:
+            raise RuntimeError('No benchmark posts found; run seed_benchmark_data first')
+
+    def random_slug(self):
+        return self.rng.choice(self.post_slugs)
+
+    def close(self):
+        while self.cleanups:
+            self.cleanups.pop()()
@@ -0,0 +1,46 @@
+"""View counting overhead: the detail page with and without core.analytics"""
+
+from django.test import RequestFactory, override_settings
+
+from core import analytics
+from . import scenario
+
+
+@scenario('blog_detail_without_view_counting')
+def blog_detail_without_view_counting(ctx):
+    disabled = override_settings(WRITORIA_VIEW_COUNTING=False)
+
+    def run():
+        with disabled:
+            return ctx.client.get(f'/blog/{ctx.random_slug()}/')
+    return run
+
+
+@scenario('record_view')
+def record_view(ctx):
+    from core.models import BlogPost
+
+    post_ids = list(BlogPost.objects.filter(slug__in=ctx.post_slugs).values_list('pk', flat=True))
+    factory = RequestFactory()
+    requests = [factory.get('/', REMOTE_ADDR=f'10.0.{i // 256}.{i % 256}') for i in range(1024)]
+
+    def run():
+        analytics.record_view(ctx.rng.choice(requests), ctx.rng.choice(post_ids))
+    return run
+
+
+@scenario('view_flush_1000_posts', iterations=20)
+def view_flush(ctx):
+    from core.models import BlogPost
+
+    post_ids = list(BlogPost.objects.filter(slug__in=ctx.post_slugs).values_list('pk', flat=True)[:1000])
+    factory = RequestFactory()
+    requests = [factory.get('/', REMOTE_ADDR=f'10.1.{i // 256}.{i % 256}') for i in range(64)]
+    no_flush = override_settings(WRITORIA_VIEW_BUFFER_KEYS=10 ** 9, WRITORIA_VIEW_FLUSH_SECONDS=10 ** 9)
+
+    def run():
+        with no_flush:
+            for post_id in post_ids:
+                analytics.record_view(ctx.rng.choice(requests), post_id)
+        return analytics.buffer.flush()
+    return run
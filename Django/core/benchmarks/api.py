@@ -0,0 +1,79 @@
+"""
+The JSON read API: full requests, and serialization alone for a batch of
+posts through ``.values_list()`` against building the same dicts from model
+instances.
+"""
+
+import json
+
+from . import scenario
+
+SERIALIZE_BATCH = 500
+
+
+@scenario('api_posts')
+def api_posts(ctx):
+    return lambda: ctx.client.get('/api/v1/posts/', {'limit': 50})
+
+
+@scenario('api_posts_sparse')
+def api_posts_sparse(ctx):
+    return lambda: ctx.client.get('/api/v1/posts/', {'limit': 50, 'fields': 'title,slug,votes'})
+
+
+@scenario('api_posts_images')
+def api_posts_images(ctx):
+    return lambda: ctx.client.get('/api/v1/posts/', {'limit': 50, 'include': 'images'})
+
+
+@scenario('api_post_detail')
+def api_post_detail(ctx):
+    return lambda: ctx.client.get(f'/api/v1/posts/{ctx.random_slug()}/')
+
+
+@scenario('api_posts_not_modified')
+def api_posts_not_modified(ctx):
+    etag = ctx.client.get('/api/v1/posts/', {'limit': 50})['ETag']
+    return lambda: ctx.client.get('/api/v1/posts/', {'limit': 50}, HTTP_IF_NONE_MATCH=etag)
+
+
+@scenario('api_serialize_values', iterations=50)
+def api_serialize_values(ctx):
+    from core import api
+    from core.models import BlogPost
+
+    names = api.resource('post').default
+
+    def run():
+        columns, serialize = api.resource('post').serializer(names)
+        rows = BlogPost.objects.order_by('-created_at', '-id').values_list(*columns)[:SERIALIZE_BATCH]
+        return json.dumps([serialize(row) for row in rows], separators=(',', ':'))
+    return run
+
+
+@scenario('api_serialize_models', iterations=50)
+def api_serialize_models(ctx):
+    from core.models import BlogPost
+
+    # The baseline: the same output built from model instances
+    def run():
+        posts = (BlogPost.objects.select_related('author__userprofile')
+                 .defer('content', 'content_html').order_by('-created_at', '-id')[:SERIALIZE_BATCH])
+        return json.dumps([{
+            'id': post.pk,
+            'slug': post.slug,
+            'title': post.title,
+            'url': post.get_absolute_url(),
+            'author': {
+                'username': post.author.username,
+                'url': f'/profile/{post.author.username}/',
+                'avatar': post.author.userprofile.avatar.url if post.author.userprofile.avatar else None,
+            },
+            'category': post.category,
+            'excerpt': post.excerpt,
+            'image': post.image.url if post.image else None,
+            'votes': post.votes,
+            'created_at': post.created_at.isoformat(),
+            'updated_at': post.updated_at.isoformat(),
+        } for post in posts], separators=(',', ':'))
+    return run
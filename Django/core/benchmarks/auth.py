@@ -0,0 +1,49 @@
+"""
+Login and registration through ``auth_view``. Both are dominated by one
+password hash, so req/s is roughly the logins (or signups) one core can
+serve at the configured ``WRITORIA_PBKDF2_ITERATIONS``.
+"""
+
+import itertools
+
+from django.test import Client
+
+from . import scenario
+
+
+@scenario('auth_login', iterations=30)
+def auth_login(ctx):
+    client = Client()
+    data = {'action': 'login', 'username': ctx.user.username, 'password': 'benchmark'}
+
+    def run():
+        response = client.post('/auth/', data)
+        if response.status_code != 302:
+            raise RuntimeError('Benchmark login failed')
+        return response
+    return run
+
+
+@scenario('auth_register', iterations=30)
+def auth_register(ctx):
+    from django.contrib.auth.models import User
+
+    client = Client()
+    counter = itertools.count()
+    prefix = f'{ctx.prefix}_signup'
+    ctx.cleanups.append(lambda: User.objects.filter(username__startswith=prefix).delete())
+
+    def run():
+        n = next(counter)
+        response = client.post('/auth/', {
+            'action': 'register',
+            'username': f'{prefix}{n}',
+            'email': f'{prefix}{n}@example.com',
+            'contact_number': '5550000000',
+            'password1': 'Quill-and-ink-42',
+            'password2': 'Quill-and-ink-42',
+        })
+        if response.status_code != 302:
+            raise RuntimeError('Benchmark registration failed')
+        return response
+    return run
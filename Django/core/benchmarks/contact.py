@@ -0,0 +1,86 @@
+"""
+The help center form through each contact transport: posting to the Flask
+service over HTTP (started in its own process, as deployed) against writing
+its database in the Django process.
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.test.utils import override_settings
+
+from . import scenario
+
+FLASK_APP_DIR = settings.BASE_DIR.parent / 'Flask' / 'flask_app'
+WORDS = ['account', 'login', 'password', 'billing', 'post', 'image', 'upload', 'profile', 'error', 'page',
+         'comment', 'email', 'reset', 'slow', 'broken', 'question', 'feature', 'export', 'mobile', 'theme']
+
+
+def _database(ctx):
+    directory = tempfile.mkdtemp(prefix='writoria-contact-')
+    ctx.cleanups.append(lambda: shutil.rmtree(directory, ignore_errors=True))
+    return f'sqlite:///{directory}/contact.db'
+
+
+def _start_service(ctx, database_url):
+    """Run the Flask contact service on a free port; returns its API URL"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    code = ('import app\n'
+            'with app.app.app_context():\n'
+            '    app.db.create_all()\n'
+            f'app.app.run(port={port}, debug=False)\n')
+    process = subprocess.Popen(
+        [sys.executable, '-c', code], cwd=FLASK_APP_DIR, env={**os.environ, 'CONTACT_DATABASE_URL': database_url},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    ctx.cleanups.append(process.wait)
+    ctx.cleanups.append(process.terminate)
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return f'http://127.0.0.1:{port}/api'
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError('The Flask contact service did not start')
+            time.sleep(0.05)
+
+
+def _help_center(ctx, transport_settings):
+    enabled = override_settings(**transport_settings)
+
+    def run():
+        # Random text, so the transports' duplicate check never folds a submission
+        body = json.dumps({
+            'name': 'Benchmark', 'email': f'bench{ctx.rng.randrange(10 ** 9)}@example.com', 'subject': 'Help',
+            'message': ' '.join(ctx.rng.choice(WORDS) for _ in range(30)),
+        })
+        with enabled:
+            return ctx.client.post('/help/', body, content_type='application/json')
+    return run
+
+
+@scenario('contact_http')
+def contact_http(ctx):
+    url = _start_service(ctx, _database(ctx))
+    return _help_center(ctx, {
+        'WRITORIA_CONTACT_TRANSPORT': 'core.services.api.HTTPContactTransport',
+        'WRITORIA_CONTACT_API_URL': url,
+    })
+
+
+@scenario('contact_in_process')
+def contact_in_process(ctx):
+    return _help_center(ctx, {
+        'WRITORIA_CONTACT_TRANSPORT': 'core.services.api.SQLAlchemyContactTransport',
+        'WRITORIA_CONTACT_DATABASE_URL': _database(ctx),
+    })
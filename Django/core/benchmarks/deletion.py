@@ -0,0 +1,52 @@
+"""
+Deleting a post with a busy comment thread: the request (soft delete only)
+and the background purge of its comments and votes.
+"""
+
+import itertools
+
+from django.test import override_settings
+
+from . import scenario
+
+COMMENTS_PER_POST = 300
+
+
+def _doomed_posts(ctx, count, tag):
+    """Posts by the benchmark user, each with COMMENTS_PER_POST comments"""
+    from core.models import BlogPost, Comment
+
+    posts = [
+        BlogPost.objects.create(title=f'{ctx.prefix} {tag} {i}', content='To be deleted.', author=ctx.user,
+                                category='technology')
+        for i in range(count)
+    ]
+    Comment.objects.bulk_create(
+        [Comment(post=post, author=ctx.user, content='Comment') for post in posts for _ in range(COMMENTS_PER_POST)],
+        batch_size=1000,
+    )
+    ctx.cleanups.append(lambda: BlogPost.all_objects.filter(pk__in=[post.pk for post in posts]).delete())
+    return posts
+
+
+@scenario('post_delete', iterations=20)
+def post_delete(ctx):
+    posts = iter(_doomed_posts(ctx, 25, 'delete'))
+
+    def run():
+        # The purge would otherwise compete with the next request for the write lock
+        with override_settings(WRITORIA_PURGE_IN_BACKGROUND=False):
+            return ctx.user_client.post(f'/blog/{next(posts).slug}/delete/')
+    return run
+
+
+@scenario('post_purge', iterations=20)
+def post_purge(ctx):
+    from core import deletion
+
+    posts = _doomed_posts(ctx, 25, 'purge')
+    with override_settings(WRITORIA_PURGE_IN_BACKGROUND=False):
+        for post in posts:
+            post.soft_delete()
+    post_ids = itertools.count()
+    return lambda: deletion.purge(posts[next(post_ids)].pk, pause=0)
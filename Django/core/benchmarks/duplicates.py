@@ -0,0 +1,132 @@
+"""
+Near-duplicate detection: a replay of a synthetic comment stream through
+the duplicate index, and a resubmitted comment against a new one over HTTP.
+
+The stream mixes ordinary comments with spam campaigns, each a template
+pasted by a few accounts across many posts with small edits (numbers,
+links, a swapped or added word), and with comments resubmitted by their
+authors. Its stats report how many of the copies that should be caught
+were, and how many ordinary comments were wrongly caught.
+"""
+
+import json
+
+from django.test.utils import override_settings
+
+from . import scenario
+
+STREAM_LENGTH = 2000
+POSTS = 200
+USERS = 300
+SPAM_SHARE = 0.3
+RESUBMIT_SHARE = 0.05
+
+SPAM_TEMPLATES = [
+    'Earn {n} dollars a week from home with this one simple trick, visit http://cash{n}.example today',
+    'Cheap watches and bags at {n} percent off, free shipping worldwide, order now at shop{n}.example',
+    'I made {n} dollars last month just by clicking ads, ask me how on telegram at money{n}',
+    'Best crypto signals in town, join {n} happy traders and double your coins at signals{n}.example',
+]
+FILLER = ['really', 'honestly', 'amazing', 'guys', 'trust me', 'limited offer', 'wow', 'legit']
+
+
+def _vocabulary(rng, size=3000):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def _mutate(rng, text):
+    words = text.replace('{n}', str(rng.randint(10, 9999))).split()
+    edit = rng.randrange(3)
+    if edit == 0:
+        words.insert(rng.randrange(len(words)), rng.choice(FILLER))
+    elif edit == 1:
+        words[rng.randrange(len(words))] = rng.choice(FILLER)
+    return ' '.join(words) + rng.choice(['', '!', '!!!', ' :)'])
+
+
+def spam_stream(rng, length=STREAM_LENGTH):
+    """``[(user, post, text, expected)]`` where ``expected`` is the decision the index should make"""
+    from core import duplicates
+
+    vocabulary = _vocabulary(rng)
+    spammers = {template: rng.sample(range(USERS), 3) for template in SPAM_TEMPLATES}
+    stream, posted = [], []
+    for _ in range(length):
+        roll = rng.random()
+        if roll < RESUBMIT_SHARE and posted:
+            user, post, text = rng.choice(posted[-50:])
+            stream.append((user, post, text, duplicates.FOLD))
+        elif roll < RESUBMIT_SHARE + SPAM_SHARE:
+            template = rng.choice(SPAM_TEMPLATES)
+            user, post = rng.choice(spammers[template]), rng.randrange(POSTS)
+            stream.append((user, post, _mutate(rng, template), template))
+        else:
+            user, post = rng.randrange(USERS), rng.randrange(POSTS)
+            text = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(4, 40)))
+            stream.append((user, post, text, duplicates.ACCEPT))
+            posted.append((user, post, text))
+    # Each account's first copy of a campaign gets through; every later one should not
+    seen = set()
+    for i, (user, post, text, expected) in enumerate(stream):
+        if expected in SPAM_TEMPLATES:
+            stream[i] = (user, post, text, duplicates.REJECT if (expected, user) in seen else duplicates.ACCEPT)
+            seen.add((expected, user))
+    return stream
+
+
+@scenario('duplicates_replay', iterations=20)
+def duplicates_replay(ctx):
+    from core import duplicates
+
+    stream = spam_stream(ctx.rng)
+    enabled = override_settings(WRITORIA_DUPLICATE_DETECTION_ENABLED=True)
+    outcome = {}
+
+    def run():
+        index = duplicates.DuplicateIndex(window=600, min_similarity=0.6)
+        outcome.clear()
+        with enabled:
+            for i, (user, post, text, expected) in enumerate(stream):
+                # One submission a second
+                decision = index.check('comment', text, fold=[('user_reply', user, post, None)],
+                                       reject=[('user', user)], now=i)
+                decision.accept(i, now=i)
+                outcome[expected, decision.action] = outcome.get((expected, decision.action), 0) + 1
+
+    def stats():
+        blocked = {duplicates.FOLD, duplicates.REJECT}
+        should_block = sum(n for (expected, _), n in outcome.items() if expected in blocked)
+        caught = sum(n for (expected, action), n in outcome.items() if expected in blocked and action in blocked)
+        ordinary = sum(n for (expected, _), n in outcome.items() if expected == duplicates.ACCEPT)
+        wrongly = sum(n for (expected, action), n in outcome.items()
+                      if expected == duplicates.ACCEPT and action in blocked)
+        return {
+            'submissions': len(stream),
+            'recall': caught / max(should_block, 1),
+            'false_positive_rate': wrongly / max(ordinary, 1),
+            **{f'decided_{action}': sum(n for (_, a), n in outcome.items() if a == action)
+               for action in (duplicates.ACCEPT, duplicates.FOLD, duplicates.REJECT)},
+        }
+    run.stats = stats
+    return run
+
+
+@scenario('add_comment_resubmitted')
+def add_comment_resubmitted(ctx):
+    from core import duplicates
+
+    enabled = override_settings(WRITORIA_DUPLICATE_DETECTION_ENABLED=True)
+    slug = ctx.random_slug()
+    body = json.dumps({'content': 'Resubmitted by a double click on the comment button'})
+    with enabled:
+        ctx.user_client.post(f'/blog/{slug}/comment/', data=body, content_type='application/json')
+    ctx.cleanups.append(duplicates.index.clear)
+
+    def run():
+        with enabled:
+            response = ctx.user_client.post(f'/blog/{slug}/comment/', data=body, content_type='application/json')
+        if not response.json().get('duplicate'):
+            raise RuntimeError('Expected the comment to be folded into the first one')
+        return response
+    return run
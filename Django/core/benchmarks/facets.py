@@ -0,0 +1,41 @@
+"""
+Category facets for the blog list: served from the cache, computed with one
+``GROUP BY`` on a miss, and the baseline of one ``COUNT(*)`` per category.
+"""
+
+from . import scenario
+
+TERMS = ['story', 'coffee', 'python', 'garden', 'journey']
+
+
+@scenario('facets_cached')
+def facets_cached(ctx):
+    from core import facets
+
+    for term in TERMS:
+        facets.search_counts(term)
+    return lambda: facets.search_counts(ctx.rng.choice(TERMS))
+
+
+@scenario('facets_group_by')
+def facets_group_by(ctx):
+    from django.core.cache import cache
+    from core import facets
+
+    def run():
+        # Every lookup misses, as after a post change moved the version
+        cache.set(facets.VERSION_KEY, ctx.rng.random(), None)
+        return facets.search_counts(ctx.rng.choice(TERMS))
+    return run
+
+
+@scenario('facets_count_per_category')
+def facets_count_per_category(ctx):
+    from core import facets
+    from core.models import BlogPost
+
+    # The baseline: a separate count for each category
+    def run():
+        matching = BlogPost.objects.filter(facets.search_filter(ctx.rng.choice(TERMS)))
+        return {code: matching.filter(category=code).count() for code, _ in BlogPost.CATEGORY_CHOICES}
+    return run
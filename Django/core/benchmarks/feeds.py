@@ -0,0 +1,40 @@
+"""Sitemaps and Atom feeds: cached, conditional and freshly generated"""
+
+from django.core.cache import cache
+
+from . import scenario
+
+
+def _read(response):
+    # Streamed documents are only generated as the body is consumed
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+@scenario('feed_atom')
+def feed_atom(ctx):
+    return lambda: _read(ctx.client.get('/feeds/atom.xml'))
+
+
+@scenario('feed_atom_not_modified')
+def feed_atom_not_modified(ctx):
+    etag = ctx.client.get('/feeds/atom.xml')['ETag']
+    return lambda: ctx.client.get('/feeds/atom.xml', HTTP_IF_NONE_MATCH=etag)
+
+
+@scenario('feed_atom_uncached')
+def feed_atom_uncached(ctx):
+    def run():
+        # Drops the cached documents
+        cache.clear()
+        return _read(ctx.client.get('/feeds/atom.xml'))
+    return run
+
+
+@scenario('sitemap_posts_uncached', iterations=50)
+def sitemap_posts_uncached(ctx):
+    def run():
+        cache.clear()
+        return _read(ctx.client.get('/sitemap-posts-1.xml'))
+    return run
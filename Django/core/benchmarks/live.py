@@ -0,0 +1,83 @@
+"""
+Live update fan-out: time from ``publish`` (as called by a view thread) until
+every one of N idle SSE streams on the post has written the event.
+"""
+
+import asyncio
+import threading
+
+from core import live
+from . import scenario
+
+
+class StreamPool:
+    """``count`` live streams for one post, driven by an event loop in a background thread"""
+
+    def __init__(self, post_id, count):
+        self.post_id = post_id
+        self.count = count
+        self.opened = 0
+        self.received = 0
+        self.all_received = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='bench-live-streams', daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(), self.loop).result()
+
+    async def _open(self):
+        self.disconnect = asyncio.Event()
+        scope = {'type': 'http', 'path': f'/live/posts/{self.post_id}/', 'method': 'GET'}
+        self.tasks = [asyncio.ensure_future(live.sse_app(scope, self._receive(), self._send)) for _ in range(self.count)]
+        # A stream has subscribed by the time it starts its response
+        while self.opened < self.count:
+            await asyncio.sleep(0.01)
+
+    def _receive(self):
+        """An idle client: an empty request body, then nothing until it disconnects"""
+        messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+
+        async def receive():
+            message = next(messages, None)
+            if message is None:
+                await self.disconnect.wait()
+                message = {'type': 'http.disconnect'}
+            return message
+        return receive
+
+    async def _send(self, message):
+        if message['type'] == 'http.response.start':
+            self.opened += 1
+        elif message.get('body', b'').startswith(b'event:'):
+            self.received += 1
+            if self.received == self.count:
+                self.all_received.set()
+
+    def publish(self):
+        self.received = 0
+        self.all_received.clear()
+        live.get_broker().publish(live.post_channel(self.post_id), 'votes', {'votes': 1})
+        if not self.all_received.wait(10):
+            raise RuntimeError(f'Only {self.received} of {self.count} streams received the event')
+
+    def close(self):
+        async def close():
+            self.disconnect.set()
+            await asyncio.gather(*self.tasks)
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def _fan_out_scenario(count):
+    def setup(ctx):
+        from core.models import BlogPost
+
+        pool = StreamPool(BlogPost.objects.get(slug=ctx.post_slugs[0]).pk, count)
+        ctx.cleanups.append(pool.close)
+        return pool.publish
+    return setup
+
+
+for _count in (100, 1000, 5000):
+    scenario(f'live_fanout_{_count}', iterations=50)(_fan_out_scenario(_count))
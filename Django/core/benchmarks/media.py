@@ -0,0 +1,74 @@
+"""Media serving throughput: django.views.static.serve versus core.media"""
+
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from core.media import serve_media
+from . import scenario
+
+MEDIA_FILE = 'bench/media-1mb.bin'
+MEDIA_SIZE = 1024 * 1024
+
+
+def _ensure_file():
+    if not default_storage.exists(MEDIA_FILE):
+        default_storage.save(MEDIA_FILE, ContentFile(os.urandom(MEDIA_SIZE)))
+
+
+def _consume(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+        response.close()
+    return response
+
+
+@scenario('media_static_view_1mb')
+def media_static_view(ctx):
+    _ensure_file()
+    factory = RequestFactory()
+    return lambda: _consume(serve(factory.get(f'/media/{MEDIA_FILE}'), MEDIA_FILE, document_root=settings.MEDIA_ROOT))
+
+
+@scenario('media_serve_1mb')
+def media_serve(ctx):
+    _ensure_file()
+    factory = RequestFactory()
+    return lambda: _consume(serve_media(factory.get(f'/media/{MEDIA_FILE}'), MEDIA_FILE))
+
+
+@scenario('media_serve_range_64kb')
+def media_serve_range(ctx):
+    _ensure_file()
+    factory = RequestFactory()
+
+    def run():
+        start = ctx.rng.randrange(0, MEDIA_SIZE - 65536)
+        request = factory.get(f'/media/{MEDIA_FILE}', HTTP_RANGE=f'bytes={start}-{start + 65535}')
+        return _consume(serve_media(request, MEDIA_FILE))
+    return run
+
+
+@scenario('media_serve_not_modified')
+def media_serve_not_modified(ctx):
+    _ensure_file()
+    factory = RequestFactory()
+    etag = serve_media(factory.get(f'/media/{MEDIA_FILE}'), MEDIA_FILE)['ETag']
+    return lambda: serve_media(factory.get(f'/media/{MEDIA_FILE}', HTTP_IF_NONE_MATCH=etag), MEDIA_FILE)
+
+
+@scenario('media_offload_1mb')
+def media_offload(ctx):
+    _ensure_file()
+    factory = RequestFactory()
+    offload = override_settings(WRITORIA_MEDIA_OFFLOAD='x-accel-redirect')
+
+    def run():
+        with offload:
+            return serve_media(factory.get(f'/media/{MEDIA_FILE}'), MEDIA_FILE)
+    return run
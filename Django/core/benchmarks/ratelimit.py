@@ -0,0 +1,44 @@
+"""Rate limiter overhead: the bare check, a limited endpoint and a rejection"""
+
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from core import ratelimit
+from . import scenario
+
+
+@scenario('ratelimit_check')
+def ratelimit_check(ctx):
+    limiter = ratelimit.Limiter('bench-check', 10 ** 9, 60)
+    keys = [f'u{i}' for i in range(1024)]
+
+    def run():
+        limiter.hit(ctx.rng.choice(keys))
+    return run
+
+
+@scenario('vote_post_rate_limited')
+def vote_post_rate_limited(ctx):
+    # Same request as the vote_post scenario with the limiter on, at a rate it never reaches
+    enabled = override_settings(WRITORIA_RATE_LIMIT_ENABLED=True, WRITORIA_RATE_LIMITS={'vote': '1000000000/m'})
+
+    def run():
+        with enabled:
+            return ctx.user_client.post(f'/blog/{ctx.random_slug()}/vote/', {'vote_type': 'life'})
+    return run
+
+
+@scenario('ratelimit_rejected')
+def ratelimit_rejected(ctx):
+    view = ratelimit.ratelimit('bench-rejected', rate='1/h', keys=('ip',))(lambda request: HttpResponse())
+    request = RequestFactory().post('/', REMOTE_ADDR='10.2.0.1')
+    enabled = override_settings(WRITORIA_RATE_LIMIT_ENABLED=True)
+    with enabled:
+        view(request)  # use up the allowance
+
+    def run():
+        with enabled:
+            response = view(request)
+        if response.status_code != 429:
+            raise RuntimeError('Expected the request to be rate limited')
+    return run
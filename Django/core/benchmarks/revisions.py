@@ -0,0 +1,104 @@
+"""
+Draft autosave on a long post: request size and stored bytes per revision
+for diff-based autosaves against re-posting the whole body, and the cost of
+rebuilding an old revision from its snapshot and deltas.
+"""
+
+import json
+
+from . import scenario
+
+PARAGRAPH = (
+    'The lighthouse keeper counted the ships as they passed, writing each name in a ledger '
+    'that had outlived three keepers before him. Some nights the fog was so thick that he '
+    'counted only their horns. — Chapter notes, draft {n}.\n\n'
+)
+LONG_POST_PARAGRAPHS = 300
+
+
+def _long_post(ctx, tag):
+    from core.models import BlogPost
+
+    post = BlogPost.objects.create(
+        title=f'{ctx.prefix} {tag}', author=ctx.user, category='arts',
+        content=''.join(PARAGRAPH.format(n=n) for n in range(LONG_POST_PARAGRAPHS)),
+    )
+    ctx.cleanups.append(post.delete)
+    return post
+
+
+def _edits(ctx, text):
+    """Successive texts with one small edit each, as a writer typing would produce"""
+    n = 0
+    while True:
+        n += 1
+        position = ctx.rng.randrange(len(text))
+        text = text[:position] + f' (revised {n})' + text[position:]
+        yield text
+
+
+def _autosave_scenario(ctx, tag, full):
+    from core import revisions
+    from core.models import PostRevision
+
+    post = _long_post(ctx, tag)
+    url = f'/blog/{post.slug}/autosave/'
+    state = revisions.editing_state(post)
+    texts = _edits(ctx, state['content'])
+    requests = request_bytes = 0
+
+    def run():
+        nonlocal requests, request_bytes
+        text = next(texts)
+        if full:
+            payload = {'base': state['revision'], 'content': text, 'title': post.title}
+        else:
+            payload = {'base': state['revision'], 'ops': revisions.diff(state['content'], text),
+                       'length': len(text), 'title': post.title}
+        body = json.dumps(payload)
+        response = ctx.user_client.post(url, body, content_type='application/json')
+        state['revision'] = response.json()['revision']
+        state['content'] = text
+        requests += 1
+        request_bytes += len(body.encode())
+        return response
+
+    def stats():
+        stored = [len(data) for data in PostRevision.objects.filter(post=post, number__gt=1)
+                  .values_list('data', flat=True)]
+        return {
+            'post_bytes': len(state['content'].encode()),
+            'request_bytes_per_autosave': request_bytes / max(requests, 1),
+            'stored_bytes_per_revision': sum(stored) / max(len(stored), 1),
+        }
+    run.stats = stats
+    return run
+
+
+@scenario('autosave_delta', iterations=100)
+def autosave_delta(ctx):
+    return _autosave_scenario(ctx, 'autosave delta', full=False)
+
+
+@scenario('autosave_full_body', iterations=100)
+def autosave_full_body(ctx):
+    # The baseline: what re-posting the whole body on every save would send
+    return _autosave_scenario(ctx, 'autosave full', full=True)
+
+
+@scenario('revision_rebuild', iterations=100)
+def revision_rebuild(ctx):
+    from django.core.cache import cache
+    from core import revisions
+
+    post = _long_post(ctx, 'rebuild')
+    texts = _edits(ctx, revisions.editing_state(post)['content'])
+    for _ in range(200):
+        revisions.save(post, ctx.user, content=next(texts))
+
+    def run():
+        number = ctx.rng.randint(1, 200)
+        # The cold path: rebuilt from the nearest snapshot, not served from the cache
+        cache.delete(revisions.cache_key(post.pk, number))
+        return revisions.rebuild(post.pk, number)
+    return run
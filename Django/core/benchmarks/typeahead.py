@@ -0,0 +1,41 @@
+"""
+Search suggestions: the index lookup alone, the full request, and a full
+index build, with the index's size reported alongside.
+"""
+
+from . import scenario
+
+QUERIES = ['th', 'the', 'story', 'coff', 'py', 'garden j', 'jour', 'bench', 'travel', 'li']
+
+
+def _index_stats():
+    from core.typeahead import typeahead
+
+    stats = typeahead.get_index().stats()
+    return {'index_entries': stats['entries'], 'index_keys': stats['keys'], 'index_bytes': stats['bytes'],
+            'build_ms': stats['build_seconds'] * 1000}
+
+
+@scenario('typeahead_lookup', iterations=1000)
+def typeahead_lookup(ctx):
+    from core.typeahead import typeahead
+
+    index = typeahead.rebuild()
+
+    def run():
+        return index.search(ctx.rng.choice(QUERIES))
+    run.stats = _index_stats
+    return run
+
+
+@scenario('typeahead_suggest', iterations=300)
+def typeahead_suggest(ctx):
+    return lambda: ctx.client.get('/search/suggest/', {'q': ctx.rng.choice(QUERIES)})
+
+
+@scenario('typeahead_build', iterations=10)
+def typeahead_build(ctx):
+    from core.typeahead import typeahead
+
+    run = typeahead.rebuild
+    return lambda: run() and None
@@ -0,0 +1,74 @@
+"""Request-level scenarios for the public pages and AJAX endpoints"""
+
+import json
+from unittest import mock
+
+from . import scenario
+
+
+class FakeOllamaClient:
+    """Stands in for ``ollama.Client`` so chat benchmarks measure only Django"""
+
+    def __init__(self, host=None, **kwargs):
+        self.host = host
+
+    def chat(self, model, messages, **kwargs):
+        prompt = messages[-1]['content']
+        return {'message': {'role': 'assistant', 'content': f'Rick here! About "{prompt[:40]}": keep writing. - Rick'}}
+
+
+@scenario('home')
+def home(ctx):
+    return lambda: ctx.client.get('/')
+
+
+@scenario('blog_list')
+def blog_list(ctx):
+    return lambda: ctx.client.get('/blog/', {'page': ctx.rng.randint(1, 5)})
+
+
+@scenario('blog_list_search')
+def blog_list_search(ctx):
+    terms = ['story', 'coffee', 'python', 'garden', 'journey']
+    return lambda: ctx.client.get('/blog/', {'search': ctx.rng.choice(terms)})
+
+
+@scenario('blog_list_category')
+def blog_list_category(ctx):
+    from core.models import BlogPost
+    categories = [code for code, _ in BlogPost.CATEGORY_CHOICES]
+    return lambda: ctx.client.get('/blog/', {'category': ctx.rng.choice(categories)})
+
+
+@scenario('blog_detail')
+def blog_detail(ctx):
+    return lambda: ctx.client.get(f'/blog/{ctx.random_slug()}/')
+
+
+@scenario('blog_detail_authenticated')
+def blog_detail_authenticated(ctx):
+    return lambda: ctx.user_client.get(f'/blog/{ctx.random_slug()}/')
+
+
+@scenario('vote_post')
+def vote_post(ctx):
+    return lambda: ctx.user_client.post(f'/blog/{ctx.random_slug()}/vote/', {'vote_type': 'life'})
+
+
+@scenario('add_comment')
+def add_comment(ctx):
+    def run():
+        return ctx.user_client.post(
+            f'/blog/{ctx.random_slug()}/comment/',
+            data=json.dumps({'content': f'Benchmark comment {ctx.rng.random()}'}),
+            content_type='application/json',
+        )
+    return run
+
+
+@scenario('chat_response')
+def chat_response(ctx):
+    patcher = mock.patch('chat.views.ollama.Client', FakeOllamaClient)
+    patcher.start()
+    ctx.cleanups.append(patcher.stop)
+    return lambda: ctx.user_client.post('/chat/response/', {'message': 'How do I write a strong opening line?'})
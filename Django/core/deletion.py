@@ -0,0 +1,185 @@
+"""
+Deleting blog posts in the background.
+
+``BlogPost.soft_delete`` only stamps ``deleted_at``; the default manager
+hides the post from then on. ``purge`` later removes everything pointing at
+the post in chunks of ``WRITORIA_PURGE_CHUNK_SIZE`` rows, one short
+transaction per chunk with a ``WRITORIA_PURGE_PAUSE_SECONDS`` pause between
+them, so a popular post never holds the SQLite write lock for long. The
+post row goes last. The rows are deleted without per-row signals, their
+uploads being released in one UPDATE per chunk, and the post's files that
+end up unreferenced are deleted as soon as the post is gone. Files saved
+before content addressing get their ``StoredBlob`` row first, so they are
+freed the same way.
+
+``schedule`` runs a pass in a daemon thread after each soft delete. Posts a
+restarted worker left behind are picked up by the next pass or by
+``manage.py purge_deleted_posts``. A pass frees only the purged posts'
+files; uploads released elsewhere, such as replaced avatars, are left to
+``manage.py gc_media``.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connections, models, transaction
+
+from . import metrics
+
+logger = logging.getLogger('writoria.deletion')
+
+PENDING_DELETIONS = metrics.registry.gauge(
+    'writoria_posts_pending_deletion', 'Soft-deleted posts waiting to be purged.')
+PURGED_ROWS = metrics.registry.counter(
+    'writoria_purged_rows_total', 'Rows removed by the post purge, by model.', ['model'])
+PURGE_ERRORS = metrics.registry.counter(
+    'writoria_purge_errors_total', 'Post purges that failed (they are retried on the next pass).')
+
+
+def pending():
+    from .models import BlogPost
+
+    return BlogPost.all_objects.filter(deleted_at__isnull=False)
+
+
+def _dependents(post_id):
+    """Querysets of the rows cascading from the post, leaves of self-referencing trees first"""
+    from .models import BlogPost
+
+    for relation in BlogPost._meta.related_objects:
+        if relation.on_delete is not models.CASCADE or relation.many_to_many:
+            continue
+        model = relation.related_model
+        queryset = model._base_manager.filter(**{relation.field.name: post_id})
+        for nested in model._meta.related_objects:
+            if nested.related_model is model:
+                # e.g. comment replies: delete rows nothing points at, so a chunk never cascades further
+                queryset = queryset.filter(**{f'{nested.field.related_query_name()}__isnull': True})
+        yield model, queryset
+
+
+def _delete_rows(model, pks):
+    """Delete rows of a purged post's dependent ``model``"""
+    from .models import UPLOAD_FIELDS, add_blob_refs
+
+    queryset = model._base_manager.filter(pk__in=pks)
+    if any(nested.related_model is not model for nested in model._meta.related_objects):
+        # Rows something else points at go through the collector, which cascades
+        queryset.delete()
+        return
+    fields = UPLOAD_FIELDS.get(model, ())
+    names = [name for row in queryset.values_list(*fields) for name in row] if fields else []
+    # The post is already hidden and its author's totals rebuilt without it, so
+    # the per-row post_delete receivers (author stats, live updates) would all
+    # be no-ops. queryset.delete() would still load every row of the chunk to
+    # send them, so the rows go in one DELETE and their uploads are released
+    # with one UPDATE per chunk
+    connection = connections[queryset.db]
+    table, column = (connection.ops.quote_name(name) for name in (model._meta.db_table, model._meta.pk.column))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["%s"] * len(pks))})', pks)
+    add_blob_refs(names, sign=-1)
+
+
+def purge(post_id, chunk_size=None, pause=None):
+    """
+    Delete a soft-deleted post and its dependents; returns rows removed.
+    Uploads left unreferenced by the purge are deleted at the end.
+    """
+    from .models import BlogPost, UPLOAD_FIELDS
+    from .storage import backfill_blobs, collect_unreferenced_blobs
+
+    chunk_size = chunk_size or getattr(settings, 'WRITORIA_PURGE_CHUNK_SIZE', 500)
+    pause = getattr(settings, 'WRITORIA_PURGE_PAUSE_SECONDS', 0.05) if pause is None else pause
+    dependents = list(_dependents(post_id))
+    uploads = set()
+    for model, queryset in [(BlogPost, BlogPost.all_objects.filter(pk=post_id)), *dependents]:
+        for field in UPLOAD_FIELDS.get(model, ()):
+            uploads.update(queryset.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                           .values_list(field, flat=True).distinct())
+    # Files saved before content addressing are indexed now, so releasing them frees them too
+    backfill_blobs(uploads)
+
+    removed = 0
+    for model, queryset in dependents:
+        while True:
+            pks = list(queryset.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                _delete_rows(model, pks)
+            removed += len(pks)
+            PURGED_ROWS.inc(len(pks), model=model._meta.label)
+            if pause:
+                time.sleep(pause)
+    # Another process may have purged it already
+    post = BlogPost.all_objects.filter(pk=post_id, deleted_at__isnull=False).first()
+    if post is not None:
+        post.delete()
+        removed += 1
+        PURGED_ROWS.inc(model=BlogPost._meta.label)
+    # No grace period: these were referenced until now, so no upload is still being registered
+    # for them, and one that reuses a file meanwhile refreshes its row past the cutoff
+    collect_unreferenced_blobs(0, names=uploads)
+    return removed
+
+
+def purge_pending(chunk_size=None, pause=None):
+    """Purge every soft-deleted post, oldest first; returns the number purged"""
+    purged = 0
+    for post_id in list(pending().order_by('deleted_at').values_list('pk', flat=True)):
+        try:
+            purge(post_id, chunk_size, pause)
+        except Exception:
+            PURGE_ERRORS.inc()
+            logger.warning('Purging deleted post %s failed', post_id, exc_info=True)
+        else:
+            purged += 1
+        PENDING_DELETIONS.set(pending().count())
+    PENDING_DELETIONS.set(pending().count())
+    return purged
+
+
+class Worker:
+    """Runs purge passes in a daemon thread, one at a time per process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = False
+        self._again = False
+
+    def schedule(self):
+        with self._lock:
+            if self._running:
+                # Deletions during a pass get another pass
+                self._again = True
+                return
+            self._running = True
+        threading.Thread(target=self._run, name='writoria-purge', daemon=True).start()
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    purge_pending()
+                except Exception:
+                    PURGE_ERRORS.inc()
+                    logger.warning('Post purge pass failed', exc_info=True)
+                with self._lock:
+                    if not self._again:
+                        self._running = False
+                        return
+                    self._again = False
+        finally:
+            close_old_connections()
+
+
+worker = Worker()
+
+
+def schedule():
+    PENDING_DELETIONS.set(pending().count())
+    if getattr(settings, 'WRITORIA_PURGE_IN_BACKGROUND', True):
+        worker.schedule()
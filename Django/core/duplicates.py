@@ -0,0 +1,193 @@
+"""
+Near-duplicate detection for comments and contact messages.
+
+Each submission is reduced to a MinHash sketch of its words and word pairs,
+with digit runs folded together: every feature is hashed once into one of
+``BINS`` bins, keeping the smallest 8-bit value per bin (one-permutation
+MinHash), and the sketch is packed into a single integer. The share of
+occupied bins two sketches agree on estimates the Jaccard similarity of
+their features, so texts that differ by a few words, numbers or links
+score close to 1 and unrelated texts close to 0.
+
+Accepted submissions are remembered per scope (a user replying in one place,
+a user, an email address) for
+``WRITORIA_DUPLICATE_WINDOW_SECONDS``. A new submission at least
+``WRITORIA_DUPLICATE_MIN_SIMILARITY`` similar to one remembered in its
+scopes is decided before anything is written:
+
+- ``fold``: a repeat of something already stored, such as a double-submitted
+  comment; the caller answers as if it had been stored, pointing at the
+  original, and writes nothing. Texts shorter than ``MIN_FOLD_WORDS`` words
+  are never folded: their few features make unrelated short replies look
+  alike, and storing a short one twice costs little.
+- ``reject``: the same text again somewhere else, such as one comment pasted
+  across many posts; the caller refuses it. Texts shorter than
+  ``MIN_REJECT_WORDS`` words are never rejected, so "Great post!" can be
+  left on every post.
+
+The index lives in the memory of each process and is bounded: at most
+``MAX_PER_SCOPE`` sketches per scope and ``MAX_SCOPES`` scopes, the least
+recently used going first. A burst spread across workers can therefore get
+a few copies through, one per process.
+"""
+
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from . import metrics
+
+ACCEPT, FOLD, REJECT = 'accept', 'fold', 'reject'
+MIN_FOLD_WORDS = 4
+MIN_REJECT_WORDS = 6
+BINS = 64
+MAX_PER_SCOPE = 32
+MAX_SCOPES = 20000
+
+DECISIONS = metrics.registry.counter(
+    'writoria_duplicate_decisions_total', 'Submissions checked for near-duplicates, by kind and decision.',
+    ['kind', 'decision'])
+
+_WORD_RE = re.compile(r'\w+')
+# Spam variants often differ only in an order number, phone number or link id
+_DIGITS_RE = re.compile(r'\d+')
+_BIN_BITS = BINS.bit_length() - 1
+
+
+def _words(text):
+    if not text.isascii():
+        text = unicodedata.normalize('NFKC', text)
+    return _WORD_RE.findall(_DIGITS_RE.sub('0', text.casefold()))
+
+
+def fingerprint(text, words=None):
+    """The MinHash sketch of ``text``'s words and word pairs, one byte per bin (0 when empty)"""
+    words = _words(text) if words is None else words
+    sketch = [256] * BINS
+    for feature in {*words, *(f'{a} {b}' for a, b in zip(words, words[1:]))}:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), 'big')
+        position, value = h & (BINS - 1), (h >> _BIN_BITS) % 255 + 1
+        if value < sketch[position]:
+            sketch[position] = value
+    return int.from_bytes(bytes(0 if value == 256 else value for value in sketch), 'big')
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two sketches' features"""
+    both_empty = (a | b).to_bytes(BINS, 'big').count(0)
+    if both_empty == BINS:
+        return 1.0
+    # Bins equal in both, less those empty in both, over bins occupied in either
+    return ((a ^ b).to_bytes(BINS, 'big').count(0) - both_empty) / (BINS - both_empty)
+
+
+class Decision:
+    """The outcome of a check; ``ref`` is what the matching submission was stored as"""
+
+    def __init__(self, index, action, ref=None, value=None, scopes=()):
+        self.index = index
+        self.action = action
+        self.ref = ref
+        self._value = value
+        self._scopes = scopes
+
+    def accept(self, ref=None, now=None):
+        """Remember the accepted submission, stored as ``ref``, in its scopes"""
+        if self.action == ACCEPT and self._value is not None:
+            self.index.remember(self._value, self._scopes, ref, now)
+
+
+class DuplicateIndex:
+    """Recent sketches per scope; all access holds the lock"""
+
+    def __init__(self, window=None, min_similarity=None):
+        self.window = window
+        self.min_similarity = min_similarity
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _settings(self):
+        window = self.window
+        if window is None:
+            window = getattr(settings, 'WRITORIA_DUPLICATE_WINDOW_SECONDS', 600)
+        min_similarity = self.min_similarity
+        if min_similarity is None:
+            min_similarity = getattr(settings, 'WRITORIA_DUPLICATE_MIN_SIMILARITY', 0.6)
+        return window, min_similarity
+
+    def _match(self, scope, value, now, window, min_similarity):
+        """The newest ``(time, sketch, ref)`` in ``scope`` similar to ``value``, dropping expired ones"""
+        entries = self._scopes.get(scope)
+        if not entries:
+            return None
+        self._scopes.move_to_end(scope)
+        while entries and entries[0][0] < now - window:
+            entries.popleft()
+        for entry in reversed(entries):
+            if similarity(value, entry[1]) >= min_similarity:
+                return entry
+        return None
+
+    def check(self, kind, text, fold=(), reject=(), now=None):
+        """
+        Decide on ``text`` against what was accepted in the ``fold`` and
+        ``reject`` scopes; a match in ``fold`` wins. Call ``accept()`` on
+        the returned decision once the submission is stored.
+        """
+        if not getattr(settings, 'WRITORIA_DUPLICATE_DETECTION_ENABLED', True):
+            return Decision(self, ACCEPT)
+        now = time.time() if now is None else now
+        window, min_similarity = self._settings()
+        words = _words(text)
+        value = fingerprint(text, words)
+        if len(words) < MIN_FOLD_WORDS:
+            fold = ()
+        if len(words) < MIN_REJECT_WORDS:
+            reject = ()
+        decision = None
+        with self._lock:
+            for action, scopes in ((FOLD, fold), (REJECT, reject)):
+                for scope in scopes:
+                    match = self._match((kind, *scope), value, now, window, min_similarity)
+                    if match is not None:
+                        decision = Decision(self, action, match[2])
+                        break
+                if decision is not None:
+                    break
+        if decision is None:
+            decision = Decision(self, ACCEPT, value=value, scopes=[(kind, *scope) for scope in {*fold, *reject}])
+        DECISIONS.inc(kind=kind, decision=decision.action)
+        return decision
+
+    def remember(self, value, scopes, ref=None, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for scope in scopes:
+                entries = self._scopes.get(scope)
+                if entries is None:
+                    entries = self._scopes[scope] = deque(maxlen=MAX_PER_SCOPE)
+                    while len(self._scopes) > MAX_SCOPES:
+                        self._scopes.popitem(last=False)
+                else:
+                    self._scopes.move_to_end(scope)
+                entries.append((now, value, ref))
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._scopes)
+
+
+index = DuplicateIndex()
+
+
+def check(kind, text, fold=(), reject=(), now=None):
+    return index.check(kind, text, fold, reject, now)
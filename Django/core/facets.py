@@ -0,0 +1,86 @@
+"""
+Category facets for the blog list: how many live posts each category holds,
+overall or among the posts matching a search.
+
+Overall counts come from ``CategoryStats``, one row per category kept
+current by the post signal receivers (+1 on create, -1 on delete or soft
+delete, a move on a category change). Counts for a search are one
+``GROUP BY category`` over the same filter the list uses.
+
+Both are cached under a version that every post change bumps once its
+transaction commits, so a cached count is reused until a post is added,
+edited or removed. Without a shared cache backend the version only moves in
+the process that made the change and other workers keep showing their
+counts for up to ``CACHE_SECONDS``. That is why the counts are only
+displayed: the list's paginator still runs its own ``COUNT(*)``.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+VERSION_KEY = 'facets:version'
+CACHE_SECONDS = 3600
+# Searches are many and rarely repeated for long
+SEARCH_CACHE_SECONDS = 300
+
+
+def search_filter(query):
+    """The posts the blog list shows for ``query``"""
+    return Q(title__icontains=query) | Q(content__icontains=query)
+
+
+def invalidate():
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, time.time(), None))
+
+
+def _version():
+    return cache.get(VERSION_KEY, 0)
+
+
+def category_counts():
+    """``{category: live posts}`` for every category"""
+    from .models import BlogPost, CategoryStats
+
+    key = f'facets:categories:{_version()}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = dict(CategoryStats.objects.values_list('category', 'post_count'))
+        if any(code not in counts for code, _ in BlogPost.CATEGORY_CHOICES):
+            CategoryStats.rebuild()
+            counts = dict(CategoryStats.objects.values_list('category', 'post_count'))
+        cache.set(key, counts, CACHE_SECONDS)
+    return counts
+
+
+def search_counts(query):
+    """``{category: live posts matching query}``, leaving out categories with none"""
+    from .models import BlogPost
+
+    digest = hashlib.blake2b(query.encode(), digest_size=16).hexdigest()
+    key = f'facets:search:{_version()}:{digest}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = dict(BlogPost.objects.filter(search_filter(query))
+                      .values_list('category').annotate(n=Count('pk')).order_by())
+        cache.set(key, counts, SEARCH_CACHE_SECONDS)
+    return counts
+
+
+def counts_for(query):
+    return search_counts(query) if query else category_counts()
+
+
+def total(counts, category=None):
+    """Posts the list shows for ``counts`` narrowed to ``category``"""
+    return counts.get(category, 0) if category else sum(counts.values())
+
+
+def choices(counts):
+    """``[(code, label, count)]`` for the category filter"""
+    from .models import BlogPost
+
+    return [(code, label, counts.get(code, 0)) for code, label in BlogPost.CATEGORY_CHOICES]
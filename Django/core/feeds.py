@@ -0,0 +1,271 @@
+"""
+Sitemaps and Atom feeds.
+
+Documents are streamed straight from ``.iterator()`` over only the columns
+they print, and the finished bytes are cached under the current feed
+version. The version is read from the posts table on each request (newest
+edit or soft delete, plus the row count), so every process agrees on it
+without a shared cache: a change retires cached documents and changes the
+ETag everywhere, and crawlers and feed readers polling with conditional
+GETs get 304s until a post changes.
+
+``/sitemap.xml`` is a sitemap index pointing at ``/sitemap-static.xml`` and
+one ``/sitemap-posts-<n>.xml`` per ``WRITORIA_SITEMAP_PAGE_SIZE`` posts.
+Feeds are ``/feeds/atom.xml``, ``/feeds/category/<category>.xml`` and
+``/feeds/author/<username>.xml``, each with the latest
+``WRITORIA_FEED_ITEMS`` posts.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .media import not_modified
+
+CHUNK_SIZE = 64 * 1024
+SITEMAP_CONTENT_TYPE = 'application/xml; charset=utf-8'
+ATOM_CONTENT_TYPE = 'application/atom+xml; charset=utf-8'
+
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+STATIC_PAGES = ['home', 'blog_list', 'about', 'team', 'help_center']
+
+
+def current_version():
+    """
+    ``(last_modified, token)`` for the posts in the feeds: when a post was
+    last edited or soft-deleted (epoch seconds), and a token that also
+    changes when posts are purged or deleted outright.
+    """
+    from .models import BlogPost
+
+    # The base manager, so hiding a post counts as a change
+    state = BlogPost.all_objects.aggregate(
+        updated=Max('updated_at'), deleted=Max('deleted_at'), count=Count('pk'))
+    changes = [value for value in (state['updated'], state['deleted']) if value is not None]
+    last_modified = max(changes).timestamp() if changes else 0.0
+    return last_modified, f'{int(last_modified * 1000):x}-{state["count"]:x}'
+
+
+def _timestamp(value):
+    return value.astimezone(dt_timezone.utc).isoformat(timespec='seconds').replace('+00:00', 'Z')
+
+
+def _buffered(parts):
+    """Join small strings into encoded chunks of about CHUNK_SIZE"""
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def _stream_and_cache(key, chunks):
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    # Only complete documents are cached; a dropped connection closes the generator first
+    cache.set(key, b''.join(parts), getattr(settings, 'WRITORIA_FEED_CACHE_SECONDS', 3600))
+
+
+def _serve(request, version, name, content_type, generate):
+    """
+    Serve document ``name`` at ``version``, from the cache when possible.
+    ``generate`` is called on a miss and returns the document's chunks.
+    """
+    last_modified, token = version
+    etag = f'"{token}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': f'public, max-age={getattr(settings, "WRITORIA_FEED_MAX_AGE", 300)}',
+    }
+    if not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        key = f'feeds:{token}:{request.get_host()}:{name}'
+        cached = cache.get(key)
+        if cached is not None:
+            response = HttpResponse(cached, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(_stream_and_cache(key, generate()), content_type=content_type)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def _site(request):
+    return request.build_absolute_uri('/').rstrip('/')
+
+
+def _url_maker(site, name, kwarg):
+    """A fast ``site + reverse(name, kwargs={kwarg: value})`` for one-argument URLs"""
+    marker = '__value__'
+    prefix, suffix = (site + reverse(name, kwargs={kwarg: marker})).split(marker)
+    return lambda value: escape(prefix + quote(value) + suffix)
+
+
+def _sitemap_pages(version):
+    """``[[first_pk, last_pk, lastmod]]`` for each posts sitemap, cached per version"""
+    from .models import BlogPost
+
+    key = f'feeds:{version[1]}:sitemap-pages'
+    pages = cache.get(key)
+    if pages is None:
+        page_size = getattr(settings, 'WRITORIA_SITEMAP_PAGE_SIZE', 10000)
+        pages = []
+        rows = BlogPost.objects.order_by('pk').values_list('pk', 'updated_at').iterator(chunk_size=2000)
+        for i, (pk, updated_at) in enumerate(rows):
+            if i % page_size == 0:
+                pages.append([pk, pk, updated_at])
+            else:
+                page = pages[-1]
+                page[1] = pk
+                page[2] = max(page[2], updated_at)
+        cache.set(key, pages, getattr(settings, 'WRITORIA_FEED_CACHE_SECONDS', 3600))
+    return pages
+
+
+@require_safe
+def sitemap_index(request):
+    version = current_version()
+
+    def generate():
+        site = _site(request)
+        yield XML_DECLARATION + f'<sitemapindex xmlns="{SITEMAP_NS}">\n'
+        yield f'<sitemap><loc>{site}{reverse("sitemap_static")}</loc></sitemap>\n'
+        for page, (_, _, lastmod) in enumerate(_sitemap_pages(version), 1):
+            loc = site + reverse('sitemap_posts', kwargs={'page': page})
+            yield f'<sitemap><loc>{escape(loc)}</loc><lastmod>{_timestamp(lastmod)}</lastmod></sitemap>\n'
+        yield '</sitemapindex>\n'
+    return _serve(request, version, 'sitemap', SITEMAP_CONTENT_TYPE, lambda: _buffered(generate()))
+
+
+@require_safe
+def sitemap_static(request):
+    def generate():
+        site = _site(request)
+        yield XML_DECLARATION + f'<urlset xmlns="{SITEMAP_NS}">\n'
+        for name in STATIC_PAGES:
+            yield f'<url><loc>{escape(site + reverse(name))}</loc></url>\n'
+        yield '</urlset>\n'
+    return _serve(request, current_version(), 'sitemap-static', SITEMAP_CONTENT_TYPE, lambda: _buffered(generate()))
+
+
+@require_safe
+def sitemap_posts(request, page):
+    from .models import BlogPost
+
+    # Resolved before the conditional check: a page that no longer exists is a 404, not a 304
+    version = current_version()
+    pages = _sitemap_pages(version)
+    if not 1 <= page <= len(pages):
+        raise Http404
+    first, last, _ = pages[page - 1]
+
+    def start():
+        rows = (BlogPost.objects.filter(pk__gte=first, pk__lte=last).order_by('pk')
+                .values_list('slug', 'updated_at').iterator(chunk_size=2000))
+        return _buffered(generate(rows))
+
+    def generate(rows):
+        post_url = _url_maker(_site(request), 'blog_detail', 'slug')
+        yield XML_DECLARATION + f'<urlset xmlns="{SITEMAP_NS}">\n'
+        for slug, updated_at in rows:
+            yield f'<url><loc>{post_url(slug)}</loc><lastmod>{_timestamp(updated_at)}</lastmod></url>\n'
+        yield '</urlset>\n'
+    return _serve(request, version, f'sitemap-posts-{page}', SITEMAP_CONTENT_TYPE, start)
+
+
+def _atom(request, version, title, posts):
+    """Stream an Atom feed of ``posts`` at ``version``, newest first"""
+    from .models import BlogPost
+
+    categories = dict(BlogPost.CATEGORY_CHOICES)
+    rows = (posts.order_by('-created_at', '-id')
+            .values_list('title', 'slug', 'category', 'excerpt', 'content_html',
+                         'created_at', 'updated_at', 'author__username')
+            [:getattr(settings, 'WRITORIA_FEED_ITEMS', 20)].iterator())
+
+    def generate():
+        site = _site(request)
+        post_url = _url_maker(site, 'blog_detail', 'slug')
+        profile_url = _url_maker(site, 'user_profile', 'username')
+        feed_url = escape(request.build_absolute_uri(request.path))
+        updated = datetime.fromtimestamp(version[0], dt_timezone.utc)
+        yield (
+            XML_DECLARATION
+            + f'<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="{settings.LANGUAGE_CODE}">\n'
+            f'<title>{escape(title)}</title>\n'
+            f'<link href="{escape(site)}/" rel="alternate"/>\n'
+            f'<link href="{feed_url}" rel="self"/>\n'
+            f'<id>{feed_url}</id>\n'
+            f'<updated>{_timestamp(updated)}</updated>\n'
+        )
+        for title_, slug, category, excerpt, content_html, created_at, updated_at, username in rows:
+            url = post_url(slug)
+            yield (
+                f'<entry>\n'
+                f'<title>{escape(title_)}</title>\n'
+                f'<link href="{url}" rel="alternate"/>\n'
+                f'<id>{url}</id>\n'
+                f'<published>{_timestamp(created_at)}</published>\n'
+                f'<updated>{_timestamp(updated_at)}</updated>\n'
+                f'<author><name>{escape(username)}</name><uri>{profile_url(username)}</uri></author>\n'
+                f'<category term="{escape(category)}" label="{escape(categories.get(category, category))}"/>\n'
+                f'<summary>{escape(excerpt)}</summary>\n'
+                f'<content type="html">{escape(content_html)}</content>\n'
+                f'</entry>\n'
+            )
+        yield '</feed>\n'
+    return _buffered(generate())
+
+
+@require_safe
+def site_feed(request):
+    from .models import BlogPost
+
+    version = current_version()
+    return _serve(request, version, 'atom', ATOM_CONTENT_TYPE,
+                  lambda: _atom(request, version, 'Writoria', BlogPost.objects.all()))
+
+
+@require_safe
+def category_feed(request, category):
+    from .models import BlogPost
+
+    label = dict(BlogPost.CATEGORY_CHOICES).get(category)
+    if label is None:
+        raise Http404
+    version = current_version()
+    return _serve(request, version, f'atom-category-{category}', ATOM_CONTENT_TYPE,
+                  lambda: _atom(request, version, f'Writoria: {label}', BlogPost.objects.filter(category=category)))
+
+
+@require_safe
+def author_feed(request, username):
+    from .models import BlogPost
+
+    # Resolved before the conditional check: an unknown author is a 404, not a 304
+    author_id = User.objects.filter(username=username).values_list('pk', flat=True).first()
+    if author_id is None:
+        raise Http404
+    version = current_version()
+    posts = BlogPost.objects.filter(author_id=author_id)
+    return _serve(request, version, f'atom-author-{username}', ATOM_CONTENT_TYPE,
+                  lambda: _atom(request, version, f'Writoria: {username}', posts))
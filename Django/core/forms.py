@@ -46,18 +46,20 @@ class CustomUserCreationForm(UserCreationForm):
             raise forms.ValidationError("Phone number must be exactly 10 digits")
         return contact_number
 
+    def validate_unique(self):
+        # clean_username already rejected the username in any letter case,
+        # and it is the only unique field the form sets
+        pass
+
     def save(self, commit=True):
         user = super().save(commit=False)
         user.email = self.cleaned_data['email']
         if commit:
             user.save()
-            # Save additional fields in UserProfile
-            UserProfile.objects.update_or_create(
-                user=user,
-                defaults={
-                    'contact_number': self.cleaned_data['contact_number']
-                }
-            )
+            # The post_save receiver created the profile and cached it on the user
+            profile = user.userprofile
+            profile.contact_number = self.cleaned_data['contact_number']
+            profile.save(update_fields=['contact_number'])
         return user
 
 class BlogPostForm(forms.ModelForm):
@@ -67,10 +69,11 @@ class BlogPostForm(forms.ModelForm):
         required=False,
         help_text='Enter captions for images, one per line'
     )
+    replace_images = forms.BooleanField(required=False)
 
     class Meta:
         model = BlogPost
-        fields = ['title', 'content', 'category', 'image', 'images', 'image_captions']
+        fields = ['title', 'content', 'category', 'image', 'images', 'image_captions', 'replace_images']
         widgets = {
             'content': forms.Textarea(attrs={'class': 'rich-text-editor'}),
             'category': forms.Select(attrs={'class': 'form-select'}),
@@ -0,0 +1,19 @@
+"""
+Password hashers with work factors taken from settings.
+
+``WRITORIA_PBKDF2_ITERATIONS`` sets the PBKDF2 iteration count (Django's
+default when None). The hasher keeps Django's ``pbkdf2_sha256`` algorithm
+name, so existing hashes keep verifying; a hash made with a different
+count is re-encoded with the configured one the next time its owner logs
+in (``ModelBackend`` saves it through ``check_password``'s setter).
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'WRITORIA_PBKDF2_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
@@ -0,0 +1,279 @@
+"""
+Live post updates over server-sent events.
+
+``writoria/asgi.py`` routes ``/live/posts/<id>/`` to ``sse_app``, a plain
+ASGI app outside the Django request cycle: an open stream is one coroutine
+waiting on its queue, so idle readers cost no thread. Views and signal
+receivers call ``publish`` (new comments, deleted comments, vote totals)
+and the broker named by ``WRITORIA_LIVE_BROKER`` fans each event out to the
+streams subscribed to that post.
+
+``LocalBroker`` only reaches streams in its own process, which suits a
+single ASGI worker and tests. ``RedisBroker`` relays events through Redis
+pub/sub so that any process, WSGI workers included, reaches every stream.
+Readers too slow to keep up with ``WRITORIA_LIVE_QUEUE_SIZE`` pending events
+are disconnected; the browser's EventSource reconnects on its own.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+try:
+    import redis
+except ImportError:  # redis is optional; only RedisBroker needs it
+    redis = None
+
+logger = logging.getLogger('writoria.live')
+
+LIVE_PATH_RE = re.compile(r'^/live/posts/(\d+)/$')
+LIVE_PREFIX = '/live/'
+REDIS_PREFIX = 'writoria:live:'
+
+LIVE_CONNECTIONS = metrics.registry.gauge(
+    'writoria_live_connections', 'Open live update streams in this process.')
+LIVE_EVENTS = metrics.registry.counter(
+    'writoria_live_events_published_total', 'Live update events published, by event.', ['event'])
+LIVE_SLOW_READERS = metrics.registry.counter(
+    'writoria_live_slow_readers_total', 'Live update streams closed because the reader fell behind.')
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+def encode_event(event, data):
+    """One SSE frame, encoded once and shared by every subscriber"""
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+PING = b': ping\n\n'
+
+
+class Subscription:
+    """A stream's queue of pending frames; only touched from its event loop"""
+
+    def __init__(self, channel, loop, maxsize):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def ping(self):
+        # Skipped when frames are already waiting; those keep the connection busy anyway
+        if self.queue.empty():
+            self.queue.put_nowait(PING)
+
+    def close(self):
+        """Wake the stream so it ends"""
+        self.closed = True
+        if not self.queue.full():
+            self.queue.put_nowait(None)
+
+
+def _fan_out(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.put(message)
+
+
+class LocalBroker:
+    """In-process pub/sub"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # channel -> event loop -> subscriptions, so a publish wakes each loop once
+        self._channels = {}
+
+    def subscribe(self, channel):
+        """Subscribe from a coroutine; frames arrive on the returned subscription's queue"""
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(channel, loop, getattr(settings, 'WRITORIA_LIVE_QUEUE_SIZE', 64))
+        with self._lock:
+            self._channels.setdefault(channel, {}).setdefault(loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            loops = self._channels.get(subscription.channel, {})
+            group = loops.get(subscription.loop, set())
+            group.discard(subscription)
+            if not group:
+                loops.pop(subscription.loop, None)
+            if not loops:
+                self._channels.pop(subscription.channel, None)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            channels = [self._channels.get(channel, {})] if channel else self._channels.values()
+            return sum(len(group) for loops in channels for group in loops.values())
+
+    def publish(self, channel, event, data):
+        self.deliver(channel, encode_event(event, data))
+
+    def deliver(self, channel, message):
+        """Queue ``message`` for local subscribers; safe to call from any thread"""
+        with self._lock:
+            groups = [(loop, tuple(group)) for loop, group in self._channels.get(channel, {}).items()]
+        for loop, group in groups:
+            try:
+                loop.call_soon_threadsafe(_fan_out, group, message)
+            except RuntimeError:  # the loop has been closed
+                pass
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes through Redis; one listener thread per process delivers to the
+    local subscribers, started with the first subscription.
+    """
+
+    def __init__(self, url=None):
+        if redis is None:
+            raise ImproperlyConfigured('RedisBroker requires the redis package')
+        super().__init__()
+        self.client = redis.Redis.from_url(url or getattr(settings, 'WRITORIA_LIVE_REDIS_URL', 'redis://localhost:6379/0'))
+        self._listener = None
+
+    def publish(self, channel, event, data):
+        self.client.publish(REDIS_PREFIX + channel, encode_event(event, data))
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='writoria-live-redis', daemon=True)
+                self._listener.start()
+        return super().subscribe(channel)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(REDIS_PREFIX + '*')
+                for message in pubsub.listen():
+                    channel = message['channel'].decode()[len(REDIS_PREFIX):]
+                    self.deliver(channel, message['data'])
+            except Exception:
+                logger.warning('Live update listener lost its Redis connection; retrying', exc_info=True)
+                time.sleep(1)
+
+
+@functools.cache
+def get_broker():
+    return import_string(getattr(settings, 'WRITORIA_LIVE_BROKER', 'core.live.LocalBroker'))()
+
+
+def publish(post_id, event, data):
+    """Send ``event`` to the post's live readers once the current transaction commits"""
+    def send():
+        try:
+            get_broker().publish(post_channel(post_id), event, data)
+        except Exception:
+            # Live updates are best effort; readers still see the change on reload
+            logger.warning('Publishing live %s event for post %s failed', event, post_id, exc_info=True)
+        else:
+            LIVE_EVENTS.inc(event=event)
+    transaction.on_commit(send)
+
+
+def _post_exists(post_id):
+    from .models import BlogPost
+
+    try:
+        return BlogPost.objects.filter(pk=post_id).exists()
+    finally:
+        close_old_connections()
+
+
+async def _respond(send, status, body=b''):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def sse_app(scope, receive, send):
+    """ASGI app streaming a post's live events to one reader"""
+    match = LIVE_PATH_RE.match(scope['path'])
+    if not match:
+        return await _respond(send, 404, b'Not Found')
+    if scope['method'] not in ('GET', 'HEAD'):
+        return await _respond(send, 405, b'Method Not Allowed')
+    post_id = int(match[1])
+    if not await sync_to_async(_post_exists)(post_id):
+        return await _respond(send, 404, b'Not Found')
+
+    broker = get_broker()
+    subscription = broker.subscribe(post_channel(post_id))
+    LIVE_CONNECTIONS.inc()
+    loop = asyncio.get_running_loop()
+    heartbeat = getattr(settings, 'WRITORIA_LIVE_HEARTBEAT_SECONDS', 25)
+
+    def beat():
+        nonlocal timer
+        subscription.ping()
+        timer = loop.call_later(heartbeat, beat)
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        subscription.close()
+
+    # Pings and disconnects arrive through the queue too, so an idle stream
+    # is a single pending queue.get() rather than a wait on several futures
+    timer = loop.call_later(heartbeat, beat)
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            # Stop nginx from buffering the stream
+            (b'x-accel-buffering', b'no'),
+        ]})
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while True:
+            body = await subscription.queue.get()
+            if subscription.closed:
+                return
+            if subscription.overflowed:
+                LIVE_SLOW_READERS.inc()
+                break
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        # The client went away mid-write
+        pass
+    finally:
+        timer.cancel()
+        watcher.cancel()
+        broker.unsubscribe(subscription)
+        LIVE_CONNECTIONS.inc(-1)
+
+
+def route(django_application):
+    """Wrap the Django ASGI app so live streams bypass the request cycle"""
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith(LIVE_PREFIX):
+            return await sse_app(scope, receive, send)
+        return await django_application(scope, receive, send)
+    return application
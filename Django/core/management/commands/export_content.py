@@ -0,0 +1,50 @@
+import sys
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from core.models import BlogPost, BlogImage
+from core.services.content_transfer import (
+    DEFAULT_CHUNK_SIZE, iter_records, encode_record, write_media_archive
+)
+
+
+class Command(BaseCommand):
+    help = 'Streams posts, images, comments, votes and bookmarks to NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Destination NDJSON file, or "-" for stdout')
+        parser.add_argument('--media', help='Also bundle referenced media files into this tar file')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows fetched from the database per round trip')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        counts = {}
+
+        out = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8')
+        try:
+            for record in iter_records(chunk_size=chunk_size):
+                out.write(encode_record(record))
+                counts[record['model']] = counts.get(record['model'], 0) + 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        summary = ', '.join(f'{count} {kind}' for kind, count in counts.items()) or 'nothing'
+        self.stderr.write(self.style.SUCCESS(f'Exported {summary}'))
+
+        if options['media']:
+            with open(options['media'], 'wb') as archive:
+                written = write_media_archive(archive, self._media_names(chunk_size))
+            self.stderr.write(self.style.SUCCESS(f'Bundled {written} media files'))
+
+    def _media_names(self, chunk_size):
+        seen = set()
+        names = chain(
+            BlogPost.objects.exclude(image='').values_list('image', flat=True).iterator(chunk_size=chunk_size),
+            BlogImage.objects.values_list('image', flat=True).iterator(chunk_size=chunk_size),
+        )
+        for name in names:
+            if name and name not in seen:
+                seen.add(name)
+                yield name
@@ -0,0 +1,53 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import StoredBlob, count_blob_refs
+from core.storage import backfill_blobs, collect_unreferenced_blobs, upload_storage
+
+
+class Command(BaseCommand):
+    help = 'Deletes content-addressed uploads that are no longer referenced by any row'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float,
+                            default=getattr(settings, 'WRITORIA_MEDIA_GC_GRACE_HOURS', 24),
+                            help='Only delete blobs unreferenced for at least this long')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recompute reference counts from the upload fields first, indexing '
+                                 'referenced files uploaded before content addressing. Files no row '
+                                 'references and no index row lists are never found or removed.')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self._recount()
+
+        report = (lambda name: self.stdout.write(f'Would delete {name}')) if options['dry_run'] else None
+        deleted, freed = collect_unreferenced_blobs(options['grace_hours'], options['dry_run'], report)
+
+        storage = upload_storage()
+        self._sweep_incoming(storage, options['grace_hours'], options['dry_run'])
+        verb = 'Would free' if options['dry_run'] else 'Freed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {freed} bytes from {deleted} unreferenced files'))
+
+    def _recount(self):
+        counts = count_blob_refs()
+        # Files uploaded before content addressing have no index row yet
+        indexed = backfill_blobs(counts)
+        StoredBlob.objects.update(ref_count=0, updated_at=timezone.now())
+        for name, refs in counts.items():
+            StoredBlob.objects.filter(name=name).update(ref_count=refs)
+        self.stdout.write(f'Recounted references for {len(counts)} files ({indexed} newly indexed)')
+
+    def _sweep_incoming(self, storage, grace_hours, dry_run):
+        """Remove temporary files left behind by interrupted uploads"""
+        incoming = os.path.join(storage.location, storage.incoming_dir)
+        if not os.path.isdir(incoming):
+            return
+        cutoff = time.time() - grace_hours * 3600
+        for entry in os.scandir(incoming):
+            if entry.is_file() and entry.stat().st_mtime < cutoff and not dry_run:
+                os.remove(entry.path)
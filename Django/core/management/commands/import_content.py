@@ -0,0 +1,249 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from core.models import (
+    AuthorStats, BlogPost, CategoryStats, BlogImage, Comment, Vote, Bookmark, UserProfile, StoredBlob, add_blob_refs,
+)
+from core.slugs import allocate_slug
+from core.services.content_transfer import Checkpoint, preserved_timestamps, read_media_archive
+from core.storage import backfill_blobs
+
+
+class Command(BaseCommand):
+    help = 'Imports an NDJSON export produced by export_content in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='NDJSON file produced by export_content')
+        parser.add_argument('--media', help='Tar file of media produced by export_content --media')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows inserted per bulk_create / transaction')
+        parser.add_argument('--on-conflict', choices=['skip', 'rename'], default='skip',
+                            help='What to do with a post whose slug already exists')
+        parser.add_argument('--checkpoint', help='File used to record progress so an interrupted import can resume')
+        parser.add_argument('--create-missing-users', action='store_true',
+                            help='Create inactive placeholder users for unknown usernames')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.on_conflict = options['on_conflict']
+        self.create_missing_users = options['create_missing_users']
+        self.checkpoint = Checkpoint(options['checkpoint'])
+        self.created = {}
+        self.skipped = {}
+
+        if options['media']:
+            with open(options['media'], 'rb') as archive:
+                restored, skipped = read_media_archive(archive)
+            self.stdout.write(f'Restored {restored} media files ({skipped} already present or unsafe)')
+
+        if self.checkpoint.load():
+            self.stdout.write(f'Resuming from line {self.checkpoint.line}')
+
+        try:
+            with open(options['input'], 'rb') as source, \
+                    preserved_timestamps(BlogPost, Comment, Vote, Bookmark):
+                source.seek(self.checkpoint.offset)
+                self._import_stream(source)
+        except (ValueError, KeyError) as e:
+            raise CommandError(f'Malformed export after line {self.checkpoint.line}: {e}')
+
+        self.checkpoint.clear()
+        # bulk_create skips the signals that maintain author and category totals
+        AuthorStats.rebuild()
+        CategoryStats.rebuild()
+        for kind, count in self.created.items():
+            self.stdout.write(self.style.SUCCESS(f'Imported {count} {kind}'))
+        for kind, count in self.skipped.items():
+            self.stdout.write(self.style.WARNING(f'Skipped {count} {kind}'))
+
+    def _import_stream(self, source):
+        batch = []
+        kind = None
+        line = self.checkpoint.line
+        offset = self.checkpoint.offset
+
+        while True:
+            raw = source.readline()
+            if not raw:
+                break
+            line += 1
+            if not raw.strip():
+                offset = source.tell()
+                continue
+            record = json.loads(raw)
+            if batch and (record['model'] != kind or len(batch) >= self.batch_size):
+                self._flush(kind, batch, offset, line - 1)
+                batch = []
+            kind = record['model']
+            batch.append(record)
+            offset = source.tell()
+
+        if batch:
+            self._flush(kind, batch, offset, line)
+
+    def _flush(self, kind, batch, offset, line):
+        handler = getattr(self, f'_import_{kind}', None)
+        if handler is None:
+            raise CommandError(f'Unknown record type "{kind}" near line {line}')
+        mappings = []
+        with transaction.atomic():
+            handler(batch, mappings)
+        self.checkpoint.record(offset, line, mappings)
+
+    def _count(self, bucket, kind, amount):
+        if amount:
+            bucket[kind] = bucket.get(kind, 0) + amount
+
+    def _resolve_users(self, usernames):
+        usernames = set(usernames)
+        found = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+        missing = usernames - found.keys()
+        if missing and self.create_missing_users:
+            User.objects.bulk_create(
+                [User(username=name, is_active=False, password='!') for name in missing],
+                ignore_conflicts=True,
+            )
+            new_users = dict(User.objects.filter(username__in=missing).values_list('username', 'id'))
+            # bulk_create skips post_save, so create the matching profiles here
+            UserProfile.objects.bulk_create(
+                [UserProfile(user_id=user_id) for user_id in new_users.values()],
+                ignore_conflicts=True,
+            )
+            found.update(new_users)
+        return found
+
+    def _count_uploads(self, names):
+        """Count the files of rows just inserted; bulk_create skips the receiver that does it"""
+        names = [name for name in names if name]
+        indexed = set(StoredBlob.objects.filter(name__in=names).values_list('name', flat=True))
+        add_blob_refs([name for name in names if name in indexed])
+        # Files without an index row, e.g. uploaded before content addressing, are
+        # indexed with the rows referencing them now, the new ones included
+        backfill_blobs(set(names) - indexed)
+
+    def _import_blogpost(self, batch, mappings):
+        id_map = self.checkpoint.id_maps['blogpost']
+        users = self._resolve_users(r['author_username'] for r in batch)
+        # Soft-deleted posts keep their slug until purged
+        existing_slugs = set(BlogPost.all_objects.filter(
+            slug__in=[r['slug'] for r in batch]
+        ).values_list('slug', flat=True))
+
+        posts, sources = [], []
+        for record in batch:
+            author_id = users.get(record['author_username'])
+            slug = record['slug']
+            if author_id is None:
+                id_map[record['id']] = None
+                mappings.append(('blogpost', record['id'], None))
+                self._count(self.skipped, 'posts (unknown author)', 1)
+                continue
+            if slug in existing_slugs:
+                if self.on_conflict == 'skip':
+                    id_map[record['id']] = None
+                    mappings.append(('blogpost', record['id'], None))
+                    self._count(self.skipped, 'posts (slug exists)', 1)
+                    continue
+                slug = allocate_slug(BlogPost, slug, taken=existing_slugs)
+            existing_slugs.add(slug)
+            posts.append(BlogPost(
+                title=record['title'],
+                slug=slug,
+                content=record['content'],
+                author_id=author_id,
+                created_at=parse_datetime(record['created_at']),
+                updated_at=parse_datetime(record['updated_at']),
+                image=record['image'] or None,
+                votes=record['votes'],
+                category=record['category'],
+            ))
+            sources.append(record['id'])
+
+        # bulk_create bypasses save(), which renders content
+        for post in posts:
+            post.render_content()
+        BlogPost.objects.bulk_create(posts)
+        self._count_uploads(post.image.name for post in posts)
+        for old_id, post in zip(sources, posts):
+            id_map[old_id] = post.pk
+            mappings.append(('blogpost', old_id, post.pk))
+        self._count(self.created, 'posts', len(posts))
+
+    def _import_blogimage(self, batch, mappings):
+        post_ids = self.checkpoint.id_maps['blogpost']
+        images = [
+            BlogImage(post_id=post_ids[r['post_id']], image=r['image'],
+                      caption=r['caption'], order=r['order'])
+            for r in batch if post_ids.get(r['post_id'])
+        ]
+        BlogImage.objects.bulk_create(images)
+        self._count_uploads(image.image.name for image in images)
+        self._count(self.created, 'images', len(images))
+        self._count(self.skipped, 'images', len(batch) - len(images))
+
+    def _import_comment(self, batch, mappings):
+        post_ids = self.checkpoint.id_maps['blogpost']
+        comment_ids = self.checkpoint.id_maps['comment']
+        users = self._resolve_users(r['author_username'] for r in batch)
+        pending, sources, pending_ids = [], [], set()
+
+        def insert_pending():
+            Comment.objects.bulk_create(pending)
+            for old_id, comment in zip(sources, pending):
+                comment_ids[old_id] = comment.pk
+                mappings.append(('comment', old_id, comment.pk))
+            self._count(self.created, 'comments', len(pending))
+            pending.clear()
+            sources.clear()
+            pending_ids.clear()
+
+        for record in batch:
+            parent_id = record['parent_id']
+            if parent_id in pending_ids:
+                # The parent is part of this batch; it needs a real id first
+                insert_pending()
+            post_id = post_ids.get(record['post_id'])
+            author_id = users.get(record['author_username'])
+            new_parent_id = comment_ids.get(parent_id) if parent_id is not None else None
+            if not post_id or not author_id or (parent_id is not None and not new_parent_id):
+                comment_ids[record['id']] = None
+                mappings.append(('comment', record['id'], None))
+                self._count(self.skipped, 'comments', 1)
+                continue
+            pending.append(Comment(
+                post_id=post_id,
+                author_id=author_id,
+                content=record['content'],
+                created_at=parse_datetime(record['created_at']),
+                updated_at=parse_datetime(record['updated_at']),
+                parent_id=new_parent_id,
+            ))
+            sources.append(record['id'])
+            pending_ids.add(record['id'])
+        insert_pending()
+
+    def _import_user_rows(self, model, label, batch, extra_fields):
+        post_ids = self.checkpoint.id_maps['blogpost']
+        users = self._resolve_users(r['user_username'] for r in batch)
+        rows = []
+        for record in batch:
+            post_id = post_ids.get(record['post_id'])
+            user_id = users.get(record['user_username'])
+            if not post_id or not user_id:
+                continue
+            fields = {name: record[name] for name in extra_fields}
+            rows.append(model(post_id=post_id, user_id=user_id,
+                              created_at=parse_datetime(record['created_at']), **fields))
+        # unique_together(user, post) makes re-running an interrupted batch harmless
+        model.objects.bulk_create(rows, ignore_conflicts=True)
+        self._count(self.created, label, len(rows))
+        self._count(self.skipped, label, len(batch) - len(rows))
+
+    def _import_vote(self, batch, mappings):
+        self._import_user_rows(Vote, 'votes', batch, ['is_life'])
+
+    def _import_bookmark(self, batch, mappings):
+        self._import_user_rows(Bookmark, 'bookmarks', batch, [])
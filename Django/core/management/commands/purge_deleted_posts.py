@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from core import deletion
+
+
+class Command(BaseCommand):
+    help = 'Purges soft-deleted posts with their comments, votes and unreferenced media'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows deleted per transaction (default: WRITORIA_PURGE_CHUNK_SIZE)')
+        parser.add_argument('--pause', type=float, default=None,
+                            help='Seconds to sleep between chunks (default: WRITORIA_PURGE_PAUSE_SECONDS)')
+
+    def handle(self, *args, **options):
+        pending = deletion.pending().count()
+        purged = deletion.purge_pending(options['chunk_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} of {pending} deleted posts'))
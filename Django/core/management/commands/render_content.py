@@ -0,0 +1,67 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core import rendering
+from core.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = 'Re-renders stored post HTML written by an older renderer version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render every post, not just stale ones')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Posts rendered and updated per batch')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Rendering processes (default: one per CPU; 1 renders in-process)')
+
+    def handle(self, *args, **options):
+        queryset = BlogPost.objects.order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(renderer_version__lt=rendering.RENDERER_VERSION)
+        chunk_size = options['chunk_size']
+
+        pool = ProcessPoolExecutor(options['workers']) if options['workers'] != 1 else None
+        rendered = skipped = 0
+        last_pk = 0
+        try:
+            while True:
+                rows = list(queryset.filter(pk__gt=last_pk).values_list('pk', 'content', 'updated_at')[:chunk_size])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                contents = [content for _, content, _ in rows]
+                if pool is not None:
+                    results = list(pool.map(rendering.render, contents, chunksize=max(1, len(contents) // 32)))
+                else:
+                    results = [rendering.render(content) for content in contents]
+                updated = self._store(rows, results)
+                rendered += updated
+                skipped += len(rows) - updated
+                self.stdout.write(f'Rendered {rendered} posts')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} posts with renderer v{rendering.RENDERER_VERSION}'
+            f' ({skipped} edited meanwhile and skipped)'
+        ))
+
+    def _store(self, rows, results):
+        with transaction.atomic():
+            # Posts saved since they were read were already rendered by save()
+            current = dict(
+                BlogPost.objects.select_for_update()
+                .filter(pk__in=[pk for pk, _, _ in rows])
+                .values_list('pk', 'updated_at')
+            )
+            posts = []
+            for (pk, _, updated_at), (html, excerpt) in zip(rows, results):
+                if current.get(pk) == updated_at:
+                    posts.append(BlogPost(
+                        pk=pk, content_html=html, excerpt=excerpt,
+                        renderer_version=rendering.RENDERER_VERSION,
+                    ))
+            BlogPost.objects.bulk_update(posts, BlogPost.RENDERED_FIELDS)
+        return len(posts)
@@ -0,0 +1,134 @@
+import json
+import platform
+import random
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment, override_settings
+from core.benchmarks import BenchmarkContext, autodiscover, measure
+
+SEED_OPTIONS = ['users', 'posts', 'images_per_post', 'comments_per_post', 'votes_per_post', 'bookmarks_per_user']
+
+
+class Command(BaseCommand):
+    help = 'Runs the benchmark scenarios and writes machine-readable results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='Scenario names to run (default: all)')
+        parser.add_argument('--list', action='store_true', help='List available scenarios and exit')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--compare', help='Previous results file to compare against')
+        parser.add_argument('--existing-db', action='store_true',
+                            help='Run against the configured database (already seeded) instead of a throwaway one')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--images-per-post', type=int, default=2)
+        parser.add_argument('--comments-per-post', type=int, default=8)
+        parser.add_argument('--votes-per-post', type=int, default=10)
+        parser.add_argument('--bookmarks-per-user', type=int, default=5)
+
+    def handle(self, *args, **options):
+        available = autodiscover()
+        if options['list']:
+            for name in sorted(available):
+                self.stdout.write(name)
+            return
+
+        names = options['scenarios'] or sorted(available)
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+
+        setup_test_environment()
+        old_db_name = None
+        media_override = override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='writoria-bench-'))
+        try:
+            if not options['existing_db']:
+                media_override.enable()
+                old_db_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                call_command('seed_benchmark_data', seed=options['seed'], verbosity=0,
+                             **{key: options[key] for key in SEED_OPTIONS})
+            results = self._run(names, available, options)
+        finally:
+            if old_db_name is not None:
+                connection.creation.destroy_test_db(old_db_name, verbosity=0)
+                media_override.disable()
+            teardown_test_environment()
+
+        report = {
+            'meta': self._meta(options),
+            'results': results,
+        }
+        self._print(results, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def _run(self, names, available, options):
+        ctx = BenchmarkContext(random.Random(options['seed']))
+        results = {}
+        # Scenarios send requests far faster than any rate limit allows, with
+        # texts duplicate detection would fold; the ratelimit and duplicates
+        # scenarios switch them back on where they measure them
+        limits_off = override_settings(WRITORIA_RATE_LIMIT_ENABLED=False, WRITORIA_DUPLICATE_DETECTION_ENABLED=False)
+        limits_off.enable()
+        try:
+            for name in names:
+                spec = available[name]
+                func = spec['setup'](ctx)
+                iterations = spec['iterations'] or options['iterations']
+                self.stdout.write(f'Running {name} ({iterations} iterations)...')
+                results[name] = measure(func, iterations, warmup=options['warmup'])
+                if hasattr(func, 'stats'):
+                    results[name]['stats'] = func.stats()
+        finally:
+            ctx.close()
+            limits_off.disable()
+        return results
+
+    def _meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'existing_db': options['existing_db'],
+            'volumes': {key: options[key] for key in SEED_OPTIONS},
+        }
+
+    def _print(self, results, compare_path):
+        previous = {}
+        if compare_path:
+            with open(compare_path) as fh:
+                previous = json.load(fh).get('results', {})
+
+        header = f'{"scenario":<28}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"req/s":>10}{"queries":>9}'
+        if previous:
+            header += f'{"p50 delta":>11}'
+        self.stdout.write(header)
+        for name, row in results.items():
+            line = (f'{name:<28}{row["p50_ms"]:>10.2f}{row["p95_ms"]:>10.2f}{row["p99_ms"]:>10.2f}'
+                    f'{row["throughput_rps"]:>10.1f}{row.get("queries_per_request", 0):>9.1f}')
+            old = previous.get(name)
+            if old and old.get('p50_ms'):
+                line += f'{(row["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100:>+10.1f}%'
+            self.stdout.write(line)
+            for key, value in row.get('stats', {}).items():
+                self.stdout.write(f'    {key}: {value:g}')
@@ -0,0 +1,163 @@
+import io
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import AuthorStats, BlogPost, CategoryStats, BlogImage, Comment, Vote, Bookmark, UserProfile
+
+PLACEHOLDER_IMAGE = 'blog_images/benchmark-placeholder.png'
+
+WORDS = (
+    'writing story travel coffee mountain river code python django design light '
+    'garden music recipe health morning city night journey science art market '
+    'ocean forest memory dream habit focus team startup painting kitchen'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Generates users, posts, images, comments, votes and bookmarks for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--images-per-post', type=int, default=2)
+        parser.add_argument('--comments-per-post', type=int, default=8)
+        parser.add_argument('--reply-ratio', type=float, default=0.3,
+                            help='Fraction of comments created as replies to another comment')
+        parser.add_argument('--votes-per-post', type=int, default=10)
+        parser.add_argument('--bookmarks-per-user', type=int, default=5)
+        parser.add_argument('--paragraphs', type=int, default=6, help='Paragraphs of text per post')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--prefix', default='bench', help='Prefix for generated usernames and slugs')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        prefix = options['prefix']
+        batch_size = options['batch_size']
+
+        self._ensure_placeholder_image()
+        user_ids = self._create_users(prefix, options['users'], batch_size)
+        if not user_ids:
+            self.stdout.write(self.style.WARNING('No users to attach content to'))
+            return
+
+        start = BlogPost.objects.filter(slug__startswith=f'{prefix}-').count()
+        created = 0
+        while created < options['posts']:
+            count = min(batch_size, options['posts'] - created)
+            with transaction.atomic():
+                self._create_post_batch(prefix, start + created, count, user_ids)
+            created += count
+
+        with transaction.atomic():
+            self._create_bookmarks(user_ids, prefix)
+        # bulk_create skips the signals that maintain author and category totals
+        AuthorStats.rebuild(user_ids)
+        CategoryStats.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(user_ids)} users and {created} posts with prefix "{prefix}"'
+        ))
+
+    def _ensure_placeholder_image(self):
+        if default_storage.exists(PLACEHOLDER_IMAGE):
+            return
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), (40, 60, 90)).save(buffer, format='PNG')
+        default_storage.save(PLACEHOLDER_IMAGE, ContentFile(buffer.getvalue()))
+
+    def _create_users(self, prefix, count, batch_size):
+        # Hashing once keeps seeding fast; every generated user shares the password "benchmark"
+        password = make_password('benchmark')
+        existing = set(User.objects.filter(username__startswith=f'{prefix}_user').values_list('username', flat=True))
+        new_users = [
+            User(username=f'{prefix}_user{i}', email=f'{prefix}_user{i}@example.com', password=password)
+            for i in range(count) if f'{prefix}_user{i}' not in existing
+        ]
+        User.objects.bulk_create(new_users, batch_size=batch_size)
+        user_ids = list(User.objects.filter(username__startswith=f'{prefix}_user').values_list('id', flat=True))
+        # bulk_create does not fire post_save, so profiles are created here
+        with_profile = set(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=user_id) for user_id in user_ids if user_id not in with_profile],
+            batch_size=batch_size,
+        )
+        return user_ids
+
+    def _sentence(self, low=6, high=14):
+        words = self.rng.choices(WORDS, k=self.rng.randint(low, high))
+        return ' '.join(words).capitalize() + '.'
+
+    def _paragraph(self):
+        return ' '.join(self._sentence() for _ in range(self.rng.randint(3, 6)))
+
+    def _create_post_batch(self, prefix, offset, count, user_ids):
+        rng = self.rng
+        options = self.options
+        categories = [code for code, _ in BlogPost.CATEGORY_CHOICES]
+
+        posts = []
+        for i in range(offset, offset + count):
+            title = self._sentence(3, 7).rstrip('.')
+            posts.append(BlogPost(
+                title=title,
+                slug=f'{prefix}-{i}',
+                content='\n\n'.join(self._paragraph() for _ in range(options['paragraphs'])),
+                author_id=rng.choice(user_ids),
+                category=rng.choice(categories),
+                image=PLACEHOLDER_IMAGE if rng.random() < 0.5 else None,
+            ))
+            posts[-1].render_content()
+        BlogPost.objects.bulk_create(posts)
+
+        images = [
+            BlogImage(post=post, image=PLACEHOLDER_IMAGE, caption=self._sentence(2, 5), order=order)
+            for post in posts for order in range(options['images_per_post'])
+        ]
+        BlogImage.objects.bulk_create(images)
+
+        per_post = options['comments_per_post']
+        replies_per_post = int(per_post * options['reply_ratio'])
+        top_level = [
+            Comment(post=post, author_id=rng.choice(user_ids), content=self._sentence())
+            for post in posts for _ in range(per_post - replies_per_post)
+        ]
+        Comment.objects.bulk_create(top_level)
+        parents_by_post = {}
+        for comment in top_level:
+            parents_by_post.setdefault(comment.post_id, []).append(comment)
+        replies = [
+            Comment(post=post, author_id=rng.choice(user_ids), content=self._sentence(),
+                    parent=rng.choice(parents_by_post[post.pk]))
+            for post in posts if post.pk in parents_by_post for _ in range(replies_per_post)
+        ]
+        Comment.objects.bulk_create(replies)
+
+        votes = []
+        for post in posts:
+            voters = rng.sample(user_ids, min(options['votes_per_post'], len(user_ids)))
+            post.votes = 0
+            for user_id in voters:
+                is_life = rng.random() < 0.85
+                post.votes += is_life
+                votes.append(Vote(post=post, user_id=user_id, is_life=is_life))
+        Vote.objects.bulk_create(votes)
+        BlogPost.objects.bulk_update(posts, ['votes'])
+
+    def _create_bookmarks(self, user_ids, prefix):
+        post_ids = list(BlogPost.objects.filter(slug__startswith=f'{prefix}-').values_list('id', flat=True))
+        if not post_ids:
+            return
+        per_user = min(self.options['bookmarks_per_user'], len(post_ids))
+        bookmarks = [
+            Bookmark(user_id=user_id, post_id=post_id)
+            for user_id in user_ids for post_id in self.rng.sample(post_ids, per_user)
+        ]
+        Bookmark.objects.bulk_create(bookmarks, ignore_conflicts=True, batch_size=self.options['batch_size'])
@@ -0,0 +1,161 @@
+"""
+Serving of user uploads under MEDIA_ROOT.
+
+Supports conditional requests (ETag / Last-Modified), single byte ranges and
+an offload mode where Django only authorises the request and a front proxy
+streams the file:
+
+* ``WRITORIA_MEDIA_OFFLOAD = 'x-accel-redirect'`` for nginx, using the
+  internal location ``WRITORIA_MEDIA_ACCEL_PREFIX``;
+* ``WRITORIA_MEDIA_OFFLOAD = 'x-sendfile'`` for Apache/lighttpd.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeFile:
+    """File-like wrapper that reads at most ``length`` bytes from ``offset``"""
+
+    def __init__(self, path, offset, length):
+        self.file = open(path, 'rb')
+        self.file.seek(offset)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(stat):
+    """An ETag derived from file metadata, so it never requires reading the file"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single satisfiable byte range,
+    ``None`` when the header should be ignored, or ``False`` when it cannot
+    be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Malformed or multi-range requests are answered with the full body
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            return False
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = file_etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': f'public, max-age={getattr(settings, "WRITORIA_MEDIA_MAX_AGE", 86400)}',
+        'Accept-Ranges': 'bytes',
+    }
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+            response[header] = headers[header]
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    offload = getattr(settings, 'WRITORIA_MEDIA_OFFLOAD', None)
+    if offload:
+        # The proxy handles ranges and streaming; Django only sets the headers
+        response = HttpResponse(content_type=content_type)
+        if offload == 'x-accel-redirect':
+            prefix = getattr(settings, 'WRITORIA_MEDIA_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix + quote(path)
+        else:
+            response['X-Sendfile'] = full_path
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header:
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range or if_range.strip() in (etag, headers['Last-Modified']):
+            byte_range = parse_range(range_header, size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        length = size
+    elif byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(full_path, start, length), content_type=content_type, status=206)
+        response.block_size = CHUNK_SIZE
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        length = size
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response.block_size = CHUNK_SIZE
+        response.headers.pop('Content-Disposition', None)
+    response['Content-Length'] = length
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for header, value in headers.items():
+        response[header] = value
+    return response
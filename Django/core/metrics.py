@@ -0,0 +1,202 @@
+"""
+In-process metrics registry rendered in the Prometheus text format.
+
+Values live in the memory of each worker process; scrape every worker (or
+put a single process behind ``/metrics``) to get the full picture.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_stats = ContextVar('writoria_request_stats', default=None)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, amount, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, amount)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += 1
+            state[2] += amount
+
+    def count(self, **labels):
+        state = self._values.get(tuple(labels.get(name, '') for name in self.labelnames))
+        return state[1] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        for key, (bucket_counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labelnames + ('le',), key + (repr(float(bound)),)), cumulative)
+            yield f'{self.name}_bucket', _format_labels(self.labelnames + ('le',), key + ('+Inf',)), count
+            yield f'{self.name}_count', _format_labels(self.labelnames, key), count
+            yield f'{self.name}_sum', _format_labels(self.labelnames, key), total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames=labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames=labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames=labelnames, buckets=buckets)
+
+    def render(self):
+        lines = []
+        for name in sorted(self._metrics):
+            metric = self._metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for sample_name, labels, value in metric.samples():
+                lines.append(f'{sample_name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    'writoria_request_duration_seconds', 'Time spent handling a request, by view.', ['view', 'method'])
+REQUESTS_TOTAL = registry.counter(
+    'writoria_requests_total', 'Requests handled, by view and status code.', ['view', 'status'])
+DB_QUERIES = registry.histogram(
+    'writoria_db_queries_per_request', 'SQL queries issued per request, by view.', ['view'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250))
+DB_TIME = registry.histogram(
+    'writoria_db_time_seconds', 'Time spent in SQL per request, by view.', ['view'])
+TEMPLATE_TIME = registry.histogram(
+    'writoria_template_render_seconds', 'Time spent rendering templates per request, by view.', ['view'])
+OUTBOUND_TIME = registry.histogram(
+    'writoria_outbound_request_seconds', 'Latency of calls to external services, by target.', ['target'])
+OUTBOUND_ERRORS = registry.counter(
+    'writoria_outbound_errors_total', 'Failed calls to external services, by target.', ['target'])
+
+
+class RequestStats:
+    """Per-request accumulator filled in by the instrumentation hooks"""
+
+    __slots__ = ('started', 'sql_count', 'sql_time', 'queries', 'template_time', 'template_depth',
+                 'template_timings', 'outbound_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        # (seconds, sql) of the slowest queries, as many as the slow request log shows
+        self.queries = []
+        self.template_time = 0.0
+        self.template_depth = 0
+        # Per-template timings are only collected while a request is being profiled
+        self.template_timings = None
+        self.outbound_time = 0.0
+
+
+def current_stats():
+    return _request_stats.get()
+
+
+@contextmanager
+def collect_request_stats():
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+@contextmanager
+def track_outbound(target):
+    """Time a call to an external service such as the Flask API or Ollama"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        OUTBOUND_ERRORS.inc(target=target)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        OUTBOUND_TIME.observe(elapsed, target=target)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.outbound_time += elapsed
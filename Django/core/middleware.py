@@ -0,0 +1,346 @@
+import cProfile
+import heapq
+import io
+import json
+import logging
+import mimetypes
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import nullcontext
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import connection
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.template.base import Template
+from django.utils.http import http_date, parse_etags
+
+from . import metrics
+from .storage import ENCODINGS
+
+logger = logging.getLogger('writoria.performance')
+
+_profiling = threading.Lock()
+
+
+def _record_query(stats, keep, execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.sql_count += 1
+        stats.sql_time += elapsed
+        # Only the slowest ``keep`` are logged, so only they are held: a min-heap on duration
+        if len(stats.queries) < keep:
+            heapq.heappush(stats.queries, (elapsed, sql))
+        elif elapsed > stats.queries[0][0]:
+            heapq.heapreplace(stats.queries, (elapsed, sql))
+
+
+def _instrument_templates():
+    """Wrap Template.render once so top-level render time is attributed to the request"""
+    if getattr(Template.render, '_writoria_instrumented', False):
+        return
+    original = Template.render
+
+    @wraps(original)
+    def render(self, context):
+        stats = metrics.current_stats()
+        if stats is None:
+            return original(self, context)
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.template_depth -= 1
+            if stats.template_depth == 0:
+                # Included templates render inside their parent; count only the outermost call
+                stats.template_time += elapsed
+            if stats.template_timings is not None:
+                stats.template_timings.append({
+                    'name': self.origin.template_name or self.name or '<string>',
+                    'depth': stats.template_depth,
+                    'start_ms': round((start - stats.started) * 1000, 3),
+                    'duration_ms': round(elapsed * 1000, 3),
+                })
+
+    render._writoria_instrumented = True
+    Template.render = render
+
+
+class InstrumentationMiddleware:
+    """
+    Records per-view latency, SQL, template and outbound-call timings into
+    ``core.metrics`` and logs requests slower than
+    ``WRITORIA_SLOW_REQUEST_SECONDS`` together with their slowest queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = getattr(settings, 'WRITORIA_SLOW_REQUEST_SECONDS', 0.5)
+        self.slow_query_count = getattr(settings, 'WRITORIA_SLOW_REQUEST_TOP_QUERIES', 5)
+        _instrument_templates()
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with metrics.collect_request_stats() as stats, \
+                connection.execute_wrapper(partial(_record_query, stats, self.slow_query_count)):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        metrics.REQUEST_DURATION.observe(elapsed, view=view, method=request.method)
+        metrics.REQUESTS_TOTAL.inc(view=view, status=response.status_code)
+        metrics.DB_QUERIES.observe(stats.sql_count, view=view)
+        metrics.DB_TIME.observe(stats.sql_time, view=view)
+        metrics.TEMPLATE_TIME.observe(stats.template_time, view=view)
+
+        if elapsed >= self.slow_threshold:
+            self._log_slow_request(request, view, elapsed, stats)
+        return response
+
+    def _log_slow_request(self, request, view, elapsed, stats):
+        slowest = sorted(stats.queries, key=lambda item: item[0], reverse=True)
+        logger.warning(
+            'Slow request %s %s (view=%s) took %.1fms: %d queries in %.1fms, '
+            'templates %.1fms, outbound %.1fms%s',
+            request.method, request.path, view, elapsed * 1000,
+            stats.sql_count, stats.sql_time * 1000,
+            stats.template_time * 1000, stats.outbound_time * 1000,
+            ''.join(f'\n  {duration * 1000:.1f}ms {sql}' for duration, sql in slowest),
+        )
+
+
+class ProfilingMiddleware:
+    """
+    Profiles opt-in requests: staff can add ``?_profile=1`` or an
+    ``X-Writoria-Profile`` header, and ``WRITORIA_PROFILE_SAMPLE_RATE`` picks a
+    random fraction of all requests. The most recent ``WRITORIA_PROFILE_KEEP``
+    profiles are stored as ``RequestProfile`` rows and browsed in the admin.
+
+    Must be placed after AuthenticationMiddleware.
+    """
+
+    MAX_TIMELINE_ENTRIES = 500
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'WRITORIA_PROFILE_SAMPLE_RATE', 0.0)
+        self.keep = getattr(settings, 'WRITORIA_PROFILE_KEEP', 50)
+        _instrument_templates()
+
+    def _trigger(self, request):
+        if '_profile' in request.GET or 'HTTP_X_WRITORIA_PROFILE' in request.META:
+            # Only touch request.user when asked to, so ordinary requests stay lazy
+            if request.user.is_staff:
+                return 'manual'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        # One profile at a time per process: from Python 3.12 cProfile hooks every
+        # thread and refuses a second active profiler, so concurrent requests
+        # would fail or pick up each other's frames. Others run unprofiled.
+        if not _profiling.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiled = self._profile(request)
+        finally:
+            _profiling.release()
+        if profiled is None:
+            return self.get_response(request)
+        response, elapsed, profiler, timeline, template_timings = profiled
+        self._store(request, response, trigger, elapsed, profiler, timeline, template_timings)
+        return response
+
+    def _profile(self, request):
+        """Handle ``request`` under the profiler, or return None when it cannot be enabled"""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler, e.g. a debugger or coverage, holds the hook
+            return None
+        current = metrics.current_stats()
+        timeline = []
+        try:
+            with (nullcontext(current) if current else metrics.collect_request_stats()) as stats, \
+                    connection.execute_wrapper(partial(self._record_query, stats, timeline)):
+                stats.template_timings = []
+                start = time.perf_counter()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    template_timings, stats.template_timings = stats.template_timings, None
+                elapsed = time.perf_counter() - start
+        finally:
+            profiler.disable()
+        return response, elapsed, profiler, timeline, template_timings
+
+    def _record_query(self, stats, timeline, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(timeline) < self.MAX_TIMELINE_ENTRIES:
+                timeline.append({
+                    'start_ms': round((start - stats.started) * 1000, 3),
+                    'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                    'sql': sql[:2000],
+                })
+
+    def _store(self, request, response, trigger, elapsed, profiler, timeline, template_timings):
+        from .models import RequestProfile
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(60)
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        try:
+            RequestProfile.objects.create(
+                method=request.method,
+                path=request.get_full_path()[:500],
+                view_name=match.view_name if match else '',
+                status_code=response.status_code,
+                trigger=trigger,
+                user=user if user is not None and user.is_authenticated else None,
+                duration_ms=elapsed * 1000,
+                sql_count=len(timeline),
+                sql_time_ms=sum(entry['duration_ms'] for entry in timeline),
+                template_time_ms=sum(t['duration_ms'] for t in template_timings if t['depth'] == 0),
+                profile_text=output.getvalue(),
+                sql_timeline=timeline,
+                template_timings=template_timings,
+            )
+            cutoff = RequestProfile.objects.order_by('-id').values_list('id', flat=True)[self.keep - 1:self.keep]
+            RequestProfile.objects.filter(id__lt=cutoff).delete()
+        except Exception:
+            # A failed profile write must never break the request being profiled
+            logger.exception('Could not store request profile for %s', request.path)
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token)
+    return accepted
+
+
+class StaticAssetMiddleware:
+    """
+    Serves files collected into STATIC_ROOT without touching the rest of the
+    stack. Content-hashed names from the manifest are cached forever
+    (``immutable``); precompressed ``.br``/``.gz`` variants are picked from
+    Accept-Encoding. The file index is built once at startup, so requests
+    never stat the disk.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        prefix = settings.STATIC_URL or ''
+        self.prefix = prefix if prefix.startswith('/') else f'/{prefix}'
+        self.max_age = getattr(settings, 'WRITORIA_STATIC_MAX_AGE', 60)
+        self.assets = self._build_index(settings.STATIC_ROOT)
+
+    def _build_index(self, root):
+        assets = {}
+        if not root or not os.path.isdir(root):
+            return assets
+        immutable = set()
+        manifest_path = os.path.join(root, 'staticfiles.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as fh:
+                immutable.update(json.load(fh).get('paths', {}).values())
+
+        suffixes = {suffix for _, suffix in ENCODINGS}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if os.path.splitext(name)[1] in suffixes:
+                    continue
+                stat = os.stat(path)
+                content_type, _ = mimetypes.guess_type(name)
+                variants = {}
+                for encoding, suffix in ENCODINGS:
+                    if os.path.exists(path + suffix):
+                        variants[encoding] = (path + suffix, os.path.getsize(path + suffix))
+                assets[name] = {
+                    'path': path,
+                    'size': stat.st_size,
+                    'content_type': content_type or 'application/octet-stream',
+                    'etag': f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                    'last_modified': http_date(stat.st_mtime),
+                    'immutable': name in immutable,
+                    'variants': variants,
+                }
+        return assets
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return self.get_response(request)
+        asset = self.assets.get(request.path[len(self.prefix):])
+        if asset is None:
+            return self.get_response(request)
+
+        if asset['immutable']:
+            cache_control = 'public, max-age=31536000, immutable'
+        else:
+            cache_control = f'public, max-age={self.max_age}'
+
+        path, size, encoding = asset['path'], asset['size'], None
+        if asset['variants']:
+            accepted = _accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            for candidate, _ in ENCODINGS:
+                if candidate in accepted and candidate in asset['variants']:
+                    encoding = candidate
+                    path, size = asset['variants'][candidate]
+                    break
+        # Each encoding is a different representation, so it needs its own strong validator
+        etag = f'{asset["etag"][:-1]}-{encoding}"' if encoding else asset['etag']
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            response['Cache-Control'] = cache_control
+            if asset['variants']:
+                response['Vary'] = 'Accept-Encoding'
+            return response
+
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=asset['content_type'])
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=asset['content_type'])
+            response.headers.pop('Content-Disposition', None)
+        response['Content-Length'] = size
+        response['ETag'] = etag
+        response['Last-Modified'] = asset['last_modified']
+        response['Cache-Control'] = cache_control
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if asset['variants']:
+            response['Vary'] = 'Accept-Encoding'
+        return response
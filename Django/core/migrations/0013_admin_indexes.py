@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blogpost',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='blogpost',
+            name='title',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
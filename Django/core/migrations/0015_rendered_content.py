@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+def render_existing_posts(apps, schema_editor):
+    # Uses the current renderer; later versions are applied by render_content
+    from core import rendering
+
+    BlogPost = apps.get_model('core', 'BlogPost')
+    posts = BlogPost.objects.only('id', 'content').order_by('pk')
+    batch = []
+    for post in posts.iterator(chunk_size=500):
+        post.content_html, post.excerpt = rendering.render(post.content)
+        post.renderer_version = rendering.RENDERER_VERSION
+        batch.append(post)
+        if len(batch) == 500:
+            BlogPost.objects.bulk_update(batch, ['content_html', 'excerpt', 'renderer_version'])
+            batch = []
+    BlogPost.objects.bulk_update(batch, ['content_html', 'excerpt', 'renderer_version'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_storedblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='renderer_version',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(render_existing_posts, migrations.RunPython.noop),
+    ]
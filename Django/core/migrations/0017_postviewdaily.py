@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 16:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_authorstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('uniques', models.PositiveIntegerField(default=0)),
+                ('sketch', models.BinaryField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='core.blogpost')),
+            ],
+            options={
+                'verbose_name_plural': 'post views (daily)',
+                'ordering': ['-day'],
+                'unique_together': {('post', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_postviewdaily'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
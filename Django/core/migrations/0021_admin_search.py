@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-19 18:06
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+from core.admin_utils import full_text_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_categorystats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blogpost',
+            name='title',
+            field=models.CharField(max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(django.db.models.functions.text.Lower('title'), name='core_blogpost_title_lower'),
+        ),
+        # After the AlterField, which rebuilds core_blogpost on SQLite
+        full_text_index('core_blogpost', ['content']),
+        full_text_index('core_comment', ['content']),
+        full_text_index('core_userprofile', ['bio']),
+    ]
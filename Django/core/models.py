@@ -1,14 +1,19 @@
-from django.db import models
+from collections import Counter
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
 from django.urls import reverse
-from django.utils.text import slugify
-from django.db.models.signals import post_save
+from django.utils import timezone
+from django.db.models.signals import post_save, post_init, post_delete
 from django.dispatch import receiver
+from . import deletion, facets, live, rendering, slugs, typeahead
+from .storage import upload_storage
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
-    avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    avatar = models.ImageField(upload_to='avatars/', storage=upload_storage, null=True, blank=True)
     website = models.URLField(max_length=200, blank=True)
     contact_number = models.CharField(max_length=10, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -23,10 +28,19 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, created, update_fields=None, **kwargs):
     """Ensure UserProfile is saved when User is saved"""
+    # A new profile was just created; partial saves (last_login, password rehash) leave it alone
+    if created or update_fields:
+        return
     instance.userprofile.save()
 
+class LivePostManager(models.Manager):
+    """Hides posts deleted by their author and awaiting purge (see core.deletion)"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 class BlogPost(models.Model):
     CATEGORY_CHOICES = [
         ('tech', 'Technology'),
@@ -43,23 +57,95 @@ class BlogPost(models.Model):
     slug = models.SlugField(unique=True)
     content = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
-    image = models.ImageField(upload_to='blog_images/', null=True, blank=True)
+    image = models.ImageField(upload_to='blog_images/', storage=upload_storage, null=True, blank=True)
     votes = models.IntegerField(default=0)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='other')
-    
+    # Rendered from content on save; see core.rendering
+    content_html = models.TextField(blank=True, editable=False)
+    excerpt = models.CharField(max_length=rendering.EXCERPT_LENGTH, blank=True, editable=False)
+    renderer_version = models.PositiveSmallIntegerField(default=0, editable=False, db_index=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = LivePostManager()
+    # Includes soft-deleted posts; for slug allocation and the purge worker
+    all_objects = models.Manager()
+
+    RENDERED_FIELDS = ('content_html', 'excerpt', 'renderer_version')
+
+    def render_content(self):
+        self.content_html, self.excerpt = rendering.render(self.content)
+        self.renderer_version = rendering.RENDERER_VERSION
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.title)
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.RENDERED_FIELDS}
+        if self.slug:
+            return super().save(*args, **kwargs)
+        for attempt in range(3):
+            self.slug = slugs.allocate_slug(BlogPost, self.title, exclude_pk=self.pk)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Another request took the same slug between allocation and insert
+                # Soft-deleted posts keep their slug until purged
+                taken = BlogPost.all_objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                self.slug = ''
+                if not taken or attempt == 2:
+                    raise
+
+    class Meta:
+        indexes = [
+            # Serves an author's posts newest first, as paginated on the profile page
+            models.Index(fields=['author', '-created_at', '-id']),
+            # Serves the admin's case-insensitive title prefix search
+            models.Index(Lower('title'), name='core_blogpost_title_lower'),
+        ]
 
     def get_absolute_url(self):
         return reverse('blog_detail', kwargs={'slug': self.slug})
 
+    def soft_delete(self):
+        """
+        Hide the post at once and leave removing its comments, votes, images
+        and files to the background purge.
+        """
+        with transaction.atomic():
+            self.deleted_at = timezone.now()
+            self.save(update_fields=['deleted_at'])
+            # The author's totals stop counting the post and its reactions now
+            AuthorStats.rebuild([self.author_id])
+            transaction.on_commit(deletion.schedule)
+
     def __str__(self):
         return self.title
 
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def forget_post_slug(sender, instance, **kwargs):
+    slugs.cache.forget(slug=instance.slug, pk=instance.pk)
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def reindex_posts(sender, raw=False, **kwargs):
+    if not raw:
+        typeahead.typeahead.changed()
+
+@receiver(post_save, sender=User)
+def reindex_users(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # Logins save last_login only; the index needs the username and active flag
+    if not raw and (created or update_fields is None or {'username', 'is_active'} & set(update_fields)):
+        typeahead.typeahead.changed()
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, **kwargs):
+    typeahead.typeahead.changed()
+
 class Bookmark(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(BlogPost, on_delete=models.CASCADE)
@@ -73,7 +159,7 @@ class Bookmark(models.Model):
 
 class BlogImage(models.Model):
     post = models.ForeignKey(BlogPost, related_name='images', on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='blog_images/')
+    image = models.ImageField(upload_to='blog_images/', storage=upload_storage)
     caption = models.CharField(max_length=200, blank=True)
     order = models.IntegerField(default=0)
 
@@ -108,3 +194,345 @@ class Comment(models.Model):
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
+
+class AuthorStats(models.Model):
+    """Totals shown on an author's profile, kept current by the signal handlers below"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='author_stats')
+    post_count = models.IntegerField(default=0)
+    lives_received = models.IntegerField(default=0)
+    comments_received = models.IntegerField(default=0)
+    bookmarks_received = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    COUNTED_FIELDS = ('post_count', 'lives_received', 'comments_received', 'bookmarks_received')
+
+    def __str__(self):
+        return f"Stats for {self.user.username}"
+
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """Recompute totals from scratch for ``user_ids`` (default: every user)"""
+        if user_ids is None:
+            user_ids = User.objects.values_list('pk', flat=True)
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), 500):
+            cls._rebuild_batch(user_ids[start:start + 500])
+
+    @classmethod
+    def _rebuild_batch(cls, user_ids):
+        totals = {user_id: dict.fromkeys(cls.COUNTED_FIELDS, 0) for user_id in user_ids}
+        # BlogPost.objects leaves out soft-deleted posts; reactions to them are excluded too
+        visible = {'post__deleted_at__isnull': True}
+        sources = [
+            ('post_count', BlogPost.objects.filter(author_id__in=user_ids), 'author_id'),
+            ('lives_received', Vote.objects.filter(post__author_id__in=user_ids, is_life=True, **visible), 'post__author_id'),
+            ('comments_received', Comment.objects.filter(post__author_id__in=user_ids, **visible), 'post__author_id'),
+            ('bookmarks_received', Bookmark.objects.filter(post__author_id__in=user_ids, **visible), 'post__author_id'),
+        ]
+        for field, queryset, author in sources:
+            for user_id, count in queryset.values_list(author).annotate(n=models.Count('pk')).order_by():
+                totals[user_id][field] = count
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, **fields) for user_id, fields in totals.items()],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[*cls.COUNTED_FIELDS, 'updated_at'],
+        )
+
+def adjust_author_stats(deltas, user_id=None, post_id=None):
+    """
+    Add ``deltas`` to an author's totals with one UPDATE. The author is given
+    directly or as the author of ``post_id``. A missing stats row is built
+    from scratch, which already includes the change being recorded.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    if user_id is not None:
+        target = AuthorStats.objects.filter(user_id=user_id)
+    else:
+        author = BlogPost.objects.filter(pk=post_id).values('author_id')[:1]
+        target = AuthorStats.objects.filter(user_id=models.Subquery(author))
+    # Only increments build a missing row; decrements also run while a user is being deleted
+    if not target.update(**changes, updated_at=timezone.now()) and any(d > 0 for d in deltas.values()):
+        if user_id is None:
+            user_id = BlogPost.objects.filter(pk=post_id).values_list('author_id', flat=True).first()
+        if user_id is not None:
+            AuthorStats.rebuild([user_id])
+
+@receiver(post_save, sender=BlogPost)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        adjust_author_stats({'post_count': 1}, user_id=instance.author_id)
+
+@receiver(post_delete, sender=BlogPost)
+def uncount_post(sender, instance, **kwargs):
+    # Votes, comments and bookmarks are deleted first and uncount themselves;
+    # a soft-deleted post was already uncounted when it was hidden
+    if instance.deleted_at is None:
+        adjust_author_stats({'post_count': -1}, user_id=instance.author_id)
+
+class CategoryStats(models.Model):
+    """Live posts per category for the blog list's facets, kept current by the signal handlers below"""
+    category = models.CharField(max_length=20, primary_key=True)
+    post_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'category stats'
+
+    def __str__(self):
+        return f"{self.category}: {self.post_count} posts"
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every category's count from scratch"""
+        counts = dict.fromkeys((code for code, _ in BlogPost.CATEGORY_CHOICES), 0)
+        counts.update(BlogPost.objects.values_list('category').annotate(n=models.Count('pk')).order_by())
+        cls.objects.bulk_create(
+            [cls(category=category, post_count=count) for category, count in counts.items()],
+            update_conflicts=True,
+            unique_fields=['category'],
+            update_fields=['post_count', 'updated_at'],
+        )
+        facets.invalidate()
+
+def adjust_category_stats(deltas):
+    """
+    Add ``{category: delta}`` to the category counts with one UPDATE each.
+    A missing row means the counts were never built; they are rebuilt from
+    scratch, which already includes the change being recorded.
+    """
+    for category, delta in deltas.items():
+        if delta and not CategoryStats.objects.filter(category=category).update(
+                post_count=F('post_count') + delta, updated_at=timezone.now()):
+            CategoryStats.rebuild()
+            break
+    facets.invalidate()
+
+@receiver(post_init, sender=BlogPost)
+def remember_category(sender, instance, **kwargs):
+    # Read through __dict__ so a deferred category is not fetched
+    instance._was_category = instance.__dict__.get('category') if instance.pk else None
+
+@receiver(post_save, sender=BlogPost)
+def count_category(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_category_stats({instance.category: 1})
+    elif update_fields is not None and 'deleted_at' in update_fields and instance.deleted_at is not None:
+        adjust_category_stats({instance._was_category or instance.category: -1})
+    elif instance._was_category is not None and instance.category != instance._was_category:
+        adjust_category_stats({instance._was_category: -1, instance.category: 1})
+    else:
+        # Edits to titles and content still change which posts a search matches
+        facets.invalidate()
+    instance._was_category = instance.category
+
+@receiver(post_delete, sender=BlogPost)
+def uncount_category(sender, instance, **kwargs):
+    # A soft-deleted post was already uncounted when it was hidden
+    if instance.deleted_at is None:
+        adjust_category_stats({instance.category: -1})
+
+@receiver(post_init, sender=Vote)
+def remember_vote(sender, instance, **kwargs):
+    # Read through __dict__ so a deferred is_life is not fetched
+    instance._was_life = instance.__dict__.get('is_life') if instance.pk else None
+
+@receiver(post_save, sender=Vote)
+def count_vote(sender, instance, created, raw=False, **kwargs):
+    was_life = False if created else bool(instance._was_life)
+    if not raw and instance.is_life != was_life:
+        adjust_author_stats({'lives_received': 1 if instance.is_life else -1}, post_id=instance.post_id)
+    instance._was_life = instance.is_life
+
+@receiver(post_delete, sender=Vote)
+def uncount_vote(sender, instance, **kwargs):
+    if instance.is_life:
+        adjust_author_stats({'lives_received': -1}, post_id=instance.post_id)
+
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Bookmark)
+def count_post_reaction(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        field = 'comments_received' if sender is Comment else 'bookmarks_received'
+        adjust_author_stats({field: 1}, post_id=instance.post_id)
+
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Bookmark)
+def uncount_post_reaction(sender, instance, **kwargs):
+    field = 'comments_received' if sender is Comment else 'bookmarks_received'
+    adjust_author_stats({field: -1}, post_id=instance.post_id)
+
+@receiver(post_save, sender=Comment)
+def push_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # Same shape as add_comment's response, so the page renders both alike
+        live.publish(instance.post_id, 'comment', {
+            'comment_id': instance.pk,
+            'parent_id': instance.parent_id,
+            'author': instance.author.username,
+            'content': instance.content,
+            'created_at': instance.created_at.strftime('%b %d, %Y %H:%M'),
+        })
+
+@receiver(post_delete, sender=Comment)
+def push_deleted_comment(sender, instance, **kwargs):
+    live.publish(instance.post_id, 'comment_deleted', {'comment_id': instance.pk})
+
+class PostViewDaily(models.Model):
+    """Views of a post on one day, flushed in batches by core.analytics"""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='daily_views')
+    day = models.DateField(db_index=True)
+    views = models.PositiveIntegerField(default=0)
+    uniques = models.PositiveIntegerField(default=0)
+    # HyperLogLog registers; sketches for several days merge into a unique count for the range
+    sketch = models.BinaryField()
+
+    class Meta:
+        unique_together = ('post', 'day')
+        ordering = ['-day']
+        verbose_name_plural = 'post views (daily)'
+
+    def __str__(self):
+        return f"{self.post_id} on {self.day}: {self.views} views"
+
+class PostRevision(models.Model):
+    """
+    One saved version of a post's title and content, stored by core.revisions
+    as a zlib-compressed delta against the previous revision or, every
+    WRITORIA_REVISION_SNAPSHOT_INTERVAL revisions, as a compressed snapshot.
+    """
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField()
+    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    title = models.CharField(max_length=200)
+    is_snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()
+    # Characters in the reconstructed content, checked against every delta applied to it
+    length = models.PositiveIntegerField()
+    # False for autosaved drafts, True once saved through the edit form
+    published = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('post', 'number')
+        ordering = ['-number']
+
+    def __str__(self):
+        return f"{self.post_id} revision {self.number}"
+
+class RequestProfile(models.Model):
+    """A captured request profile; only the most recent WRITORIA_PROFILE_KEEP are kept"""
+    TRIGGER_CHOICES = [
+        ('manual', 'Requested by staff'),
+        ('sampled', 'Random sample'),
+    ]
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    duration_ms = models.FloatField()
+    sql_count = models.PositiveIntegerField(default=0)
+    sql_time_ms = models.FloatField(default=0)
+    template_time_ms = models.FloatField(default=0)
+    profile_text = models.TextField(blank=True)
+    sql_timeline = models.JSONField(default=list, blank=True)
+    template_timings = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f}ms)"
+
+class StoredBlob(models.Model):
+    """Index of content-addressed uploads with the number of rows referencing each"""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['ref_count', 'updated_at'])]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+# Upload fields whose files are reference counted in StoredBlob
+UPLOAD_FIELDS = {
+    UserProfile: ('avatar',),
+    BlogPost: ('image',),
+    BlogImage: ('image',),
+}
+
+def _file_name(value):
+    return getattr(value, 'name', value) or None
+
+def adjust_blob_refs(name, delta):
+    if name:
+        StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + delta, updated_at=timezone.now())
+
+def add_blob_refs(names, sign=1):
+    """
+    Count new references for rows created without signals, e.g. by
+    bulk_create, or with ``sign=-1`` release those of rows deleted without them.
+    """
+    by_delta = {}
+    for name, refs in Counter(name for name in names if name).items():
+        by_delta.setdefault(refs * sign, []).append(name)
+    for delta, batch in by_delta.items():
+        StoredBlob.objects.filter(name__in=batch).update(ref_count=F('ref_count') + delta, updated_at=timezone.now())
+
+def count_blob_refs(names=None):
+    """``{name: rows referencing it}`` over every upload field, for ``names`` or all files"""
+    counts = Counter()
+    for model, fields in UPLOAD_FIELDS.items():
+        for field in fields:
+            # The base manager also sees soft-deleted posts, whose files are still referenced
+            rows = model._base_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            if names is not None:
+                rows = rows.filter(**{f'{field}__in': names})
+            for name, refs in rows.values_list(field).annotate(refs=models.Count('pk')).order_by().iterator():
+                counts[name] += refs
+    return counts
+
+def remember_upload_names(sender, instance, **kwargs):
+    """Remember the file names a row was loaded with, to spot replaced uploads"""
+    # Deferred fields are absent from __dict__; they are left out of the comparison
+    instance._original_uploads = {
+        field: _file_name(instance.__dict__[field]) for field in UPLOAD_FIELDS[sender] if field in instance.__dict__
+    }
+
+def count_upload_refs(sender, instance, created, **kwargs):
+    fields = UPLOAD_FIELDS[sender]
+    original = getattr(instance, '_original_uploads', {})
+    current = {}
+    for field in fields:
+        if field not in instance.__dict__:
+            continue
+        current[field] = _file_name(instance.__dict__[field])
+        old = None if created else original.get(field)
+        if current[field] != old:
+            adjust_blob_refs(current[field], 1)
+            adjust_blob_refs(old, -1)
+    instance._original_uploads = current
+
+def release_upload_refs(sender, instance, **kwargs):
+    for field in UPLOAD_FIELDS[sender]:
+        if field in instance.__dict__:
+            adjust_blob_refs(_file_name(instance.__dict__[field]), -1)
+
+# Connected per model rather than for every sender, so rows of other models skip them
+for _model in UPLOAD_FIELDS:
+    post_init.connect(remember_upload_names, sender=_model)
+    post_save.connect(count_upload_refs, sender=_model)
+    post_delete.connect(release_upload_refs, sender=_model)
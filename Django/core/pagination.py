@@ -0,0 +1,71 @@
+"""
+Keyset ("cursor") pagination.
+
+Pages are selected with ``WHERE (a, b) < (last_a, last_b)`` on an indexed
+ordering instead of ``OFFSET``, so deep pages cost the same as the first one
+and rows inserted meanwhile do not shift the page boundaries. The cursor is
+an opaque token holding the ordering values of the last row returned.
+"""
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """The values in ``token``, or None if it is missing or malformed"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _after(ordering, values):
+    """Rows that sort after ``values`` under ``ordering``"""
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[i]})
+        for previous, value in zip(ordering[:i], values):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+def cursor_page(queryset, ordering, cursor=None, size=20, key=None):
+    """
+    Return ``(rows, next_cursor)`` for the page after ``cursor``.
+
+    ``ordering`` must end with a unique field (usually ``-id``) so every row
+    has a distinct position. ``next_cursor`` is None on the last page.
+    ``key(row)`` returns a row's ordering values when rows are not model
+    instances (e.g. from ``.values_list()``).
+    """
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(cursor)
+    if values is not None and len(values) == len(ordering):
+        try:
+            queryset = queryset.filter(_after(ordering, values))
+        except (TypeError, ValueError, ValidationError):
+            # A tampered cursor starts again from the first page
+            pass
+    rows = list(queryset[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    last = rows[-1]
+    if key is not None:
+        return rows, encode_cursor(list(key(last)))
+    return rows, encode_cursor([getattr(last, field.lstrip('-')) for field in ordering])
@@ -0,0 +1,168 @@
+"""
+Rate limiting backed by the Django cache.
+
+Views declare a policy with the ``ratelimit`` decorator::
+
+    @ratelimit('comment', rate='10/m', keys=('user',))
+    def add_comment(request, slug): ...
+
+Each key gets a sliding-window counter: hits in the current fixed window
+plus the previous window's hits weighted by how much of it still overlaps
+the sliding window. That is two cache keys per client and one ``add`` or
+``incr`` plus one ``get`` per request (and a ``decr`` giving a rejected hit
+back), with no per-hit timestamps stored.
+Rates in ``WRITORIA_RATE_LIMITS`` override the decorator defaults by policy
+name; ``WRITORIA_RATE_LIMIT_ENABLED = False`` turns limiting off.
+
+Rejected requests get HTTP 429 with ``Retry-After`` and are counted in
+``writoria_rate_limited_total``. If the cache is unavailable requests are
+let through rather than failed.
+"""
+
+import functools
+import logging
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+from . import metrics
+
+logger = logging.getLogger('writoria.ratelimit')
+
+RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+RATE_LIMITED = metrics.registry.counter(
+    'writoria_rate_limited_total', 'Requests rejected by a rate limit, by policy.', ['policy'])
+
+
+def parse_rate(rate):
+    """``'10/m'`` -> ``(10, 60)``; ``'5/10m'`` -> ``(5, 600)``"""
+    match = RATE_RE.match(rate.replace(' ', ''))
+    if not match:
+        raise ValueError(f'Invalid rate {rate!r}; expected e.g. "10/m" or "100/5m"')
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * UNITS[unit]
+
+
+def client_ip(request):
+    """
+    The client address. With ``WRITORIA_TRUSTED_PROXIES = n`` the address is
+    taken from X-Forwarded-For as appended by the nearest ``n`` proxies.
+    """
+    proxies = getattr(settings, 'WRITORIA_TRUSTED_PROXIES', 0)
+    if proxies:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _user_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'u{user.pk}'
+    return None
+
+
+KEY_FUNCTIONS = {
+    'user': _user_key,
+    'ip': lambda request: f'ip{client_ip(request)}',
+    'user_or_ip': lambda request: _user_key(request) or f'ip{client_ip(request)}',
+}
+
+
+class Limiter:
+    """Sliding-window counter for one policy"""
+
+    def __init__(self, policy, limit, period, cache_alias='default'):
+        self.policy = policy
+        self.limit = limit
+        self.period = period
+        self.cache = caches[cache_alias]
+
+    def hit(self, key, now=None):
+        """Count a hit for ``key``; returns 0 if allowed, else seconds until retrying can succeed"""
+        now = time.time() if now is None else now
+        window = int(now // self.period)
+        elapsed = now - window * self.period
+        current_key = f'rl:{self.policy}:{key}:{window}'
+        # Counters live for two periods so the next window can still weight this one
+        if self.cache.add(current_key, 1, self.period * 2):
+            current = 1
+        else:
+            try:
+                current = self.cache.incr(current_key)
+            except ValueError:  # expired between add and incr
+                self.cache.add(current_key, 1, self.period * 2)
+                current = 1
+        previous = self.cache.get(f'rl:{self.policy}:{key}:{window - 1}', 0)
+        weight = 1 - elapsed / self.period
+        if previous * weight + current <= self.limit:
+            return 0
+        # Rejected hits are given back, so a client retrying when told to gets through
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+        if current <= self.limit:
+            # The previous window's share drops below the remaining allowance at this point
+            retry = self.period * (1 - (self.limit - current) / previous) - elapsed
+        else:
+            # This window is full: wait until the next one, where its hits count as the previous window's
+            share = (self.limit - 1) / (current - 1) if self.limit > 1 else 0
+            retry = self.period - elapsed + self.period * (1 - share)
+        # Rounded first so float noise does not add a second
+        return max(1, math.ceil(round(retry, 6)))
+
+
+def _rejected(request, policy, retry_after):
+    RATE_LIMITED.inc(policy=policy)
+    message = 'Too many requests. Please try again later.'
+    if 'text/html' in request.headers.get('Accept', ''):
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    else:
+        response = JsonResponse({'status': 'error', 'error': message, 'message': message}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(policy, rate, keys=('user_or_ip',), methods=('POST',)):
+    """
+    Limit a view to ``rate`` requests per key. ``keys`` names entries of
+    ``KEY_FUNCTIONS``; with several keys (e.g. ``('user', 'ip')``) every one
+    of them must be within the limit. Only ``methods`` are counted.
+    """
+    key_functions = [KEY_FUNCTIONS[name] for name in keys]
+    limiters = {}
+
+    def get_limiter():
+        configured = getattr(settings, 'WRITORIA_RATE_LIMITS', {}).get(policy, rate)
+        limiter = limiters.get(configured)
+        if limiter is None:
+            limiter = limiters[configured] = Limiter(policy, *parse_rate(configured))
+        return limiter
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods and getattr(settings, 'WRITORIA_RATE_LIMIT_ENABLED', True):
+                limiter = get_limiter()
+                for key_function in key_functions:
+                    key = key_function(request)
+                    if key is None:
+                        continue
+                    try:
+                        retry_after = limiter.hit(key)
+                    except Exception:
+                        logger.warning('Rate limit check for %s failed; allowing request', policy, exc_info=True)
+                        break
+                    if retry_after:
+                        return _rejected(request, policy, retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,52 @@
+"""
+Rendering of blog post content.
+
+Posts are written in Markdown (raw HTML allowed) and rendered once, when
+saved, into sanitized HTML plus a plain-text excerpt for cards. Bump
+``RENDERER_VERSION`` whenever the output changes and run
+``manage.py render_content`` to update stored posts.
+"""
+
+import re
+from html import unescape
+
+from django.utils.html import escape, linebreaks, strip_tags
+from django.utils.text import Truncator
+
+try:
+    import markdown
+except ImportError:  # without Markdown, content is shown as escaped paragraphs
+    markdown = None
+
+try:
+    import nh3
+except ImportError:  # without nh3 nothing is trusted and all HTML is escaped
+    nh3 = None
+
+RENDERER_VERSION = 1
+EXCERPT_LENGTH = 300
+
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists', 'nl2br']
+ALLOWED_URL_SCHEMES = {'http', 'https', 'mailto'}
+
+_whitespace_re = re.compile(r'\s+')
+
+
+def render_html(text):
+    """Markdown ``text`` as sanitized HTML"""
+    if markdown is None or nh3 is None:
+        return linebreaks(escape(text))
+    html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS, output_format='html')
+    return nh3.clean(html, url_schemes=ALLOWED_URL_SCHEMES, link_rel='noopener noreferrer nofollow')
+
+
+def make_excerpt(html, length=EXCERPT_LENGTH):
+    # The excerpt is plain text; templates escape it again when displaying it
+    text = _whitespace_re.sub(' ', unescape(strip_tags(html))).strip()
+    return Truncator(text).chars(length)
+
+
+def render(text):
+    """Return ``(html, excerpt)`` for post content"""
+    html = render_html(text or '')
+    return html, make_excerpt(html)
@@ -0,0 +1,240 @@
+"""
+Post drafts and revision history.
+
+The edit page autosaves with small JSON diffs: ``ops`` is a list of
+``[start, delete, insert]`` splices (offsets in characters, ascending and
+non-overlapping) against revision ``base``, plus the resulting ``length``
+as a checksum. A client whose diff does not add up gets ``RevisionConflict``
+and resends the full content against the same base; one whose base is
+stale (the post was saved from another tab) gets it too and must reload.
+
+Every save is a ``PostRevision``. Revisions are stored as zlib-compressed
+splices against the previous revision, with a compressed full snapshot
+every ``WRITORIA_REVISION_SNAPSHOT_INTERVAL`` revisions (or whenever a
+delta would not be much smaller). Rebuilding any revision therefore reads
+one snapshot and at most an interval's worth of deltas in a single query.
+The text of recently saved revisions is also cached, so consecutive
+autosaves do not rebuild their base at all.
+
+An autosaved revision newer than the last published one is the post's
+draft; the edit page reopens it until the form is saved.
+"""
+
+import json
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Subquery
+
+CACHE_SECONDS = 3600
+
+
+class RevisionConflict(Exception):
+    """The client's base revision or diff does not match the stored history"""
+
+    def __init__(self, latest):
+        super().__init__(f'Latest revision is {latest}')
+        self.latest = latest
+
+
+def normalize(text):
+    # Browsers submit textareas with CRLF but edit them with LF
+    return text.replace('\r\n', '\n')
+
+
+def _common_prefix(a, b):
+    # Binary search over slice comparisons runs in C, unlike a character loop
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def diff(old, new):
+    """The single splice turning ``old`` into ``new``, as ``ops``"""
+    if old == new:
+        return []
+    prefix = _common_prefix(old, new)
+    limit = min(len(old), len(new)) - prefix
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return [[prefix, len(old) - prefix - lo, new[prefix:len(new) - lo]]]
+
+
+def apply(text, ops):
+    """Apply ``ops`` to ``text``; raises ValueError for malformed or out-of-range splices"""
+    if not isinstance(ops, list):
+        raise ValueError('ops must be a list')
+    parts, position = [], 0
+    for op in ops:
+        if (not isinstance(op, list) or len(op) != 3 or not isinstance(op[2], str)
+                or not all(type(n) is int for n in op[:2])):
+            raise ValueError(f'Invalid op {op!r}')
+        start, delete, insert = op
+        if start < position or delete < 0 or start + delete > len(text):
+            raise ValueError(f'Op {op!r} is out of order or out of range')
+        parts.append(text[position:start])
+        parts.append(insert)
+        position = start + delete
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def cache_key(post_id, number):
+    return f'revisions:{post_id}:{number}'
+
+
+def _latest(post_id):
+    from .models import PostRevision
+
+    return (PostRevision.objects.filter(post_id=post_id).order_by('-number')
+            .values('number', 'title', 'published', 'created_at').first())
+
+
+def latest_number(post_id):
+    """The number of the post's latest revision, 0 when it has none"""
+    latest = _latest(post_id)
+    return latest['number'] if latest else 0
+
+
+def rebuild(post_id, number):
+    """The content of revision ``number``, from its snapshot and the deltas after it"""
+    from .models import PostRevision
+
+    cached = cache.get(cache_key(post_id, number))
+    if cached is not None:
+        return cached[1]
+    snapshot = (PostRevision.objects.filter(post_id=post_id, is_snapshot=True, number__lte=number)
+                .order_by('-number').values('number')[:1])
+    rows = (PostRevision.objects.filter(post_id=post_id, number__lte=number, number__gte=Subquery(snapshot))
+            .order_by('number').values_list('number', 'is_snapshot', 'data', 'length'))
+    text = None
+    for row_number, is_snapshot, data, length in rows:
+        data = zlib.decompress(data)
+        text = data.decode() if is_snapshot else apply(text, json.loads(data))
+        if len(text) != length:
+            raise ValueError(f'Revision {row_number} of post {post_id} does not rebuild to its length')
+    if text is None or row_number != number:
+        raise PostRevision.DoesNotExist(f'Post {post_id} has no revision {number}')
+    return text
+
+
+def _text_and_title(post, number):
+    if number == 0:
+        # Before the first revision the history starts from the post itself
+        return normalize(post.content), post.title
+    cached = cache.get(cache_key(post.pk, number))
+    if cached is not None:
+        return cached[1], cached[0]
+    from .models import PostRevision
+
+    title = PostRevision.objects.filter(post_id=post.pk, number=number).values_list('title', flat=True).first()
+    return rebuild(post.pk, number), title
+
+
+def _record(post, author, previous, old_text, text, title, published, ops=None):
+    """Create the revision after ``previous`` holding ``text``; returns its number"""
+    from .models import PostRevision
+
+    number = previous + 1
+    interval = getattr(settings, 'WRITORIA_REVISION_SNAPSHOT_INTERVAL', 20)
+    delta = json.dumps(diff(old_text, text) if ops is None else ops, separators=(',', ':'),
+                       ensure_ascii=False).encode()
+    is_snapshot = not previous or (number - 1) % interval == 0 or len(delta) * 2 > len(text)
+    data = zlib.compress(text.encode() if is_snapshot else delta)
+    try:
+        with transaction.atomic():
+            PostRevision.objects.create(
+                post_id=post.pk, number=number, author=author, title=title, is_snapshot=is_snapshot,
+                data=data, length=len(text), published=published,
+            )
+    except IntegrityError:
+        # Another tab saved the same revision number first
+        raise RevisionConflict(number)
+    return number
+
+
+def save(post, author, content=None, ops=None, title=None, base=None, length=None, published=False):
+    """
+    Record a revision of ``post`` from its full ``content`` or from ``ops``
+    against revision ``base`` (0 when the post has no revisions yet) and
+    return ``(number, created)``. ``base`` is required with ``ops`` and, when
+    given, checked with ``content`` too, so a tab behind the history cannot
+    overwrite a newer save. A draft saved against the published post first
+    records the post as published if the history does not end with it (see
+    ``editing_state``). Saving what the latest revision already holds
+    creates nothing; publishing it just marks it published.
+    """
+    from .models import PostRevision
+
+    created = []
+    with transaction.atomic():
+        latest = _latest(post.pk)
+        latest_number = latest['number'] if latest else 0
+        if (ops is not None or base is not None) and base != latest_number:
+            raise RevisionConflict(latest_number)
+        old_text, old_title = _text_and_title(post, latest_number)
+        if not published and (not latest or latest['published']):
+            post_text = normalize(post.content)
+            if not latest or (post_text, post.title) != (old_text, old_title):
+                latest_number = _record(post, author, latest_number, old_text, post_text, post.title, True)
+                created.append((latest_number, post.title, post_text))
+                latest = {'number': latest_number, 'published': True}
+                old_text, old_title = post_text, post.title
+        if ops is not None:
+            try:
+                text = apply(old_text, ops)
+            except ValueError:
+                raise RevisionConflict(latest_number)
+        else:
+            text = normalize(content)
+            ops = diff(old_text, text)
+        if length is not None and len(text) != length:
+            raise RevisionConflict(latest_number)
+        title = old_title if title is None else title[:PostRevision._meta.get_field('title').max_length]
+
+        if latest and not ops and title == old_title:
+            if published and not latest['published']:
+                PostRevision.objects.filter(post_id=post.pk, number=latest_number).update(published=True)
+            number = latest_number
+        else:
+            number = _record(post, author, latest_number, old_text, text, title, published, ops)
+            created.append((number, title, text))
+    for saved_number, saved_title, saved_text in created:
+        cache.set(cache_key(post.pk, saved_number), (saved_title, saved_text), CACHE_SECONDS)
+    return number, bool(created)
+
+
+def editing_state(post):
+    """
+    ``{'revision', 'title', 'content', 'draft'}`` to open the edit form with:
+    the draft when there is one, otherwise the post as published against
+    the latest revision. Opening the form writes nothing; if the history
+    does not end with the published post (a post never edited since
+    revisions began, or changed in the admin), the first autosave records
+    it before the draft.
+    """
+    latest = _latest(post.pk)
+    if latest and not latest['published']:
+        text, title = _text_and_title(post, latest['number'])
+        return {'revision': latest['number'], 'title': title, 'content': text, 'draft': latest['created_at']}
+    return {'revision': latest['number'] if latest else 0, 'title': post.title,
+            'content': normalize(post.content), 'draft': None}
+
+
+def history(post_id):
+    from .models import PostRevision
+
+    return list(PostRevision.objects.filter(post_id=post_id).order_by('-number').values(
+        'number', 'title', 'length', 'published', 'is_snapshot', 'created_at', 'author__username'))
@@ -1,22 +1,148 @@
+"""
+Contact form submissions, stored by the Flask contact service.
+
+``WRITORIA_CONTACT_TRANSPORT`` picks how a submission gets there:
+
+- ``HTTPContactTransport`` (the default) posts it to the service's
+  ``/api/contact`` endpoint at ``WRITORIA_CONTACT_API_URL``.
+- ``SQLAlchemyContactTransport`` writes the service's ``contact`` table
+  directly at ``WRITORIA_CONTACT_DATABASE_URL``, for deployments where
+  Django and the service share a host and database. It saves the HTTP
+  round trip and the service's second parse of the body; it needs the
+  sqlalchemy package.
+
+Both share ``ContactTransport.submit``, which validates a submission and
+folds a repeat of a message recently sent from the same email address
+(see core.duplicates) before either delivers it; the service stores what
+it is given, so each message is checked once. Both answer as the endpoint
+does: ``(payload, status)`` with 201 when stored (or folded), 400 when a
+required field is missing or a field is not text and 500 when storing
+failed. ``HTTPContactTransport`` answers 503 when the service cannot be
+reached.
+"""
+
+import functools
+import logging
+from datetime import datetime, timezone
+
 import requests
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from core import duplicates
+from core.metrics import track_outbound
+
+try:
+    import sqlalchemy
+except ImportError:  # sqlalchemy is optional; only SQLAlchemyContactTransport needs it
+    sqlalchemy = None
+
+logger = logging.getLogger('writoria.contact')
 
 FLASK_API_URL = 'http://localhost:5000/api'
 
-class APIClient:
-    @staticmethod
-    def submit_contact_form(name, email, subject, message):
-        """Submit contact form to Flask API"""
+STORED = {'message': 'Message sent successfully'}
+MISSING_FIELDS = {'message': 'Name, email and message are required'}
+SUBJECT_NOT_TEXT = {'message': 'Subject must be text'}
+
+
+class ContactTransport:
+    """Validation and duplicate folding for every transport; ``send`` delivers what passes"""
+
+    def submit(self, name, email, subject, message):
+        if not all(isinstance(field, str) and field for field in (name, email, message)):
+            return dict(MISSING_FIELDS), 400
+        if subject is not None and not isinstance(subject, str):
+            return dict(SUBJECT_NOT_TEXT), 400
+        # Per email only: visitors sharing an address (or a proxy) must not fold each other's messages
+        decision = duplicates.check('contact', message, fold=[('email', email.strip().casefold())])
+        if decision.action != duplicates.ACCEPT:
+            return dict(STORED), 201
+        payload, status = self.send(name, email, subject, message)
+        if status == 201:
+            decision.accept()
+        return payload, status
+
+    def send(self, name, email, subject, message):
+        raise NotImplementedError
+
+
+class HTTPContactTransport(ContactTransport):
+    """Posts submissions to the Flask contact endpoint"""
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url or getattr(settings, 'WRITORIA_CONTACT_API_URL', FLASK_API_URL)
+
+    def send(self, name, email, subject, message):
         try:
-            response = requests.post(
-                f'{FLASK_API_URL}/contact',
-                json={
-                    'name': name,
-                    'email': email,
-                    'subject': subject,
-                    'message': message
-                }
-            )
+            with track_outbound('flask_api'):
+                response = requests.post(
+                    f'{self.base_url}/contact',
+                    json={
+                        'name': name,
+                        'email': email,
+                        'subject': subject,
+                        'message': message
+                    }
+                )
             return response.json(), response.status_code
         except requests.RequestException as e:
-            return {'error': str(e)}, 500
\ No newline at end of file
+            return {'error': str(e)}, 503
+
+
+@functools.cache
+def _contact_table(url):
+    """The Flask service's ``contact`` table on a shared engine for ``url``, created if missing"""
+    engine = sqlalchemy.create_engine(url)
+    table = sqlalchemy.Table(
+        'contact', sqlalchemy.MetaData(),
+        sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+        sqlalchemy.Column('name', sqlalchemy.String(100), nullable=False),
+        sqlalchemy.Column('email', sqlalchemy.String(120), nullable=False),
+        sqlalchemy.Column('subject', sqlalchemy.String(200)),
+        sqlalchemy.Column('message', sqlalchemy.Text, nullable=False),
+        sqlalchemy.Column('created_at', sqlalchemy.DateTime),
+    )
+    # As the service does when it starts on an empty database
+    table.create(engine, checkfirst=True)
+    return engine, table
+
+
+class SQLAlchemyContactTransport(ContactTransport):
+    """Writes submissions to the Flask service's database in this process"""
+
+    def __init__(self, url=None):
+        if sqlalchemy is None:
+            raise ImproperlyConfigured('SQLAlchemyContactTransport requires the sqlalchemy package')
+        self.url = url or getattr(settings, 'WRITORIA_CONTACT_DATABASE_URL', None)
+        if not self.url:
+            raise ImproperlyConfigured('SQLAlchemyContactTransport requires WRITORIA_CONTACT_DATABASE_URL')
+
+    def send(self, name, email, subject, message):
+        try:
+            with track_outbound('contact_db'):
+                engine, table = _contact_table(self.url)
+                with engine.begin() as connection:
+                    connection.execute(table.insert().values(
+                        name=name,
+                        email=email,
+                        subject=subject,
+                        message=message,
+                        # Naive UTC, as the service's datetime.utcnow default stores it
+                        created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+                    ))
+            return dict(STORED), 201
+        except sqlalchemy.exc.SQLAlchemyError as e:
+            logger.exception('Error storing contact submission')
+            return {'message': f'An error occurred processing your request: {e}'}, 500
+
+
+def get_contact_transport():
+    return import_string(getattr(settings, 'WRITORIA_CONTACT_TRANSPORT', 'core.services.api.HTTPContactTransport'))()
+
+
+class APIClient:
+    @staticmethod
+    def submit_contact_form(name, email, subject, message):
+        """Submit contact form through the configured transport"""
+        return get_contact_transport().submit(name, email, subject, message)
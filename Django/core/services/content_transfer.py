@@ -0,0 +1,155 @@
+import json
+import os
+import tarfile
+from contextlib import contextmanager
+
+from django.core.files.storage import default_storage
+from django.db import models
+
+from core.models import BlogPost, BlogImage, Comment, Vote, Bookmark
+from core.storage import backfill_blobs
+
+FORMAT_VERSION = 1
+DEFAULT_CHUNK_SIZE = 2000
+
+# Export order matters: every record only references records that were
+# written before it, so the importer can resolve ids in a single pass.
+EXPORT_SPECS = [
+    ('blogpost', BlogPost, ['id', 'title', 'slug', 'content', 'author__username',
+                            'created_at', 'updated_at', 'image', 'votes', 'category']),
+    ('blogimage', BlogImage, ['id', 'post_id', 'image', 'caption', 'order']),
+    ('comment', Comment, ['id', 'post_id', 'author__username', 'content',
+                          'created_at', 'updated_at', 'parent_id']),
+    ('vote', Vote, ['id', 'user__username', 'post_id', 'is_life', 'created_at']),
+    ('bookmark', Bookmark, ['id', 'user__username', 'post_id', 'created_at']),
+]
+
+MEDIA_FIELDS = {
+    'blogpost': 'image',
+    'blogimage': 'image',
+}
+
+
+def iter_records(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield plain dict records for every exported model, in dependency order"""
+    for kind, model, fields in EXPORT_SPECS:
+        rows = model.objects.order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size)
+        for row in rows:
+            record = {'model': kind}
+            for name, value in zip(fields, row):
+                record[name.replace('__', '_')] = value
+            yield record
+
+
+def encode_record(record):
+    return json.dumps(record, default=_json_default, separators=(',', ':')) + '\n'
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def write_media_archive(fileobj, names):
+    """Stream the given storage paths into an uncompressed tar stream"""
+    written = 0
+    with tarfile.open(fileobj=fileobj, mode='w|') as archive:
+        for name in names:
+            if not name or not default_storage.exists(name):
+                continue
+            info = tarfile.TarInfo(name)
+            info.size = default_storage.size(name)
+            with default_storage.open(name, 'rb') as source:
+                archive.addfile(info, source)
+            written += 1
+    return written
+
+
+def read_media_archive(fileobj, overwrite=False):
+    """
+    Restore files from a tar stream produced by ``write_media_archive``.
+    Files keep their archived names, which rows refer to, and are indexed
+    as blobs so the references the import then counts protect them.
+    """
+    restored, skipped = [], 0
+    with tarfile.open(fileobj=fileobj, mode='r|') as archive:
+        for member in archive:
+            name = os.path.normpath(member.name)
+            if not member.isfile() or os.path.isabs(name) or name.startswith('..'):
+                skipped += 1
+                continue
+            if default_storage.exists(name):
+                if not overwrite:
+                    skipped += 1
+                    continue
+                default_storage.delete(name)
+            restored.append(default_storage.save(name, archive.extractfile(member)))
+    backfill_blobs(restored)
+    return len(restored), skipped
+
+
+@contextmanager
+def preserved_timestamps(*model_classes):
+    """Temporarily disable auto_now/auto_now_add so imported dates are kept"""
+    saved = []
+    for model in model_classes:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.DateTimeField) and (field.auto_now or field.auto_now_add):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+class Checkpoint:
+    """Resumable import position plus the old->new id maps built so far.
+
+    The position is rewritten atomically after each committed batch; id
+    mappings are appended to a sidecar file so the checkpoint itself stays
+    small no matter how large the import is.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.map_path = f'{path}.map' if path else None
+        self.offset = 0
+        self.line = 0
+        self.id_maps = {'blogpost': {}, 'comment': {}}
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with open(self.path) as fh:
+            state = json.load(fh)
+        self.offset = state['offset']
+        self.line = state['line']
+        if os.path.exists(self.map_path):
+            with open(self.map_path) as fh:
+                for entry in fh:
+                    kind, old, new = entry.split()
+                    self.id_maps[kind][int(old)] = None if new == '-' else int(new)
+        return True
+
+    def record(self, offset, line, new_mappings):
+        if not self.path:
+            return
+        if new_mappings:
+            with open(self.map_path, 'a') as fh:
+                for kind, old, new in new_mappings:
+                    fh.write(f'{kind} {old} {"-" if new is None else new}\n')
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump({'version': FORMAT_VERSION, 'offset': offset, 'line': line}, fh)
+        os.replace(tmp_path, self.path)
+        self.offset = offset
+        self.line = line
+
+    def clear(self):
+        for path in (self.path, self.map_path):
+            if path and os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,100 @@
+"""
+Blog post galleries: attaching uploaded images and editing their order and
+captions in bulk.
+
+Files are written first, concurrently and outside any transaction, so the
+database is only held for the inserts. If attaching fails afterwards the
+written blobs are unreferenced and ``gc_media`` removes them.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from core.models import BlogImage, add_blob_refs
+
+
+def split_captions(text):
+    """One caption per non-empty line, in upload order"""
+    return [line.strip() for line in (text or '').split('\n') if line.strip()]
+
+
+def store_images(files):
+    """Write uploaded gallery files concurrently and return their storage names"""
+    if not files:
+        return []
+    field = BlogImage._meta.get_field('image')
+    storage = field.storage
+    names = [field.generate_filename(None, upload.name) for upload in files]
+    workers = min(len(files), getattr(settings, 'WRITORIA_GALLERY_WRITE_WORKERS', 4))
+
+    if hasattr(storage, 'write_blob'):
+        # Content-addressed storage: hash and write in the pool, index blobs once
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            blobs = list(pool.map(storage.write_blob, names, files))
+        storage.register_blobs(blobs)
+        return [name for name, _, _ in blobs]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(storage.save, names, files))
+
+
+def attach_images(post, names, captions=()):
+    """
+    Append already stored images to the end of ``post``'s gallery with one
+    INSERT. Returns the created ``BlogImage`` rows.
+    """
+    if not names:
+        return []
+    with transaction.atomic():
+        last = post.images.aggregate(last=Max('order'))['last']
+        start = 0 if last is None else last + 1
+        images = BlogImage.objects.bulk_create([
+            BlogImage(
+                post=post,
+                image=name,
+                caption=captions[i] if i < len(captions) else '',
+                order=start + i,
+            )
+            for i, name in enumerate(names)
+        ])
+        # bulk_create skips post_save, so reference counts are updated here
+        add_blob_refs(names)
+    return images
+
+
+def update_gallery(post, order=None, captions=None):
+    """
+    Apply gallery edits with a single UPDATE.
+
+    ``order`` lists image ids in their new order; images not listed keep
+    their relative order after the listed ones. ``captions`` maps image ids
+    to new captions. Ids that do not belong to ``post`` are ignored.
+    """
+    if not order and not captions:
+        return 0
+    captions = captions or {}
+    images = list(post.images.only('id', 'post', 'order', 'caption'))
+    if order:
+        position = {image_id: i for i, image_id in enumerate(order)}
+        images.sort(key=lambda image: (position.get(image.id, len(position)), image.order))
+
+    changed, fields = [], set()
+    for i, image in enumerate(images):
+        dirty = False
+        if order and image.order != i:
+            image.order = i
+            fields.add('order')
+            dirty = True
+        caption = captions.get(image.id)
+        if caption is not None and caption != image.caption:
+            image.caption = caption
+            fields.add('caption')
+            dirty = True
+        if dirty:
+            changed.append(image)
+    if changed:
+        BlogImage.objects.bulk_update(changed, sorted(fields))
+    return len(changed)
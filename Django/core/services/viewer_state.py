@@ -0,0 +1,51 @@
+"""
+Per-viewer state for posts: whether the current user bookmarked each post
+and how they voted on it.
+
+State for a page of posts is read with one query per table and remembered
+on the user object for the rest of the request, so templates and views
+asking again need no queries. Nothing outlives the request, so a bookmark
+or vote made by another process is always seen. ``toggle_bookmark`` and
+``vote_post`` call ``forget`` after changing either.
+"""
+
+from core.models import Bookmark, Vote
+
+# (is_bookmarked, vote) where vote is True/False for a cast vote, else None
+EMPTY_STATE = (False, None)
+
+
+def _memo(user):
+    # request.user is rebuilt for every request, so this lives as long as the request
+    memo = getattr(user, '_viewer_state', None)
+    if memo is None:
+        memo = user._viewer_state = {}
+    return memo
+
+
+def get_viewer_state(user, post_ids):
+    """Map each of ``post_ids`` to ``(is_bookmarked, vote)`` for ``user``"""
+    post_ids = list(dict.fromkeys(post_ids))
+    if not user.is_authenticated or not post_ids:
+        return {post_id: EMPTY_STATE for post_id in post_ids}
+
+    memo = _memo(user)
+    missing = [post_id for post_id in post_ids if post_id not in memo]
+    if missing:
+        bookmarked = set(Bookmark.objects.filter(user=user, post_id__in=missing).values_list('post_id', flat=True))
+        votes = dict(Vote.objects.filter(user=user, post_id__in=missing).values_list('post_id', 'is_life'))
+        memo.update((post_id, (post_id in bookmarked, votes.get(post_id))) for post_id in missing)
+    return {post_id: memo[post_id] for post_id in post_ids}
+
+
+def attach_viewer_state(user, posts):
+    """Set ``is_bookmarked`` and ``user_vote`` on each post; returns ``posts`` as a list"""
+    posts = list(posts)
+    state = get_viewer_state(user, [post.pk for post in posts])
+    for post in posts:
+        post.is_bookmarked, post.user_vote = state[post.pk]
+    return posts
+
+
+def forget(user, post_id):
+    _memo(user).pop(post_id, None)
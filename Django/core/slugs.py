@@ -0,0 +1,144 @@
+"""
+Blog post slugs: allocating unique slugs and resolving slugs to post ids.
+
+``allocate_slug`` finds the next free ``title-N`` suffix with one range query
+on the slug index. ``post_id_for`` keeps a bounded, per-process LRU of
+slug -> id so endpoints that only need the id (votes, bookmarks, comments)
+skip loading the post; ``models.py`` evicts entries when a post is saved or
+deleted. Other processes keep theirs, so a cached id may belong to a post
+another worker has since soft-deleted: writes by id go through
+``existing_post``, which refuses them for posts that are hidden or gone.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import Http404
+from django.utils.text import slugify
+
+SLUG_MAX_LENGTH = 50
+FALLBACK_SLUG = 'post'
+
+
+def allocate_slug(model, title, taken=(), exclude_pk=None):
+    """
+    Return ``slugify(title)``, or ``<slug>-N`` with the smallest N above every
+    existing suffix if that slug is in use. ``taken`` holds extra slugs to
+    avoid, e.g. rows not yet inserted by a bulk import.
+    """
+    base = slugify(title)[:SLUG_MAX_LENGTH].strip('-') or FALLBACK_SLUG
+    # Leave room for a suffix such as "-123"
+    stem = base[:SLUG_MAX_LENGTH - 8].strip('-') or FALLBACK_SLUG
+    # The base slug itself, or stem-* as an index range ('.' sorts right after '-')
+    # The base manager also sees soft-deleted posts, which keep their slug until purged
+    queryset = model._base_manager.filter(
+        Q(slug=base) | Q(slug__gte=stem + '-', slug__lt=stem + '.')
+    )
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    used = set(taken)
+    used.update(queryset.values_list('slug', flat=True))
+    if base not in used:
+        return base
+
+    suffix_re = re.compile(re.escape(stem) + r'-(\d+)$')
+    highest = 1
+    for slug in used:
+        match = suffix_re.match(slug)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return f'{stem}-{highest + 1}'
+
+
+class SlugCache:
+    """Thread-safe LRU mapping slugs to primary keys"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+        self._slugs = {}
+        self._lock = threading.Lock()
+
+    def get(self, slug):
+        with self._lock:
+            pk = self._ids.get(slug)
+            if pk is not None:
+                self._ids.move_to_end(slug)
+            return pk
+
+    def set(self, slug, pk):
+        with self._lock:
+            self._ids[slug] = pk
+            self._ids.move_to_end(slug)
+            self._slugs[pk] = slug
+            while len(self._ids) > self.maxsize:
+                _, evicted = self._ids.popitem(last=False)
+                self._slugs.pop(evicted, None)
+
+    def forget(self, slug=None, pk=None):
+        with self._lock:
+            if pk is not None:
+                old_slug = self._slugs.pop(pk, None)
+                if old_slug is not None:
+                    self._ids.pop(old_slug, None)
+            if slug is not None:
+                old_pk = self._ids.pop(slug, None)
+                if old_pk is not None:
+                    self._slugs.pop(old_pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self._slugs.clear()
+
+
+cache = SlugCache(getattr(settings, 'WRITORIA_SLUG_CACHE_SIZE', 1024))
+
+
+def post_id_for(slug):
+    """The id of the post with ``slug``, or None; hits are served from memory"""
+    from .models import BlogPost
+
+    pk = cache.get(slug)
+    if pk is None:
+        pk = BlogPost.objects.filter(slug=slug).values_list('pk', flat=True).first()
+        if pk is not None:
+            cache.set(slug, pk)
+    return pk
+
+
+def post_id_or_404(slug):
+    pk = post_id_for(slug)
+    if pk is None:
+        raise Http404('No post found matching the slug')
+    return pk
+
+
+class _PostGone(Exception):
+    pass
+
+
+@contextmanager
+def existing_post(pk):
+    """
+    Run a write that references post ``pk`` in a transaction, rolled back
+    with a 404 when the post is hidden or gone; a cached id can belong to a
+    post another process has soft-deleted or purged. The post is checked
+    after the write, while the write's lock is held, so a soft delete cannot
+    land in between. The stale cache entry is dropped.
+    """
+    from .models import BlogPost
+
+    try:
+        with transaction.atomic():
+            yield
+            if not BlogPost.objects.filter(pk=pk).exists():
+                raise _PostGone
+    except (IntegrityError, _PostGone):
+        cache.forget(pk=pk)
+        raise Http404('No post found matching the slug')
@@ -0,0 +1,213 @@
+import gzip
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+from datetime import timedelta
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, HashedFilesMixin
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils import timezone
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; only gzip variants are built without it
+    brotli = None
+
+logger = logging.getLogger('writoria.static')
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.xml', '.html', '.map', '.ttf', '.ico'}
+MIN_COMPRESS_SIZE = 256
+
+_warned_missing = set()
+
+ENCODINGS = [
+    # (Content-Encoding, file suffix), in order of preference
+    ('br', '.br'),
+    ('gzip', '.gz'),
+]
+
+
+def compress_file(path):
+    """Write .gz (and .br when available) next to ``path`` if they are smaller"""
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as fh:
+                fh.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static files with precompressed gzip/brotli variants built
+    at ``collectstatic`` time, so nothing is compressed per request.
+
+    Templates referencing files that have not been collected (tests, a fresh
+    checkout) fall back to the unhashed URL instead of raising.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths)
+        names.update(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                for variant in compress_file(self.path(name)):
+                    yield os.path.relpath(variant, self.location), variant, True
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            if name not in _warned_missing:
+                _warned_missing.add(name)
+                logger.warning('Static file %s is not in the manifest; run collectstatic', name)
+            return super(HashedFilesMixin, self).url(name)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each upload under the SHA-256 of its contents, e.g.
+    ``blog_images/3f/a2/3fa2...e9.jpg``, so identical uploads share one file.
+
+    The digest is computed while the upload is streamed to a temporary file,
+    which is then atomically moved into place (or dropped if the blob already
+    exists). Every blob is recorded in ``StoredBlob``; reference counts are
+    maintained by model signals and ``gc_media`` deletes unreferenced blobs.
+    """
+
+    incoming_dir = '.incoming'
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content, so an existing file is the same blob
+        return name
+
+    def _save(self, name, content):
+        blob = self.write_blob(name, content)
+        self.register_blobs([blob])
+        return blob[0]
+
+    def write_blob(self, name, content):
+        """
+        Write ``content`` under its digest and return ``(name, sha256, size)``.
+
+        Only touches the filesystem, so it is safe to call from worker threads;
+        callers are responsible for ``register_blobs``.
+        """
+        incoming = os.path.join(self.location, self.incoming_dir)
+        os.makedirs(incoming, exist_ok=True)
+        hasher = hashlib.sha256()
+        size = 0
+        if hasattr(content, 'seek') and content.seekable():
+            content.seek(0)
+        with tempfile.NamedTemporaryFile(dir=incoming, delete=False) as tmp:
+            for chunk in content.chunks():
+                hasher.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        digest = hasher.hexdigest()
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        final_name = posixpath.join(directory, digest[:2], digest[2:4], digest + extension)
+        final_path = self.path(final_name)
+
+        if os.path.exists(final_path):
+            os.remove(tmp.name)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.chmod(tmp.name, self.file_permissions_mode or 0o644)
+            os.replace(tmp.name, final_path)
+        return final_name, digest, size
+
+    def register_blobs(self, blobs):
+        """
+        Record ``(name, sha256, size)`` tuples in the blob index. A blob that
+        is already indexed has its ``updated_at`` refreshed in the same
+        statement, so ``collect_unreferenced_blobs`` leaves a reused blob
+        alone until the new reference is counted.
+        """
+        from .models import StoredBlob
+
+        unique = {name: (digest, size) for name, digest, size in blobs}
+        now = timezone.now()
+        StoredBlob.objects.bulk_create(
+            [StoredBlob(name=name, sha256=digest, size=size, updated_at=now) for name, (digest, size) in unique.items()],
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['updated_at'],
+        )
+
+
+def upload_storage():
+    """Storage used by user upload fields; configured as STORAGES['uploads']"""
+    return storages['uploads']
+
+
+def backfill_blobs(names):
+    """
+    Index files in ``names`` that have no ``StoredBlob`` row, such as uploads
+    saved before content addressing, with the number of rows referencing
+    them now, so they are released and collected like any other blob. Names
+    missing from storage are skipped. Returns the rows created.
+    """
+    from .models import StoredBlob, count_blob_refs
+
+    names = {name for name in names if name}
+    missing = names - set(StoredBlob.objects.filter(name__in=names).values_list('name', flat=True))
+    if not missing:
+        return 0
+    storage = upload_storage()
+    refs = count_blob_refs(missing)
+    rows = []
+    for name in sorted(missing):
+        if not storage.exists(name):
+            continue
+        hasher = hashlib.sha256()
+        size = 0
+        with storage.open(name) as fh:
+            for chunk in fh.chunks():
+                hasher.update(chunk)
+                size += len(chunk)
+        rows.append(StoredBlob(name=name, sha256=hasher.hexdigest(), size=size, ref_count=refs[name]))
+    return len(StoredBlob.objects.bulk_create(rows, ignore_conflicts=True))
+
+
+def collect_unreferenced_blobs(grace_hours, dry_run=False, report=None, names=None):
+    """
+    Delete uploads that have had no references for at least ``grace_hours``
+    (so an upload still being registered is never caught), only among
+    ``names`` when given. Returns ``(files, bytes)`` freed, or that would be
+    with ``dry_run``; ``report`` is called with each name.
+    """
+    from .models import StoredBlob
+
+    storage = upload_storage()
+    cutoff = timezone.now() - timedelta(hours=grace_hours)
+    candidates = StoredBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff)
+    if names is not None:
+        candidates = candidates.filter(name__in=names)
+    deleted = freed = 0
+    for blob_id, name, size in candidates.values_list('id', 'name', 'size').iterator():
+        if not dry_run:
+            # Re-check the condition while deleting, in case the blob was reused meanwhile
+            removed, _ = StoredBlob.objects.filter(id=blob_id, ref_count__lte=0, updated_at__lt=cutoff).delete()
+            if not removed:
+                continue
+            storage.delete(name)
+        if report is not None:
+            report(name)
+        deleted += 1
+        freed += size
+    return deleted, freed
@@ -1,3 +1,2387 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta, timezone
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone as django_timezone
+
+from core import (
+    analytics, deletion, duplicates, facets, feeds, live, metrics, middleware, models, pagination, ratelimit,
+    rendering, revisions, slugs, storage, typeahead,
+)
+from core.models import (
+    AuthorStats, BlogImage, BlogPost, Bookmark, CategoryStats, Comment, PostRevision, PostViewDaily, RequestProfile,
+    StoredBlob, Vote,
+)
+from core.services import api, gallery, viewer_state
+
+try:
+    import flask_sqlalchemy
+except ImportError:  # the contract test runs the Flask service, which needs it
+    flask_sqlalchemy = None
+
+FLASK_APP_DIR = settings.BASE_DIR.parent / 'Flask' / 'flask_app'
+
+
+def load_contact_service(database_url):
+    """Import the Flask contact service against ``database_url``"""
+    os.environ['CONTACT_DATABASE_URL'] = database_url
+    sys.path.insert(0, str(FLASK_APP_DIR))
+    try:
+        spec = importlib.util.spec_from_file_location('writoria_contact_service', FLASK_APP_DIR / 'app.py')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(FLASK_APP_DIR))
+        del os.environ['CONTACT_DATABASE_URL']
+    with module.app.app_context():
+        module.db.create_all()
+    return module
+
+
+@unittest.skipUnless(api.sqlalchemy and flask_sqlalchemy, 'needs sqlalchemy and the Flask service requirements')
+class ContactTransportContractTests(SimpleTestCase):
+    """The same submissions through HTTP and in-process must answer and store alike"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from werkzeug.serving import make_server
+
+        cls.tempdir = tempfile.TemporaryDirectory()
+        cls.database_url = f'sqlite:///{cls.tempdir.name}/contact.db'
+        cls.service = service = load_contact_service(cls.database_url)
+        service.app.logger.setLevel(logging.WARNING)
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        cls.server = make_server('127.0.0.1', 0, service.app, threaded=True)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.transports = {
+            'http': api.HTTPContactTransport(f'http://127.0.0.1:{cls.server.server_port}/api'),
+            'in_process': api.SQLAlchemyContactTransport(cls.database_url),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        engine, _ = api._contact_table(cls.database_url)
+        engine.dispose()
+        api._contact_table.cache_clear()
+        cls.tempdir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.addCleanup(duplicates.index.clear)
+
+    def rows(self, email):
+        engine, table = api._contact_table(self.database_url)
+        with engine.connect() as connection:
+            return connection.execute(table.select().where(table.c.email == email)).mappings().all()
+
+    def reset(self):
+        """Forget every stored submission and every message remembered for folding"""
+        engine, table = api._contact_table(self.database_url)
+        with engine.begin() as connection:
+            connection.execute(table.delete())
+        duplicates.index.clear()
+
+    def submit_each(self, *submissions):
+        """
+        ``{transport: [(payload, status), ...]}`` for the same submissions sent
+        through each transport from a clean start; the answers and the rows
+        stored must match across transports.
+        """
+        answers, stored = {}, {}
+        for name, transport in self.transports.items():
+            self.reset()
+            answers[name] = [transport.submit(**submission) for submission in submissions]
+            stored[name] = {
+                submission['email']: [(row['name'], row['subject'], row['message'])
+                                      for row in self.rows(submission['email'])]
+                for submission in submissions
+            }
+        self.assertEqual(answers['http'], answers['in_process'])
+        self.assertEqual(stored['http'], stored['in_process'])
+        self.stored = stored['in_process']
+        return answers['in_process']
+
+    def submission(self, **fields):
+        return {'name': 'Ada', 'email': 'ada@example.com', 'subject': 'Hello',
+                'message': 'How do I change the email address on my account?', **fields}
+
+    def test_stores_submission(self):
+        before = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+        self.assertEqual(self.submit_each(self.submission()), [({'message': 'Message sent successfully'}, 201)])
+        self.assertEqual(self.stored['ada@example.com'],
+                         [('Ada', 'Hello', 'How do I change the email address on my account?')])
+        self.assertGreaterEqual(self.rows('ada@example.com')[0]['created_at'], before)
+
+    def test_resubmission_is_stored_once(self):
+        answers = self.submit_each(self.submission(), self.submission(email='ADA@example.com '),
+                                   self.submission(email='grace@example.com'))
+        self.assertEqual([status for _, status in answers], [201, 201, 201])
+        self.assertEqual({email: len(rows) for email, rows in self.stored.items()},
+                         {'ada@example.com': 1, 'ADA@example.com ': 0, 'grace@example.com': 1})
+
+    def test_rejects_missing_fields(self):
+        for field in ('name', 'email', 'message'):
+            with self.subTest(field=field):
+                self.assertEqual(self.submit_each(self.submission(**{field: ''})),
+                                 [({'message': 'Name, email and message are required'}, 400)])
+                self.assertEqual(self.stored, {self.submission(**{field: ''})['email']: []})
+
+    def test_rejects_non_text_fields(self):
+        for field, value in (('name', ['Ada']), ('message', 42), ('subject', 7)):
+            with self.subTest(field=field):
+                self.assertEqual(self.submit_each(self.submission(**{field: value}))[0][1], 400)
+                self.assertEqual(self.stored, {'ada@example.com': []})
+
+    def test_subject_is_optional(self):
+        self.assertEqual(self.submit_each(self.submission(subject=None))[0][1], 201)
+        self.assertIsNone(self.stored['ada@example.com'][0][1])
+
+    def test_text_round_trips(self):
+        message = 'Zoë’s café — naïve “quotes”, emoji 🚀\nand a second line'
+        self.assertEqual(self.submit_each(self.submission(name='Zoë', subject='Ünïcode', message=message))[0][1], 201)
+        self.assertEqual(self.stored['ada@example.com'], [('Zoë', 'Ünïcode', message)])
+
+    def test_unreachable_service(self):
+        payload, status = api.HTTPContactTransport('http://127.0.0.1:9/api').submit('Ada', 'a@example.com', '', 'Hi')
+        self.assertEqual(status, 503)
+        self.assertIn('error', payload)
+
+
+@unittest.skipUnless(flask_sqlalchemy, 'needs the Flask service requirements')
+class ContactServiceTests(SimpleTestCase):
+    """The Flask contact service on its own"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tempdir = tempfile.TemporaryDirectory()
+        cls.service = load_contact_service(f'sqlite:///{cls.tempdir.name}/contact.db')
+        cls.service.app.logger.setLevel(logging.WARNING)
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.service.app.app_context():
+            cls.service.db.engine.dispose()
+        cls.tempdir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = self.service.app.test_client()
+
+    def rows(self, email):
+        with self.service.app.app_context():
+            return self.service.Contact.query.filter_by(email=email).all()
+
+    def test_service_rejects_non_text_fields(self):
+        payload = {'name': 'Ada', 'email': 'types@example.com', 'message': 'Hello there'}
+        for field, value in (('email', 42), ('message', ['Hello']), ('name', {'first': 'Ada'}), ('subject', 7)):
+            with self.subTest(field=field):
+                self.assertEqual(self.client.post('/api/contact', json={**payload, field: value}).status_code, 400)
+        self.assertEqual(self.client.post('/api/contact', json=['not', 'an', 'object']).status_code, 400)
+        self.assertEqual(self.client.post('/api/contact', data='name=Ada').status_code, 400)
+        self.assertEqual(self.rows('types@example.com'), [])
+
+    def test_metrics_need_a_token_or_scrape_address(self):
+        config = self.service.app.config
+        with mock.patch.dict(config, {'METRICS_TOKEN': 's3cret', 'METRICS_SCRAPE_ADDRESSES': []}):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 404)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'writoria_flask_requests_total', response.data)
+        with mock.patch.dict(config, {'METRICS_TOKEN': None, 'METRICS_SCRAPE_ADDRESSES': ['10.0.0.9']}):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+            self.assertEqual(self.client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.9'}).status_code, 200)
+
+
+# Pages render without a collected static manifest
+plain_static_files = override_settings(STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+class TemporaryMediaMixin:
+    """Points MEDIA_ROOT at a directory removed after each test"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+def make_post(author, **fields):
+    fields.setdefault('title', 'A post')
+    fields.setdefault('content', 'Some content')
+    return BlogPost.objects.create(author=author, **fields)
+
+
+class ViewRollupTests(TransactionTestCase):
+    """Buffered views flushed by several workers at once must all be counted"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('viewer-author', password='x')
+        self.post = make_post(self.author, slug='viewed')
+        self.today = django_timezone.localdate()
+
+    def flush_until_written(self, buffer):
+        try:
+            while buffer.pending():
+                buffer.flush()
+        finally:
+            connection.close()
+
+    @override_settings(WRITORIA_VIEW_BUFFER_KEYS=10 ** 6, WRITORIA_VIEW_FLUSH_SECONDS=10 ** 6)
+    def test_overlapping_flushes_add_up(self):
+        buffers = [analytics.ViewBuffer() for _ in range(4)]
+        for round_ in range(3):
+            for n, buffer in enumerate(buffers):
+                for i in range(500):
+                    # Half the visitors come back in every round
+                    visitor = f'{n}:{i}' if i % 2 else f'{round_}:{n}:{i}'
+                    buffer.add(self.post.pk, visitor.encode(), self.today)
+            threads = [threading.Thread(target=self.flush_until_written, args=(buffer,)) for buffer in buffers]
+            # Flushes that find the table locked are logged and retried
+            with mock.patch.object(analytics, 'logger'):
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        row = PostViewDaily.objects.get(post=self.post, day=self.today)
+        self.assertEqual(row.views, 3 * 4 * 500)
+        distinct = 4 * 250 + 3 * 4 * 250
+        # Three standard errors of a 1024-register sketch
+        self.assertLess(abs(row.uniques - distinct) / distinct, 0.1)
+        self.assertEqual(row.uniques, analytics.HyperLogLog(row.sketch).estimate())
+
+    @override_settings(WRITORIA_VIEW_BUFFER_KEYS=10 ** 6, WRITORIA_VIEW_FLUSH_SECONDS=10 ** 6)
+    def test_flush_adds_to_stored_row(self):
+        sketch = analytics.HyperLogLog()
+        for i in range(100):
+            sketch.add(f'earlier:{i}'.encode())
+        PostViewDaily.objects.create(post=self.post, day=self.today, views=150,
+                                     uniques=sketch.estimate(), sketch=bytes(sketch.registers))
+        buffer = analytics.ViewBuffer()
+        for i in range(100):
+            buffer.add(self.post.pk, f'later:{i}'.encode(), self.today)
+        self.assertEqual(buffer.flush(), 100)
+        row = PostViewDaily.objects.get(post=self.post, day=self.today)
+        self.assertEqual(row.views, 250)
+        self.assertLess(abs(row.uniques - 200) / 200, 0.1)
+
+    @override_settings(WRITORIA_VIEW_BUFFER_KEYS=10 ** 6, WRITORIA_VIEW_FLUSH_SECONDS=0.2)
+    def test_last_views_are_flushed_by_the_timer(self):
+        buffer = analytics.ViewBuffer()
+        # No later view arrives to find the interval passed; the timer writes these anyway
+        buffer.add(self.post.pk, b'visitor', self.today)
+        buffer.add(self.post.pk, b'another', self.today)
+        timer = buffer._timer
+        with mock.patch.object(analytics, 'close_old_connections', connection.close):
+            timer.join(5)
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(PostViewDaily.objects.get(post=self.post, day=self.today).views, 2)
+
+    @override_settings(WRITORIA_VIEW_BUFFER_KEYS=10 ** 6, WRITORIA_VIEW_FLUSH_SECONDS=10 ** 6)
+    def test_buffered_views_are_flushed_at_exit(self):
+        with mock.patch.object(analytics.atexit, 'register') as register:
+            analytics.flush_on_exit()
+        exit_handler, = register.call_args.args
+        buffer = analytics.ViewBuffer()
+        buffer.add(self.post.pk, b'visitor', self.today)
+        buffer._timer.cancel()
+        with mock.patch.object(analytics, 'buffer', buffer):
+            exit_handler()
+        self.assertEqual(PostViewDaily.objects.get(post=self.post, day=self.today).views, 1)
+
+    def test_views_of_removed_posts_are_dropped(self):
+        other = make_post(self.author, slug='removed')
+        pending = {(self.post.pk, self.today): [3, {}], (other.pk, self.today): [5, {}]}
+        other.delete()
+        self.assertEqual(analytics.write_rollups(pending), 3)
+        self.assertEqual(list(PostViewDaily.objects.values_list('post_id', 'views')), [(self.post.pk, 3)])
+
+    @override_settings(WRITORIA_VIEW_BUFFER_KEYS=10 ** 6, WRITORIA_VIEW_FLUSH_SECONDS=10 ** 6)
+    def test_totals_merge_sketches_across_days(self):
+        yesterday = self.today - timedelta(days=1)
+        buffer = analytics.ViewBuffer()
+        for i in range(300):
+            buffer.add(self.post.pk, f'v:{i}'.encode(), yesterday)
+            buffer.add(self.post.pk, f'v:{i + 150}'.encode(), self.today)
+        buffer.flush()
+        totals = analytics.view_totals([self.post.pk])[self.post.pk]
+        self.assertEqual(totals['views'], 600)
+        # 450 distinct viewers over the two days, not 600
+        self.assertLess(abs(totals['uniques'] - 450) / 450, 0.1)
+        self.assertEqual([row['views'] for row in analytics.daily_views(self.post.pk)], [300, 300])
+
+
+class RecordingContactTransport(api.ContactTransport):
+    """Stores submissions in memory, answering as the contact service does"""
+    submitted = []
+
+    def send(self, name, email, subject, message):
+        self.submitted.append((name, email, subject, message))
+        return dict(api.STORED), 201
+
+
+class DuplicateSketchTests(SimpleTestCase):
+
+    def test_near_duplicates_score_high(self):
+        a = duplicates.fingerprint('Earn 500 dollars a week from home with this one simple trick, visit cash12.example')
+        b = duplicates.fingerprint('Earn 750 dollars a week from home with this one simple trick!! visit cash99.example')
+        c = duplicates.fingerprint('The second chapter drags a little but the ending makes up for it')
+        self.assertGreaterEqual(duplicates.similarity(a, b), 0.8)
+        self.assertLess(duplicates.similarity(a, c), 0.2)
+        self.assertEqual(duplicates.similarity(a, a), 1.0)
+
+    def test_normalizes_case_and_width(self):
+        self.assertEqual(duplicates.fingerprint('ＧＲＥＡＴ Post'), duplicates.fingerprint('great post'))
+
+
+@override_settings(WRITORIA_DUPLICATE_DETECTION_ENABLED=True)
+class DuplicateIndexTests(SimpleTestCase):
+    text = 'I really enjoyed how this post explains the trade-offs of caching'
+
+    def setUp(self):
+        self.index = duplicates.DuplicateIndex(window=600, min_similarity=0.6)
+
+    def check(self, text, now=0, **scopes):
+        decision = self.index.check('comment', text, now=now, **scopes)
+        decision.accept(ref=now, now=now)
+        return decision
+
+    def test_folds_repeat_in_same_scope(self):
+        self.check(self.text, fold=[('a',)])
+        decision = self.check(self.text + '!', now=5, fold=[('a',)])
+        self.assertEqual((decision.action, decision.ref), (duplicates.FOLD, 0))
+
+    def test_other_scope_is_accepted(self):
+        self.check(self.text, fold=[('a',)])
+        self.assertEqual(self.check(self.text, fold=[('b',)]).action, duplicates.ACCEPT)
+
+    def test_short_texts_are_neither_folded_nor_rejected(self):
+        self.check('Thanks for reading!', fold=[('a',)], reject=[('r',)])
+        decision = self.check('Thanks for reading!', now=1, fold=[('a',)], reject=[('r',)])
+        self.assertEqual(decision.action, duplicates.ACCEPT)
+
+    def test_rejects_long_repeat_elsewhere(self):
+        self.check(self.text, fold=[('a',)], reject=[('user',)])
+        self.assertEqual(self.check(self.text, now=1, fold=[('b',)], reject=[('user',)]).action, duplicates.REJECT)
+
+    def test_window_expires(self):
+        self.check(self.text, fold=[('a',)])
+        self.assertEqual(self.check(self.text, now=601, fold=[('a',)]).action, duplicates.ACCEPT)
+
+    def test_scopes_are_bounded(self):
+        with mock.patch.object(duplicates, 'MAX_SCOPES', 10):
+            for n in range(25):
+                self.check(self.text, now=n, fold=[('scope', n)])
+        self.assertEqual(len(self.index), 10)
+
+    @override_settings(WRITORIA_DUPLICATE_DETECTION_ENABLED=False)
+    def test_disabled(self):
+        self.check(self.text, fold=[('a',)])
+        self.assertEqual(self.check(self.text, fold=[('a',)]).action, duplicates.ACCEPT)
+
+
+@override_settings(
+    WRITORIA_DUPLICATE_DETECTION_ENABLED=True,
+    WRITORIA_RATE_LIMIT_ENABLED=False,
+    WRITORIA_CONTACT_TRANSPORT='core.tests.RecordingContactTransport',
+)
+class DuplicateSubmissionViewTests(TestCase):
+    text = 'I really enjoyed how this post explains the trade-offs of caching'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('dup-author', password='x')
+        cls.reader = User.objects.create_user('dup-reader', password='x')
+        cls.other = User.objects.create_user('dup-other', password='x')
+        cls.post = make_post(cls.author, slug='dup-post')
+        cls.second = make_post(cls.author, slug='dup-second')
+
+    def setUp(self):
+        duplicates.index.clear()
+        self.addCleanup(duplicates.index.clear)
+        RecordingContactTransport.submitted = []
+
+    def comment(self, user, content, slug='dup-post', parent=None):
+        self.client.force_login(user)
+        body = {'content': content}
+        if parent is not None:
+            body['parent_id'] = parent
+        return self.client.post(f'/blog/{slug}/comment/', json.dumps(body), content_type='application/json')
+
+    def test_resubmitted_comment_folds(self):
+        first = self.comment(self.reader, self.text).json()
+        second = self.comment(self.reader, self.text).json()
+        self.assertEqual((second['comment_id'], second['duplicate']), (first['comment_id'], True))
+        self.assertEqual(Comment.objects.filter(author=self.reader).count(), 1)
+
+    def test_same_short_reply_to_different_comments(self):
+        one = self.comment(self.author, 'First!').json()['comment_id']
+        two = self.comment(self.other, 'Second!').json()['comment_id']
+        for parent in (one, two):
+            self.assertEqual(self.comment(self.reader, 'Thanks for reading!', parent=parent).status_code, 200)
+        self.assertEqual(Comment.objects.filter(author=self.reader).count(), 2)
+
+    def test_same_long_reply_to_different_comments_is_refused(self):
+        one = self.comment(self.author, 'First!').json()['comment_id']
+        two = self.comment(self.other, 'Second!').json()['comment_id']
+        self.assertEqual(self.comment(self.reader, self.text, parent=one).status_code, 200)
+        response = self.comment(self.reader, self.text, parent=two)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'You just posted a very similar comment')
+
+    def test_other_users_may_say_the_same(self):
+        self.comment(self.reader, self.text)
+        response = self.comment(self.other, self.text)
+        self.assertNotIn('duplicate', response.json())
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 2)
+
+    def test_pasting_across_posts_is_refused(self):
+        self.comment(self.reader, self.text)
+        self.assertEqual(self.comment(self.reader, self.text, slug='dup-second').status_code, 409)
+        self.assertFalse(Comment.objects.filter(post=self.second).exists())
+
+    def contact(self, email, message='Your search does not find posts by their author name at all'):
+        return self.client.post('/help/', json.dumps({
+            'name': 'Ada', 'email': email, 'subject': 'Search', 'message': message,
+        }), content_type='application/json')
+
+    def test_contact_folds_per_email(self):
+        self.assertEqual(self.contact('ada@example.com').status_code, 200)
+        self.assertEqual(self.contact('ADA@example.com ').status_code, 200)
+        self.assertEqual(len(RecordingContactTransport.submitted), 1)
+
+    def test_contact_from_shared_address_is_kept(self):
+        # Both arrive from the same proxy address
+        self.contact('ada@example.com')
+        self.contact('grace@example.com')
+        self.assertEqual([email for _, email, _, _ in RecordingContactTransport.submitted],
+                         ['ada@example.com', 'grace@example.com'])
+
+    def test_contact_rejects_non_text_fields(self):
+        for email in (None, 42, ['ada@example.com']):
+            with self.subTest(email=email):
+                self.assertEqual(self.contact(email).status_code, 400)
+        response = self.client.post('/help/', '[1, 2]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(RecordingContactTransport.submitted, [])
+
+    def test_contact_service_failures_ask_to_try_again(self):
+        for status in (500, 502, 503):
+            with self.subTest(status=status), mock.patch.object(
+                    RecordingContactTransport, 'send', return_value=({'message': 'database is locked'}, status)):
+                response = self.contact(f'status{status}@example.com')
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response.json()['message'],
+                                 'We could not send your message right now. Please try again later.')
+        self.assertEqual(self.contact('ada@example.com', message='').status_code, 400)
+
+    def test_suggestion_validates_before_checking(self):
+        data = {'name': 'Ada', 'email': 'ada@example.com', 'message': 'Add an archive page listing posts by month'}
+        with mock.patch.object(duplicates, 'check', wraps=duplicates.check) as check:
+            self.assertEqual(self.client.post('/suggestion/', {**data, 'name': ''}).status_code, 400)
+            check.assert_not_called()
+        self.assertEqual(self.client.post('/suggestion/', data).status_code, 200)
+        self.assertEqual(self.client.post('/suggestion/', data).status_code, 200)
+        self.assertEqual(len(RecordingContactTransport.submitted), 1)
+
+
+class BlobStorageTests(TemporaryMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('blob-author', password='x')
+
+    def setUp(self):
+        super().setUp()
+        self.post = make_post(self.author, slug='blob-post')
+
+    def attach(self, data, name='photo.jpg'):
+        image = BlogImage(post=self.post)
+        image.image.save(name, ContentFile(data))
+        return image
+
+    def blob(self, name):
+        return StoredBlob.objects.get(name=name)
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.attach(b'same bytes'), self.attach(b'same bytes', 'other.jpg')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('blog_images/'))
+        blob = self.blob(first.image.name)
+        self.assertEqual((blob.ref_count, blob.size), (2, len(b'same bytes')))
+        self.assertEqual(StoredBlob.objects.count(), 1)
+
+    def test_replacing_and_deleting_release_references(self):
+        image = self.attach(b'old picture')
+        old = image.image.name
+        image.image.save('new.jpg', ContentFile(b'new picture'))
+        self.assertEqual((self.blob(old).ref_count, self.blob(image.image.name).ref_count), (0, 1))
+        image.delete()
+        self.assertEqual(self.blob(image.image.name).ref_count, 0)
+
+    def test_collects_only_stale_unreferenced_blobs(self):
+        kept = self.attach(b'still used').image.name
+        released = self.attach(b'released')
+        stale, fresh = released.image.name, self.attach(b'just released').image.name
+        BlogImage.objects.filter(image__in=[stale, fresh]).delete()
+        StoredBlob.objects.filter(name__in=[kept, stale]).update(updated_at=django_timezone.now() - timedelta(hours=25))
+        uploads = storage.upload_storage()
+        self.assertEqual(storage.collect_unreferenced_blobs(24, dry_run=True), (1, len(b'released')))
+        self.assertTrue(uploads.exists(stale))
+        self.assertEqual(storage.collect_unreferenced_blobs(24), (1, len(b'released')))
+        self.assertFalse(uploads.exists(stale))
+        self.assertEqual(sorted(StoredBlob.objects.values_list('name', flat=True)), sorted([kept, fresh]))
+
+    def test_recount_indexes_files_saved_before_content_addressing(self):
+        with open(os.path.join(self.media_root, 'legacy.jpg'), 'wb') as fh:
+            fh.write(b'legacy bytes')
+        BlogPost.all_objects.filter(pk=self.post.pk).update(image='legacy.jpg')
+        call_command('gc_media', '--recount', stdout=io.StringIO())
+        blob = self.blob('legacy.jpg')
+        self.assertEqual((blob.ref_count, blob.size, blob.sha256),
+                         (1, 12, hashlib.sha256(b'legacy bytes').hexdigest()))
+
+    def test_reuploaded_blob_survives_collection_before_it_is_counted(self):
+        name = self.attach(b'comes back').image.name
+        BlogImage.objects.filter(image=name).delete()
+        StoredBlob.objects.filter(name=name).update(updated_at=django_timezone.now() - timedelta(hours=25))
+        # Written and registered, but the row referencing it is not saved yet
+        uploads = storage.upload_storage()
+        blob = uploads.write_blob('blog_images/again.jpg', ContentFile(b'comes back'))
+        uploads.register_blobs([blob])
+        self.assertEqual(storage.collect_unreferenced_blobs(24), (0, 0))
+        self.assertTrue(uploads.exists(name))
+
+
+class InstrumentationTests(TestCase):
+
+    def test_metrics_need_a_token_scrape_address_or_staff(self):
+        # The test client connects from 127.0.0.1, as a local proxy would
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with self.settings(WRITORIA_METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'writoria_requests_total', response.content)
+        with self.settings(WRITORIA_METRICS_SCRAPE_ADDRESSES=['10.0.0.9']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.9').status_code, 200)
+        self.client.force_login(User.objects.create_user('metrics-staff', password='x', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(WRITORIA_SLOW_REQUEST_SECONDS=0, WRITORIA_SLOW_REQUEST_TOP_QUERIES=3)
+    def test_only_slowest_queries_are_kept(self):
+        seen = {}
+
+        def view(request):
+            for n in range(40):
+                User.objects.filter(pk=n).exists()
+            seen['stats'] = metrics.current_stats()
+            return HttpResponse()
+
+        with self.assertLogs('writoria.performance', 'WARNING') as logs:
+            middleware.InstrumentationMiddleware(view)(RequestFactory().get('/anything'))
+        stats = seen['stats']
+        self.assertEqual(stats.sql_count, 40)
+        self.assertEqual(len(stats.queries), 3)
+        self.assertIn('40 queries', logs.output[0])
+        self.assertEqual(logs.output[0].count('\n  '), 3)
+
+
+@plain_static_files
+class CategoryFacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('facet-author', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def post(self, category, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_post(self.author, category=category, slug=f'{category}-{BlogPost.all_objects.count()}', **fields)
+
+    def counts(self):
+        return {code: n for code, n in CategoryStats.objects.values_list('category', 'post_count') if n}
+
+    def test_stats_follow_post_changes(self):
+        tech, food = self.post('tech'), self.post('food')
+        self.post('tech')
+        self.assertEqual(self.counts(), {'tech': 2, 'food': 1})
+        tech.category = 'travel'
+        with self.captureOnCommitCallbacks(execute=True):
+            tech.save()
+        self.assertEqual(self.counts(), {'tech': 1, 'food': 1, 'travel': 1})
+        with mock.patch.object(deletion, 'schedule'), self.captureOnCommitCallbacks(execute=True):
+            food.soft_delete()
+        self.assertEqual(self.counts(), {'tech': 1, 'travel': 1})
+        # Purging the soft-deleted post does not count it out twice
+        with self.captureOnCommitCallbacks(execute=True):
+            BlogPost.all_objects.get(pk=food.pk).delete()
+            tech.delete()
+        self.assertEqual(self.counts(), {'tech': 1})
+
+    def test_counts_are_cached_until_a_post_changes(self):
+        self.post('tech')
+        self.assertEqual(facets.category_counts()['tech'], 1)
+        with self.assertNumQueries(0):
+            facets.category_counts()
+        self.post('tech')
+        self.assertEqual(facets.category_counts()['tech'], 2)
+
+    def test_search_counts(self):
+        self.post('tech', title='Python tips')
+        self.post('food', title='Cooking with python oil')
+        self.post('food', title='Bread')
+        self.assertEqual(facets.search_counts('python'), {'tech': 1, 'food': 1})
+
+    def test_list_shows_counts(self):
+        for category in ('tech', 'tech', 'arts'):
+            self.post(category)
+        response = self.client.get('/blog/')
+        self.assertContains(response, 'All Categories (3)')
+        self.assertContains(response, 'Technology (2)')
+        self.assertContains(response, 'Food &amp; Cooking (0)')
+
+    def test_pagination_ignores_stale_counts(self):
+        for _ in range(11):
+            self.post('tech')
+        # As another worker's per-process cache would still have it
+        cache.set(f'facets:categories:{facets._version()}', {'tech': 40}, facets.CACHE_SECONDS)
+        response = self.client.get('/blog/?page=2')
+        self.assertEqual(len(response.context['posts']), 1)
+        self.assertEqual(response.context['paginator'].num_pages, 2)
+        self.assertEqual(self.client.get('/blog/?page=3').status_code, 404)
+
+
+@plain_static_files
+class PostDeletionTests(TemporaryMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('gone-author', password='x')
+        cls.reader = User.objects.create_user('gone-reader', password='x')
+
+    def setUp(self):
+        super().setUp()
+        self.post = make_post(self.author, slug='going')
+        self.post.image.save('cover.jpg', ContentFile(b'cover image'))
+        self.gallery = BlogImage(post=self.post)
+        self.gallery.image.save('gallery.jpg', ContentFile(b'gallery image'))
+        top = Comment.objects.create(post=self.post, author=self.reader, content='Top')
+        Comment.objects.create(post=self.post, author=self.reader, content='Reply', parent=top)
+        Vote.objects.create(post=self.post, user=self.reader, is_life=True)
+        Bookmark.objects.create(post=self.post, user=self.reader)
+        PostViewDaily.objects.create(post=self.post, day=django_timezone.localdate(), views=3, sketch=b'')
+
+    def soft_delete(self):
+        with mock.patch.object(deletion, 'schedule') as schedule, self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.author)
+            response = self.client.post('/blog/going/delete/')
+        schedule.assert_called_once()
+        return response
+
+    def test_soft_delete_hides_post_at_once(self):
+        self.assertEqual(AuthorStats.objects.get(user=self.author).comments_received, 2)
+        self.soft_delete()
+        self.assertEqual(self.client.get('/blog/going/').status_code, 404)
+        self.assertNotContains(self.client.get('/blog/'), 'href="/blog/going/"')
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual((stats.post_count, stats.comments_received, stats.lives_received), (0, 0, 0))
+        # Nothing is removed until the purge
+        self.assertEqual(Comment.objects.filter(post_id=self.post.pk).count(), 2)
+        self.assertEqual(list(deletion.pending()), [self.post])
+
+    def test_purge_removes_rows_and_files(self):
+        uploads = storage.upload_storage()
+        names = [self.post.image.name, self.gallery.image.name]
+        self.soft_delete()
+        self.assertEqual(deletion.purge_pending(chunk_size=1, pause=0), 1)
+        self.assertFalse(BlogPost.all_objects.filter(pk=self.post.pk).exists())
+        for model in (Comment, Vote, Bookmark, BlogImage, PostViewDaily):
+            self.assertFalse(model.objects.exists(), model.__name__)
+        # Freed by the purge itself, not a later pass after the grace period
+        self.assertFalse(StoredBlob.objects.filter(name__in=names).exists())
+        self.assertFalse(any(uploads.exists(name) for name in names))
+
+    def test_purge_leaves_other_unreferenced_files_to_gc_media(self):
+        avatar = storage.upload_storage().save('profile_pics/old.jpg', ContentFile(b'replaced avatar'))
+        StoredBlob.objects.filter(name=avatar).update(
+            ref_count=0, updated_at=django_timezone.now() - timedelta(days=30))
+        self.soft_delete()
+        with mock.patch.object(storage, 'collect_unreferenced_blobs', wraps=storage.collect_unreferenced_blobs) as gc:
+            deletion.purge_pending(pause=0)
+        gc.assert_called_once()
+        self.assertEqual(gc.call_args.kwargs['names'], {self.post.image.name, self.gallery.image.name})
+        self.assertTrue(storage.upload_storage().exists(avatar))
+
+    def test_purge_keeps_files_other_rows_use(self):
+        other = make_post(self.author, slug='staying')
+        other.image.save('same.jpg', ContentFile(b'gallery image'))
+        self.soft_delete()
+        deletion.purge(self.post.pk, pause=0)
+        self.assertEqual(StoredBlob.objects.get(name=other.image.name).ref_count, 1)
+        self.assertTrue(storage.upload_storage().exists(other.image.name))
+
+    def test_purge_frees_files_saved_before_content_addressing(self):
+        media = os.path.join(self.media_root, 'blog_images')
+        for name in ('legacy.jpg', 'shared-legacy.jpg'):
+            with open(os.path.join(media, name), 'wb') as fh:
+                fh.write(name.encode())
+        BlogPost.all_objects.filter(pk=self.post.pk).update(image='blog_images/legacy.jpg')
+        BlogImage.objects.filter(pk=self.gallery.pk).update(image='blog_images/shared-legacy.jpg')
+        make_post(self.author, slug='staying', image='blog_images/shared-legacy.jpg')
+        self.soft_delete()
+        deletion.purge(self.post.pk, pause=0)
+        self.assertFalse(os.path.exists(os.path.join(media, 'legacy.jpg')))
+        self.assertTrue(os.path.exists(os.path.join(media, 'shared-legacy.jpg')))
+        self.assertEqual(StoredBlob.objects.get(name='blog_images/shared-legacy.jpg').ref_count, 1)
+
+    def test_purge_queries_do_not_grow_with_rows(self):
+        def purge_queries(comments):
+            post = make_post(self.author, slug=f'busy-{comments}')
+            Comment.objects.bulk_create([Comment(post=post, author=self.reader, content='x')] * comments)
+            BlogPost.all_objects.filter(pk=post.pk).update(deleted_at=django_timezone.now())
+            with CaptureQueriesContext(connection) as queries:
+                deletion.purge(post.pk, chunk_size=50, pause=0)
+            self.assertFalse(Comment.objects.filter(post_id=post.pk).exists())
+            return len(queries)
+
+        # Two more chunks of 50 cost a few queries each, not one or more per row
+        self.assertLess(purge_queries(200) - purge_queries(100), 20)
+
+
+@plain_static_files
+class ProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('profiler', password='x', is_staff=True)
+        make_post(cls.staff, slug='profiled')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_staff_can_profile_a_request(self):
+        self.assertEqual(self.client.get('/blog/?_profile=1').status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.trigger, profile.view_name, profile.user), ('manual', 'blog_list', self.staff))
+        self.assertIn('function calls', profile.profile_text)
+        self.assertEqual(profile.sql_count, len(profile.sql_timeline))
+        self.assertTrue(any(t['name'] == 'core/blog_list.html' for t in profile.template_timings))
+
+    def test_others_cannot(self):
+        self.client.force_login(User.objects.create_user('not-staff', password='x'))
+        self.client.get('/blog/?_profile=1')
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_concurrent_requests_run_unprofiled(self):
+        with middleware._profiling:
+            self.assertEqual(self.client.get('/blog/?_profile=1').status_code, 200)
+        self.assertFalse(RequestProfile.objects.exists())
+        self.client.get('/blog/?_profile=1')
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_profiler_in_use_elsewhere(self):
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError('Another profiling tool is already active')):
+            self.assertEqual(self.client.get('/blog/?_profile=1').status_code, 200)
+        self.assertFalse(RequestProfile.objects.exists())
+        self.assertFalse(middleware._profiling.locked())
+
+    @override_settings(WRITORIA_PROFILE_KEEP=2)
+    def test_keeps_the_latest(self):
+        for _ in range(3):
+            self.client.get('/blog/?_profile=1')
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+
+class SlugAllocationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('slug-author', password='x')
+
+    def test_suffixes_follow_the_highest_in_use(self):
+        self.assertEqual(make_post(self.author, title='Hello World').slug, 'hello-world')
+        self.assertEqual(make_post(self.author, title='Hello World').slug, 'hello-world-2')
+        make_post(self.author, title='x', slug='hello-world-7')
+        self.assertEqual(make_post(self.author, title='Hello, world!').slug, 'hello-world-8')
+        self.assertEqual(slugs.allocate_slug(BlogPost, 'Hello World', taken={'hello-world-9'}), 'hello-world-10')
+
+    def test_soft_deleted_posts_keep_their_slug(self):
+        make_post(self.author, title='Gone').soft_delete()
+        self.assertEqual(make_post(self.author, title='Gone').slug, 'gone-2')
+
+    def test_long_and_empty_titles(self):
+        slug = make_post(self.author, title='word ' * 30).slug
+        self.assertLessEqual(len(slug), slugs.SLUG_MAX_LENGTH)
+        self.assertEqual(make_post(self.author, title='word ' * 30).slug, slug[:slugs.SLUG_MAX_LENGTH - 8].strip('-') + '-2')
+        self.assertEqual(make_post(self.author, title='!!!').slug, 'post')
+
+    def test_retries_when_a_soft_deleted_post_took_the_slug(self):
+        BlogPost.all_objects.create(author=self.author, title='Race', slug='race', deleted_at=django_timezone.now())
+        # As if the slug were taken between allocation and insert
+        with mock.patch.object(slugs, 'allocate_slug', side_effect=['race', 'race-2']):
+            self.assertEqual(make_post(self.author, title='Race').slug, 'race-2')
+
+
+@override_settings(WRITORIA_RATE_LIMIT_ENABLED=False)
+class SlugCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('cache-author', password='x')
+        cls.reader = User.objects.create_user('cache-reader', password='x')
+
+    def setUp(self):
+        slugs.cache.clear()
+        self.addCleanup(slugs.cache.clear)
+        self.post = make_post(self.author, slug='cached')
+
+    def test_lookups_are_cached_and_evicted_on_change(self):
+        self.assertEqual(slugs.post_id_for('cached'), self.post.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(slugs.post_id_for('cached'), self.post.pk)
+        self.post.slug = 'renamed'
+        self.post.save()
+        self.assertIsNone(slugs.post_id_for('cached'))
+        self.assertEqual(slugs.post_id_for('renamed'), self.post.pk)
+
+    def test_lru_is_bounded(self):
+        cache = slugs.SlugCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        cache.forget(pk=3)
+        self.assertIsNone(cache.get('c'))
+
+    def test_writes_to_a_post_hidden_by_another_process_are_refused(self):
+        self.assertEqual(slugs.post_id_for('cached'), self.post.pk)
+        # Soft-deleted elsewhere: this process's cache still has the id
+        BlogPost.all_objects.filter(pk=self.post.pk).update(deleted_at=django_timezone.now())
+        self.client.force_login(self.reader)
+        for url, body in (('/blog/cached/vote/', None), ('/blog/cached/bookmark/', None),
+                          ('/blog/cached/comment/', json.dumps({'content': 'Still there?'}))):
+            slugs.cache.set('cached', self.post.pk)
+            with self.subTest(url=url):
+                response = self.client.post(url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 404)
+                self.assertIsNone(slugs.cache.get('cached'))
+        self.assertFalse(Vote.objects.exists() or Bookmark.objects.exists() or Comment.objects.exists())
+
+    def test_writes_to_a_live_post(self):
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.post('/blog/cached/vote/').json(), {'votes': 1, 'has_life': True})
+        self.assertEqual(self.client.post('/blog/cached/bookmark/').json(), {'is_bookmarked': True})
+
+
+class FeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('feed-author', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def fetch(self, url, **headers):
+        response = self.client.get(url, **headers)
+        if response.streaming:
+            response.body = b''.join(response.streaming_content).decode()
+        else:
+            response.body = response.content.decode()
+        return response
+
+    def test_documents_list_posts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_post(self.author, title='Tech & things', category='tech')
+            make_post(self.author, title='Travelling', category='travel')
+        self.assertIn('/sitemap-posts-1.xml', self.fetch('/sitemap.xml').body)
+        self.assertIn('/blog/travelling/', self.fetch('/sitemap-posts-1.xml').body)
+        self.assertEqual(self.client.get('/sitemap-posts-2.xml').status_code, 404)
+        atom = self.fetch('/feeds/atom.xml')
+        self.assertEqual(atom['Content-Type'], feeds.ATOM_CONTENT_TYPE)
+        self.assertIn('<title>Tech &amp; things</title>', atom.body)
+        category = self.fetch('/feeds/category/tech.xml').body
+        self.assertIn('Tech &amp; things', category)
+        self.assertNotIn('Travelling', category)
+        self.assertIn('Travelling', self.fetch('/feeds/author/feed-author.xml').body)
+        self.assertEqual(self.client.get('/feeds/author/nobody.xml').status_code, 404)
+        self.assertEqual(self.client.get('/feeds/category/nope.xml').status_code, 404)
+
+    def test_cached_until_a_post_changes(self):
+        post = make_post(self.author, title='First')
+        first = self.fetch('/feeds/atom.xml')
+        # Each request only reads the version
+        with self.assertNumQueries(2):
+            self.assertEqual(self.fetch('/feeds/atom.xml').body, first.body)
+            self.assertEqual(self.client.get('/feeds/atom.xml', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        post.title = 'Renamed'
+        post.save()
+        second = self.fetch('/feeds/atom.xml', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertIn('Renamed', second.body)
+
+    def test_version_comes_from_the_database(self):
+        post = make_post(self.author)
+        version = feeds.current_version()
+        # A change saved by another process, which this one's cache knows nothing about
+        BlogPost.objects.filter(pk=post.pk).update(updated_at=post.updated_at + timedelta(seconds=5))
+        self.assertNotEqual(feeds.current_version(), version)
+        version = feeds.current_version()
+        BlogPost.objects.filter(pk=post.pk).update(deleted_at=post.updated_at + timedelta(seconds=10))
+        self.assertEqual(feeds.current_version()[0], (post.updated_at + timedelta(seconds=10)).timestamp())
+        version = feeds.current_version()
+        make_post(self.author, title='Second').delete()
+        self.assertEqual(feeds.current_version()[1], version[1])
+        BlogPost.all_objects.filter(pk=post.pk).delete()
+        self.assertNotEqual(feeds.current_version()[1], version[1])
+
+    def test_missing_documents_are_404_even_when_revalidated(self):
+        etag = self.client.get('/feeds/atom.xml')['ETag']
+        for url in ('/feeds/author/nobody.xml', '/feeds/category/nope.xml', '/sitemap-posts-2.xml'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+class InlineThread:
+    """Runs a thread's target when it is started, in the calling thread"""
+
+    def __init__(self, target, **kwargs):
+        self.target = target
+
+    def start(self):
+        self.target()
+
+
+class PrefixIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = typeahead.PrefixIndex()
+        self.index.load({
+            typeahead.PrefixIndex.entry_id(typeahead.POST, 1): ('The Lighthouse Keeper', '/blog/keeper/', 3),
+            typeahead.PrefixIndex.entry_id(typeahead.POST, 2): ('Keeping Bees', '/blog/bees/', 1),
+            typeahead.PrefixIndex.entry_id(typeahead.POST, 3): ('Kéfir at Home', '/blog/kefir/', 9),
+            typeahead.PrefixIndex.entry_id(typeahead.AUTHOR, 1): ('keen', '/user/keen/', 0),
+        })
+
+    def labels(self, query):
+        return [label for _, label, _ in self.index.search(query)]
+
+    def test_any_word_and_accents_match(self):
+        self.assertEqual(self.labels('lighthouse kee'), ['The Lighthouse Keeper'])
+        self.assertEqual(self.labels('KEFIR'), ['Kéfir at Home'])
+        self.assertEqual(self.labels('k'), [])
+
+    def test_label_starts_rank_first_then_popularity(self):
+        self.assertEqual(self.labels('ke'), ['Kéfir at Home', 'Keeping Bees', 'keen', 'The Lighthouse Keeper'])
+        self.assertEqual(self.index.search('keen')[0], ('author', 'keen', '/user/keen/'))
+
+
+class TypeaheadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('harbour', password='x')
+        make_post(cls.author, title='Harbour Lights', votes=5)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.typeahead = typeahead.Typeahead()
+        for patcher in (mock.patch.object(typeahead, 'typeahead', self.typeahead),
+                        mock.patch.object(typeahead.logger, 'info')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def suggest(self, query):
+        return [s['label'] for s in self.client.get('/search/suggest/', {'q': query}).json()['suggestions']]
+
+    def test_suggestions_come_from_memory(self):
+        self.assertEqual(self.suggest('harb'), ['Harbour Lights', 'harbour'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('lights'), ['Harbour Lights'])
+            self.assertEqual(self.suggest('travel'), ['Travel'])
+
+    def rebuilds(self):
+        """The index the next suggestion is answered from, after any rebuild the check started"""
+        self.typeahead._checked = 0.0
+        self.typeahead.get_index()
+        return self.typeahead.index
+
+    @mock.patch.object(typeahead, 'close_old_connections')
+    @mock.patch.object(typeahead.threading, 'Thread', InlineThread)
+    def test_changes_apply_when_they_commit(self, close_old_connections):
+        index = self.typeahead.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            post = make_post(self.author, title='Harbour Seals')
+        fresh = self.rebuilds()
+        self.assertIsNot(fresh, index)
+        self.assertEqual(self.suggest('harbour s'), ['Harbour Seals'])
+        close_old_connections.assert_called_once()
+        # Nothing changed since, so the next check keeps it
+        self.assertIs(self.rebuilds(), fresh)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.rebuilds()
+        self.assertEqual(self.suggest('harbour s'), [])
+
+    @mock.patch.object(typeahead, 'close_old_connections')
+    @mock.patch.object(typeahead.threading, 'Thread', InlineThread)
+    def test_renames_rebuild_but_logins_do_not(self, close_old_connections):
+        index = self.typeahead.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save(update_fields=['last_login'])
+        self.assertIs(self.rebuilds(), index)
+        # The version cannot see a rename; the saving process rebuilds anyway
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'harbourmaster'
+            self.author.save()
+        self.assertIsNot(self.rebuilds(), index)
+        self.assertEqual(self.suggest('harbourm'), ['harbourmaster'])
+
+    @mock.patch.object(typeahead, 'close_old_connections')
+    @mock.patch.object(typeahead.threading, 'Thread', InlineThread)
+    def test_other_processes_changes_rebuild_in_the_background(self, close_old_connections):
+        stale = self.typeahead.get_index()
+        # As another process's commit would: no signal reaches this one
+        BlogPost.objects.update(title='Harbour Seals', updated_at=django_timezone.now() + timedelta(seconds=1))
+        self.assertIs(self.typeahead.get_index(), stale)
+        fresh = self.rebuilds()
+        self.assertIsNot(fresh, stale)
+        self.assertEqual(fresh.version, typeahead._version())
+        self.assertEqual(self.suggest('harbour s'), ['Harbour Seals'])
+
+    @mock.patch.object(typeahead, 'close_old_connections')
+    @mock.patch.object(typeahead.threading, 'Thread', InlineThread)
+    def test_changes_the_version_misses_rebuild_after_the_max_age(self, close_old_connections):
+        stale = self.typeahead.get_index()
+        User.objects.filter(pk=self.author.pk).update(username='harbourmaster')
+        self.assertIs(self.rebuilds(), stale)
+        with override_settings(WRITORIA_TYPEAHEAD_MAX_AGE=0):
+            self.assertIsNot(self.rebuilds(), stale)
+        self.assertEqual(self.suggest('harbourm'), ['harbourmaster'])
+
+    @mock.patch.object(typeahead, 'close_old_connections')
+    @mock.patch.object(typeahead.threading, 'Thread', InlineThread)
+    def test_failed_rebuild_keeps_the_old_index(self, close_old_connections):
+        stale = self.typeahead.get_index()
+        self.typeahead._mark_changed()
+        with mock.patch.object(typeahead, '_load_entries', side_effect=RuntimeError), \
+                mock.patch.object(typeahead.logger, 'warning') as warning:
+            self.assertIs(self.rebuilds(), stale)
+        warning.assert_called_once()
+        self.assertFalse(self.typeahead._rebuilding)
+        # The change is still pending, so the next check tries again
+        self.assertIsNot(self.rebuilds(), stale)
+
+
+class RevisionDiffTests(SimpleTestCase):
+
+    def test_diff_applies_back(self):
+        for old, new in (('', 'abc'), ('abc', ''), ('hello world', 'hello brave world'),
+                         ('aaaa', 'aaa'), ('naïve café', 'naïve cafés'), ('same', 'same')):
+            with self.subTest(old=old, new=new):
+                self.assertEqual(revisions.apply(old, revisions.diff(old, new)), new)
+        self.assertEqual(revisions.diff('hello world', 'hello brave world'), [[6, 0, 'brave ']])
+
+    def test_malformed_ops_are_rejected(self):
+        for ops in ('x', [[0, 1]], [[0, -1, '']], [[3, 0, 'x'], [1, 0, 'y']], [[0, 9, '']], [[True, 0, '']]):
+            with self.subTest(ops=ops), self.assertRaises(ValueError):
+                revisions.apply('abcd', ops)
+
+
+@override_settings(WRITORIA_REVISION_SNAPSHOT_INTERVAL=3)
+class RevisionHistoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('reviser', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.post = make_post(self.author, title='Draft', content='Line one\r\nLine two')
+
+    def test_every_revision_rebuilds_from_snapshots_and_deltas(self):
+        # Long enough that a one-line delta is much smaller than a snapshot
+        texts = ['Line one\nLine two\n' + 'Padding. ' * 20]
+        self.post.content = texts[0]
+        for n in range(7):
+            texts.append(texts[-1] + f'\nLine {n + 3}')
+            self.assertEqual(revisions.save(self.post, self.author, content=texts[-1]), (n + 2, True))
+        self.assertEqual(list(PostRevision.objects.filter(post=self.post, is_snapshot=True)
+                              .order_by('number').values_list('number', flat=True)), [1, 4, 7])
+        cache.clear()
+        for number, text in enumerate(texts, 1):
+            self.assertEqual(revisions.rebuild(self.post.pk, number), text)
+        with self.assertRaises(PostRevision.DoesNotExist):
+            revisions.rebuild(self.post.pk, 9)
+
+    def test_unchanged_saves_create_nothing(self):
+        first, _ = revisions.save(self.post, self.author, content='Changed')
+        self.assertEqual(revisions.save(self.post, self.author, content='Changed'), (first, False))
+        self.assertEqual(revisions.save(self.post, self.author, content='Changed', published=True), (first, False))
+        self.assertTrue(PostRevision.objects.get(post=self.post, number=first).published)
+
+    def test_stale_bases_and_bad_diffs_conflict(self):
+        number, _ = revisions.save(self.post, self.author, content='abc')
+        self.assertEqual(revisions.save(self.post, self.author, ops=[[3, 0, 'd']], base=number, length=4),
+                         (number + 1, True))
+        for changes in ({'ops': [[4, 0, 'e']], 'base': number, 'length': 5},
+                        {'ops': [[4, 0, 'e']], 'base': number + 1, 'length': 9},
+                        {'ops': [[9, 0, 'e']], 'base': number + 1},
+                        {'content': 'from another tab', 'base': number}):
+            with self.subTest(changes=changes), self.assertRaises(revisions.RevisionConflict) as conflict:
+                revisions.save(self.post, self.author, **changes)
+            self.assertEqual(conflict.exception.latest, number + 1)
+        self.assertEqual(revisions.rebuild(self.post.pk, number + 1), 'abcd')
+
+    def test_first_draft_records_the_published_post_first(self):
+        state = revisions.editing_state(self.post)
+        self.assertEqual(state, {'revision': 0, 'title': 'Draft', 'content': 'Line one\nLine two', 'draft': None})
+        self.assertFalse(PostRevision.objects.exists())
+        self.assertEqual(revisions.save(self.post, self.author, ops=[[0, 4, 'First']], base=0, length=18),
+                         (2, True))
+        self.assertEqual(list(PostRevision.objects.order_by('number').values_list('number', 'published')),
+                         [(1, True), (2, False)])
+        self.assertEqual(revisions.rebuild(self.post.pk, 2), 'First one\nLine two')
+        self.assertEqual(revisions.editing_state(self.post)['revision'], 2)
+
+    def test_admin_edits_are_recorded_before_the_next_draft(self):
+        revisions.save(self.post, self.author, content=self.post.content, title=self.post.title, published=True)
+        BlogPost.objects.filter(pk=self.post.pk).update(content='Edited in the admin')
+        self.post.refresh_from_db()
+        state = revisions.editing_state(self.post)
+        self.assertEqual((state['revision'], state['content']), (1, 'Edited in the admin'))
+        revisions.save(self.post, self.author, ops=[[0, 6, 'Fixed']], base=1, length=18)
+        self.assertEqual([revisions.rebuild(self.post.pk, n) for n in (1, 2, 3)],
+                         ['Line one\nLine two', 'Edited in the admin', 'Fixed in the admin'])
+
+
+@plain_static_files
+@override_settings(WRITORIA_RATE_LIMIT_ENABLED=False)
+class AutosaveViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autosaver', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.post = make_post(self.author, title='Autosaved', content='Hello')
+        self.client.force_login(self.author)
+
+    def autosave(self, **payload):
+        return self.client.post(f'/blog/{self.post.slug}/autosave/', json.dumps(payload),
+                                content_type='application/json')
+
+    def test_opening_the_editor_writes_nothing(self):
+        response = self.client.get(f'/blog/{self.post.slug}/edit/')
+        self.assertContains(response, 'data-revision="0"')
+        self.assertFalse(PostRevision.objects.exists())
+        self.assertEqual(self.autosave(base=0, ops=[[5, 0, '!']], length=6).json(), {'revision': 2, 'created': True})
+        self.assertContains(self.client.get(f'/blog/{self.post.slug}/edit/'), 'data-revision="2"')
+
+    def test_a_second_tab_cannot_overwrite_a_newer_save(self):
+        self.assertEqual(self.autosave(base=0, ops=[[5, 0, ' tab one']], length=13).status_code, 200)
+        # The other tab still has base 0: its diff and its full-text resend both conflict
+        response = self.autosave(base=0, ops=[[5, 0, ' tab two']], length=13)
+        self.assertEqual((response.status_code, response.json()['revision']), (409, 2))
+        self.assertEqual(self.autosave(base=0, content='Hello tab two').status_code, 409)
+        self.assertEqual(revisions.rebuild(self.post.pk, 2), 'Hello tab one')
+        self.assertEqual(self.autosave(base=2, content='Hello tab two').json(), {'revision': 3, 'created': True})
+
+    def test_invalid_payloads(self):
+        for body in ('[]', '{}', '{"ops": [], "title": 5}', 'nope'):
+            with self.subTest(body=body):
+                response = self.client.post(f'/blog/{self.post.slug}/autosave/', body,
+                                            content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        other = User.objects.create_user('not-the-author', password='x')
+        self.client.force_login(other)
+        self.assertEqual(self.autosave(content='Mine now').status_code, 404)
+
+
+class ContentTransferTests(TemporaryMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('exporter', password='x')
+        cls.reader = User.objects.create_user('export-reader', password='x')
+        cls.post = make_post(cls.author, title='Exported', content='**Bold** words', category='travel')
+        root = Comment.objects.create(post=cls.post, author=cls.reader, content='Top level')
+        Comment.objects.create(post=cls.post, author=cls.author, content='A reply', parent=root)
+        Vote.objects.create(post=cls.post, user=cls.reader)
+        Bookmark.objects.create(post=cls.post, user=cls.reader)
+        BlogPost.objects.filter(pk=cls.post.pk).update(created_at=datetime(2020, 5, 1, tzinfo=timezone.utc))
+
+    def setUp(self):
+        super().setUp()
+        self.export = os.path.join(self.media_root, 'export.ndjson')
+        call_command('export_content', self.export, stderr=io.StringIO())
+
+    def import_content(self, *args):
+        out = io.StringIO()
+        call_command('import_content', self.export, *args, stdout=out)
+        return out.getvalue()
+
+    def test_round_trip_with_renamed_slugs(self):
+        output = self.import_content('--on-conflict', 'rename')
+        self.assertIn('Imported 1 posts', output)
+        copy = BlogPost.objects.get(slug='exported-2')
+        self.assertEqual((copy.title, copy.category, copy.author, copy.created_at),
+                         ('Exported', 'travel', self.author, datetime(2020, 5, 1, tzinfo=timezone.utc)))
+        self.assertIn('<strong>Bold</strong>', copy.content_html)
+        reply = Comment.objects.get(post=copy, parent__isnull=False)
+        self.assertEqual((reply.content, reply.parent.content, reply.parent.post), ('A reply', 'Top level', copy))
+        self.assertTrue(Vote.objects.filter(post=copy, user=self.reader).exists())
+        self.assertTrue(Bookmark.objects.filter(post=copy, user=self.reader).exists())
+        self.assertEqual(AuthorStats.objects.get(user=self.author).post_count, 2)
+
+    def test_existing_slugs_are_skipped_with_their_rows(self):
+        output = self.import_content()
+        self.assertIn('Skipped 1 posts (slug exists)', output)
+        self.assertIn('Skipped 2 comments', output)
+        self.assertEqual(BlogPost.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_slugs_of_soft_deleted_posts_are_taken(self):
+        BlogPost.objects.filter(pk=self.post.pk).update(deleted_at=django_timezone.now())
+        self.assertIn('Skipped 1 posts (slug exists)', self.import_content())
+        self.import_content('--on-conflict', 'rename')
+        self.assertEqual(BlogPost.objects.get().slug, 'exported-2')
+
+    def test_unknown_authors_become_placeholders_on_request(self):
+        with open(self.export) as source:
+            records = [json.loads(line) for line in source]
+        for record in records:
+            for field in ('author_username', 'user_username'):
+                if field in record:
+                    record[field] = 'newcomer'
+        with open(self.export, 'w') as out:
+            out.writelines(json.dumps(record) + '\n' for record in records)
+        self.assertIn('Skipped 1 posts (unknown author)', self.import_content('--on-conflict', 'rename'))
+        self.import_content('--on-conflict', 'rename', '--create-missing-users')
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.is_active)
+        self.assertTrue(newcomer.userprofile)
+        self.assertEqual(BlogPost.objects.filter(author=newcomer).count(), 1)
+
+    def test_interrupted_import_resumes_from_its_checkpoint(self):
+        checkpoint = os.path.join(self.media_root, 'import.checkpoint')
+        from core.management.commands.import_content import Command
+        with mock.patch.object(Command, '_import_vote', side_effect=RuntimeError('interrupted')):
+            with self.assertRaises(RuntimeError):
+                self.import_content('--on-conflict', 'rename', '--checkpoint', checkpoint)
+        self.assertTrue(os.path.exists(checkpoint))
+        self.assertEqual(BlogPost.objects.count(), 2)
+        self.import_content('--on-conflict', 'rename', '--checkpoint', checkpoint)
+        self.assertEqual(BlogPost.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 4)
+        self.assertEqual(Vote.objects.count(), 2)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_media_archive_round_trips(self):
+        from django.core.files.storage import default_storage
+        name = default_storage.save('blog_images/photo.png', ContentFile(b'png bytes'))
+        BlogPost.objects.filter(pk=self.post.pk).update(image=name)
+        archive = os.path.join(self.media_root, 'media.tar')
+        call_command('export_content', self.export, '--media', archive, stderr=io.StringIO())
+        default_storage.delete(name)
+        self.assertIn('Restored 1 media files', self.import_content('--media', archive))
+        with default_storage.open(name) as restored:
+            self.assertEqual(restored.read(), b'png bytes')
+        # Restored files are indexed with the rows referencing them, so collection leaves them alone
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 1)
+        call_command('gc_media', '--grace-hours', '0', stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(name))
+
+    def test_imported_rows_count_their_files(self):
+        name = storage.upload_storage().save('blog_images/photo.png', ContentFile(b'png bytes'))
+        # As left by a purged post: indexed, unreferenced and past the grace period
+        StoredBlob.objects.filter(name=name).update(updated_at=django_timezone.now() - timedelta(days=2))
+        BlogPost.objects.filter(pk=self.post.pk).update(image=name)
+        BlogImage.objects.bulk_create([BlogImage(post=self.post, image=name)])
+        call_command('export_content', self.export, stderr=io.StringIO())
+        self.import_content('--on-conflict', 'rename')
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 2)
+        call_command('gc_media', '--grace-hours', '0', stdout=io.StringIO())
+        self.assertTrue(storage.upload_storage().exists(name))
+
+    def test_imported_rows_index_files_saved_before_content_addressing(self):
+        from django.core.files.storage import default_storage
+        name = default_storage.save('blog_images/legacy.png', ContentFile(b'legacy bytes'))
+        BlogPost.objects.filter(pk=self.post.pk).update(image=name)
+        call_command('export_content', self.export, stderr=io.StringIO())
+        self.import_content('--on-conflict', 'rename')
+        # The exported post and its copy
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 2)
+        call_command('gc_media', '--grace-hours', '0', stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(name))
+
+    def test_malformed_export(self):
+        with open(self.export, 'a') as out:
+            out.write('{"model": "blogpost"\n')
+        with self.assertRaisesMessage(CommandError, 'Malformed export'):
+            self.import_content('--on-conflict', 'rename')
+
+
+@plain_static_files
+@override_settings(WRITORIA_RATE_LIMIT_ENABLED=False)
+class BenchmarkTests(TemporaryMediaMixin, TestCase):
+
+    def seed(self, **options):
+        options = {'users': 4, 'posts': 6, 'images_per_post': 1, 'comments_per_post': 4, 'reply_ratio': 0.5,
+                   'votes_per_post': 3, 'bookmarks_per_user': 2, 'paragraphs': 2, 'batch_size': 4, **options}
+        call_command('seed_benchmark_data', stdout=io.StringIO(), **options)
+
+    def test_seeds_the_requested_volumes(self):
+        self.seed()
+        posts = BlogPost.objects.filter(slug__startswith='bench-')
+        self.assertEqual(posts.count(), 6)
+        self.assertEqual(User.objects.filter(username__startswith='bench_user', userprofile__isnull=False).count(), 4)
+        self.assertEqual(BlogImage.objects.count(), 6)
+        self.assertEqual(Comment.objects.filter(parent__isnull=True).count(), 12)
+        self.assertEqual(Comment.objects.filter(parent__isnull=False).count(), 12)
+        self.assertEqual(Vote.objects.count(), 18)
+        self.assertEqual(Bookmark.objects.count(), 8)
+        for post in posts:
+            self.assertEqual(post.votes, post.vote_set.filter(is_life=True).count())
+            self.assertTrue(post.content_html)
+        self.assertEqual(sum(AuthorStats.objects.values_list('post_count', flat=True)), 6)
+        # Seeding again adds posts under new slugs and reuses the users
+        self.seed(posts=2)
+        self.assertEqual(BlogPost.objects.filter(slug__startswith='bench-').count(), 8)
+        self.assertEqual(User.objects.count(), 4)
+
+    def test_same_seed_same_data(self):
+        self.seed(prefix='a', seed=7)
+        self.seed(prefix='b', seed=7)
+        titles = lambda prefix: list(BlogPost.objects.filter(slug__startswith=f'{prefix}-')
+                                     .order_by('slug').values_list('title', flat=True))
+        self.assertEqual(titles('a'), titles('b'))
+
+    def test_scenarios_measure_requests(self):
+        from core.benchmarks import BenchmarkContext, autodiscover, measure
+        self.seed()
+        scenarios = autodiscover()
+        ctx = BenchmarkContext(random.Random(1))
+        self.addCleanup(ctx.close)
+        for name in ('home', 'blog_detail', 'api_posts'):
+            with self.subTest(scenario=name):
+                result = measure(scenarios[name]['setup'](ctx), 3, warmup=1)
+                self.assertEqual(result['iterations'], 3)
+                self.assertGreater(result['queries_per_request'], 0)
+                self.assertLessEqual(result['p50_ms'], result['max_ms'])
+        with self.assertRaisesMessage(RuntimeError, 'HTTP 404'):
+            measure(lambda: ctx.client.get('/blog/no-such-post/'), 1, warmup=0)
+
+    def test_percentiles(self):
+        from core.benchmarks import percentile, summarize
+        values = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 0.05)
+        self.assertEqual(percentile(values, 99), 0.099)
+        self.assertEqual(percentile([], 50), 0.0)
+        summary = summarize(values, [2, 4])
+        self.assertEqual((summary['p95_ms'], summary['max_ms'], summary['queries_per_request']), (95.0, 100.0, 3.0))
+
+
+@plain_static_files
+class AdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        cls.author = User.objects.create_user('admin-author', password='x')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        # The admin theme warns about its menu settings on every page
+        jazzmin = logging.getLogger('jazzmin')
+        self.addCleanup(jazzmin.setLevel, jazzmin.level)
+        jazzmin.setLevel(logging.ERROR)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(captured.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        post = make_post(self.author)
+        Comment.objects.create(post=post, author=self.author, content='One')
+        Vote.objects.create(post=post, user=self.author)
+        few = {url: self.changelist_queries(url) for url in ('/admin/core/comment/', '/admin/core/blogpost/')}
+        for n in range(10):
+            other = make_post(self.author, title=f'Post {n}')
+            Comment.objects.create(post=other, author=self.admin, content='More')
+        for url, count in few.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.changelist_queries(url), count)
+
+    def results(self, url, query):
+        response = self.client.get(url, {'q': query})
+        return response.context['cl'].result_list
+
+    def test_search_uses_prefix_and_exact_matches(self):
+        make_post(self.author, title='Hello there')
+        make_post(self.author, title='Say hello')
+        make_post(self.admin, title='Other', content='Greetings from the body')
+        def titles(query):
+            return sorted(post.title for post in self.results('/admin/core/blogpost/', query))
+        self.assertEqual(titles('hELLO t'), ['Hello there'])
+        self.assertEqual(titles('admin-author'), ['Hello there', 'Say hello'])
+        self.assertEqual(titles('admin-auth'), [])
+        # Words of the body, through the full-text index
+        self.assertEqual(titles('bod'), ['Other'])
+        self.assertEqual(titles('"from the'), ['Other'])
+
+    def test_title_prefix_search_uses_the_lowered_index(self):
+        from core.admin_utils import LargeTableAdmin
+        from django.contrib import admin
+
+        class TitleAdmin(LargeTableAdmin):
+            search_fields = ('^title',)
+
+        queryset, _ = TitleAdmin(BlogPost, admin.site).get_search_results(None, BlogPost.all_objects.all(), 'Hel')
+        self.assertIn('core_blogpost_title_lower', queryset.explain())
+
+    def test_text_search_follows_edits_and_deletes(self):
+        from chat.models import ChatMessage
+
+        post = make_post(self.author)
+        comment = Comment.objects.create(post=post, author=self.author, content='Lovely lighthouse')
+        self.assertEqual(list(self.results('/admin/core/comment/', 'LIGHTHOUSE')), [comment])
+        Comment.objects.filter(pk=comment.pk).update(content='Lovely harbour')
+        self.assertEqual(list(self.results('/admin/core/comment/', 'lighthouse')), [])
+        self.assertEqual(list(self.results('/admin/core/comment/', 'harb')), [comment])
+        comment.delete()
+        self.assertEqual(list(self.results('/admin/core/comment/', 'harb')), [])
+        self.author.userprofile.bio = 'Keeps bees'
+        self.author.userprofile.save()
+        self.assertEqual(list(self.results('/admin/core/userprofile/', 'bees')), [self.author.userprofile])
+        message = ChatMessage.objects.create(user=self.author, message='Where is it?', response='Café menu')
+        self.assertEqual(list(self.results('/admin/chat/chatmessage/', 'cafe')), [message])
+
+    def test_large_unfiltered_tables_use_an_estimate(self):
+        from core.admin_utils import EstimatedCountPaginator, estimate_row_count
+        post = make_post(self.author)
+        comments = [Comment.objects.create(post=post, author=self.author, content=f'Comment {n}') for n in range(3)]
+        comments[0].delete()
+        # MAX(rowid) on SQLite: the deleted first row is still counted
+        self.assertEqual(estimate_row_count(Comment), comments[-1].pk)
+        with mock.patch.object(EstimatedCountPaginator, 'threshold', 1):
+            self.assertEqual(self.client.get('/admin/core/comment/').context['cl'].paginator.count, comments[-1].pk)
+            self.assertEqual(len(self.results('/admin/core/comment/', 'Comment 1')), 1)
+        self.assertEqual(self.client.get('/admin/core/comment/').context['cl'].paginator.count, 2)
+
+    def test_author_autocomplete(self):
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'core', 'model_name': 'blogpost', 'field_name': 'author', 'term': 'admin-a',
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], ['admin-author'])
+
+
+class StaticAssetTests(SimpleTestCase):
+
+    def setUp(self):
+        source = tempfile.TemporaryDirectory()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        os.makedirs(os.path.join(source.name, 'css'))
+        with open(os.path.join(source.name, 'css', 'site.css'), 'w') as fh:
+            fh.write('body { background: url("../logo.svg"); }\n' + '.rule { color: #123456; }\n' * 40)
+        with open(os.path.join(source.name, 'logo.svg'), 'w') as fh:
+            fh.write('<svg xmlns="http://www.w3.org/2000/svg"/>')
+        override = override_settings(
+            STATIC_URL='/static/', STATIC_ROOT=root.name, STATICFILES_DIRS=[source.name],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.root = root.name
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(root.name, 'staticfiles.json')) as fh:
+            self.hashed = json.load(fh)['paths']
+        self.middleware = middleware.StaticAssetMiddleware(lambda request: HttpResponse('from the app'))
+
+    def get(self, path, method='get', **headers):
+        return self.middleware(getattr(RequestFactory(), method)(path, **headers))
+
+    def body(self, response):
+        content = b''.join(response.streaming_content)
+        response.close()
+        return content
+
+    def test_collectstatic_hashes_and_precompresses(self):
+        css = self.hashed['css/site.css']
+        self.assertNotEqual(css, 'css/site.css')
+        self.assertTrue(os.path.exists(os.path.join(self.root, css + '.gz')))
+        # Too small to gain from compression
+        self.assertFalse(os.path.exists(os.path.join(self.root, self.hashed['logo.svg'] + '.gz')))
+        with open(os.path.join(self.root, css)) as fh:
+            self.assertIn(self.hashed['logo.svg'].split('/')[-1], fh.read())
+
+    def test_hashed_files_are_immutable_and_encoded_on_request(self):
+        path = '/static/' + self.hashed['css/site.css']
+        plain = self.get(path)
+        self.assertEqual(plain['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual((plain['Content-Type'], plain['Vary']), ('text/css', 'Accept-Encoding'))
+        self.assertNotIn('Content-Encoding', plain)
+        original = self.body(plain)
+        compressed = self.get(path, HTTP_ACCEPT_ENCODING='deflate, gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(self.body(compressed)), original)
+        refused = self.get(path, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', refused)
+        refused.close()
+
+    def test_each_encoding_has_its_own_etag(self):
+        path = '/static/' + self.hashed['css/site.css']
+
+        def fetch(**headers):
+            response = self.get(path, **headers)
+            response.close()
+            return response
+
+        plain = fetch()['ETag']
+        compressed = fetch(HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertEqual(compressed, plain[:-1] + '-gzip"')
+        # A cached identity body does not validate for a client that gets gzip, and the other way round
+        self.assertEqual(fetch(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=plain).status_code, 200)
+        self.assertEqual(fetch(HTTP_IF_NONE_MATCH=compressed).status_code, 200)
+        not_modified = self.get(path, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=compressed)
+        self.assertEqual((not_modified.status_code, not_modified['ETag'], not_modified['Vary']),
+                         (304, compressed, 'Accept-Encoding'))
+
+    def test_unhashed_files_revalidate(self):
+        response = self.get('/static/css/site.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.body(response)
+        not_modified = self.get('/static/css/site.css', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((not_modified.status_code, not_modified['ETag']), (304, response['ETag']))
+        head = self.get('/static/css/site.css', method='head')
+        self.assertEqual((head.content, head['Content-Length']), (b'', response['Content-Length']))
+
+    def test_other_requests_reach_the_app(self):
+        for path, method in (('/static/missing.css', 'get'), ('/static/css/site.css', 'post'), ('/blog/', 'get')):
+            with self.subTest(path=path, method=method):
+                self.assertEqual(self.get(path, method=method).content, b'from the app')
+
+
+class MediaServingTests(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.media_root, 'blog_images'))
+        with open(os.path.join(self.media_root, 'blog_images', 'photo 1.png'), 'wb') as fh:
+            fh.write(b'0123456789')
+        self.url = '/media/blog_images/photo%201.png'
+
+    def body(self, response):
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return content
+
+    def test_full_response(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.body(response), b'0123456789')
+        self.assertEqual((response['Content-Type'], response['Content-Length'], response['Accept-Ranges']),
+                         ('image/png', '10', 'bytes'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=86400')
+        self.assertNotIn('Content-Disposition', response)
+        head = self.client.head(self.url)
+        self.assertEqual((head.content, head['Content-Length'], head['ETag']), (b'', '10', response['ETag']))
+
+    def test_byte_ranges(self):
+        for header, status, body, content_range in (
+                ('bytes=2-5', 206, b'2345', 'bytes 2-5/10'),
+                ('bytes=-3', 206, b'789', 'bytes 7-9/10'),
+                ('bytes=7-', 206, b'789', 'bytes 7-9/10'),
+                ('bytes=8-20', 206, b'89', 'bytes 8-9/10'),
+                ('bytes=0-1,4-5', 200, b'0123456789', None),
+                ('items=0-1', 200, b'0123456789', None)):
+            with self.subTest(range=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual((response.status_code, self.body(response)), (status, body))
+                self.assertEqual(response.get('Content-Range'), content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+        unsatisfiable = self.client.get(self.url, HTTP_RANGE='bytes=10-')
+        self.assertEqual((unsatisfiable.status_code, unsatisfiable['Content-Range']), (416, 'bytes */10'))
+
+    def test_if_range_must_match_the_current_file(self):
+        etag = self.client.head(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag).status_code, 206)
+        stale = self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"old"')
+        self.assertEqual((stale.status_code, self.body(stale)), (200, b'0123456789'))
+
+    def test_conditional_requests(self):
+        first = self.client.head(self.url)
+        for headers in ({'HTTP_IF_NONE_MATCH': first['ETag']}, {'HTTP_IF_NONE_MATCH': '*'},
+                        {'HTTP_IF_MODIFIED_SINCE': first['Last-Modified']}):
+            with self.subTest(headers=headers):
+                response = self.client.get(self.url, **headers)
+                self.assertEqual((response.status_code, response['ETag']), (304, first['ETag']))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual((response.status_code, self.body(response)), (200, b'0123456789'))
+
+    def test_missing_and_outside_paths(self):
+        with open(os.path.join(os.path.dirname(self.media_root), 'outside.txt'), 'w') as fh:
+            self.addCleanup(os.remove, fh.name)
+            fh.write('secret')
+        for url in ('/media/blog_images/nope.png', '/media/blog_images', '/media/blog_images/photo%201.png/x',
+                    '/media/../outside.txt', '/media/%2E%2E/outside.txt'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_offload_to_the_proxy(self):
+        with override_settings(WRITORIA_MEDIA_OFFLOAD='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual((response.content, response['X-Accel-Redirect']),
+                         (b'', '/protected-media/blog_images/photo%201.png'))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        with override_settings(WRITORIA_MEDIA_OFFLOAD='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'blog_images', 'photo 1.png'))
+        with override_settings(WRITORIA_MEDIA_OFFLOAD='x-sendfile'):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+@plain_static_files
+@override_settings(WRITORIA_RATE_LIMIT_ENABLED=False)
+class GalleryTests(TemporaryMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('gallery-author', password='x')
+
+    def upload(self, content, name='photo.png'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return SimpleUploadedFile(name, content, content_type='image/png')
+
+    def gallery(self, post):
+        return list(post.images.order_by('order').values_list('caption', 'order'))
+
+    def test_split_captions(self):
+        self.assertEqual(gallery.split_captions('First\r\n\n  Second  \n'), ['First', 'Second'])
+        self.assertEqual(gallery.split_captions(None), [])
+
+    def test_identical_uploads_share_one_counted_blob(self):
+        post = make_post(self.author)
+        names = gallery.store_images([self.upload(b'same'), self.upload(b'same', 'copy.png'), self.upload(b'other')])
+        self.assertEqual(names[0], names[1])
+        self.assertNotEqual(names[0], names[2])
+        self.assertEqual(StoredBlob.objects.count(), 2)
+        # Savepoint, MAX(order), one INSERT, one UPDATE per distinct reference delta, release
+        with self.assertNumQueries(6):
+            gallery.attach_images(post, names, ['One'])
+        self.assertEqual(dict(StoredBlob.objects.values_list('name', 'ref_count')), {names[0]: 2, names[2]: 1})
+        self.assertEqual(self.gallery(post), [('One', 0), ('', 1), ('', 2)])
+        gallery.attach_images(post, names[2:], ['Appended'])
+        self.assertEqual(self.gallery(post)[-1], ('Appended', 3))
+
+    def test_update_gallery_reorders_and_recaptions_in_one_statement(self):
+        post = make_post(self.author)
+        first, second, third = gallery.attach_images(post, gallery.store_images(
+            [self.upload(b'a'), self.upload(b'b'), self.upload(b'c')]), ['A', 'B', 'C'])
+        foreign = gallery.attach_images(make_post(self.author), gallery.store_images([self.upload(b'd')]))[0]
+        # The gallery SELECT and one UPDATE, however many images change
+        with self.assertNumQueries(2):
+            changed = gallery.update_gallery(post, [third.pk, foreign.pk, first.pk], {second.pk: 'Bee', foreign.pk: 'x'})
+        self.assertEqual(changed, 3)
+        self.assertEqual(self.gallery(post), [('C', 0), ('A', 1), ('Bee', 2)])
+        self.assertEqual(BlogImage.objects.get(pk=foreign.pk).caption, '')
+        self.assertEqual(gallery.update_gallery(post), 0)
+
+    def test_create_and_edit_through_the_form(self):
+        self.client.force_login(self.author)
+        response = self.client.post('/blog/new/', {
+            'title': 'Gallery post', 'content': 'Pictures', 'category': 'arts',
+            'images': [self.upload(b'one'), self.upload(b'two')], 'image_captions': 'Left\nRight',
+        })
+        post = BlogPost.objects.get(title='Gallery post')
+        self.assertRedirects(response, post.get_absolute_url(), fetch_redirect_response=False)
+        self.assertEqual(self.gallery(post), [('Left', 0), ('Right', 1)])
+        left, right = post.images.order_by('order')
+        self.client.post(f'/blog/{post.slug}/edit/', {
+            'title': 'Gallery post', 'content': 'Pictures', 'category': 'arts',
+            f'gallery_order_{left.pk}': '2', f'gallery_order_{right.pk}': '1',
+            f'gallery_caption_{left.pk}': 'Now last', 'images': [self.upload(b'three')],
+            'image_captions': 'Added',
+        })
+        self.assertEqual(self.gallery(post), [('Right', 0), ('Now last', 1), ('Added', 2)])
+        self.client.post(f'/blog/{post.slug}/edit/', {
+            'title': 'Gallery post', 'content': 'Pictures', 'category': 'arts', 'replace_images': 'on',
+            'images': [self.upload(b'four')],
+        })
+        self.assertEqual(self.gallery(post), [('', 0)])
+
+
+@plain_static_files
+class RenderingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('renderer', password='x')
+
+    def test_markdown_is_rendered_and_sanitized(self):
+        html = rendering.render_html(
+            '**Bold** <script>alert(1)</script>\n\n'
+            '<img src="x.png" onerror="alert(2)"> [bad](javascript:alert(3)) [good](https://example.com)'
+        )
+        self.assertIn('<strong>Bold</strong>', html)
+        self.assertIn('<img src="x.png">', html)
+        self.assertIn('<a href="https://example.com" rel="noopener noreferrer nofollow">good</a>', html)
+        for unsafe in ('<script', 'onerror', 'javascript:'):
+            self.assertNotIn(unsafe, html)
+
+    def test_content_is_escaped_without_markdown(self):
+        with mock.patch.object(rendering, 'markdown', None):
+            self.assertEqual(rendering.render_html('<b>x</b>'), '<p>&lt;b&gt;x&lt;/b&gt;</p>')
+
+    def test_excerpt_is_plain_text(self):
+        html, excerpt = rendering.render('# Title\n\nFish &amp; chips,\n   *hot*')
+        self.assertEqual(excerpt, 'Title Fish & chips, hot')
+        self.assertEqual(len(rendering.make_excerpt('<p>%s</p>' % ('word ' * 100), 20)), 20)
+
+    def test_save_renders_only_when_content_changes(self):
+        post = make_post(self.author, content='*one*')
+        self.assertEqual(post.content_html, '<p><em>one</em></p>')
+        self.assertEqual(post.renderer_version, rendering.RENDERER_VERSION)
+        post.content = '*two*'
+        post.save(update_fields=['title'])
+        self.assertEqual(BlogPost.objects.get(pk=post.pk).content_html, '<p><em>one</em></p>')
+        post.save(update_fields=['content'])
+        stored = BlogPost.objects.get(pk=post.pk)
+        self.assertEqual((stored.content_html, stored.excerpt), ('<p><em>two</em></p>', 'two'))
+
+    def test_detail_page_shows_the_sanitized_html(self):
+        post = make_post(self.author, content='Hello <script>alert(1)</script>**there**')
+        response = self.client.get(post.get_absolute_url())
+        self.assertContains(response, '<strong>there</strong>', html=True)
+        self.assertNotContains(response, 'alert(1)')
+
+    def test_render_content_command_updates_stale_posts(self):
+        stale, fresh = make_post(self.author, content='*stale*'), make_post(self.author, content='*fresh*')
+        BlogPost.objects.filter(pk=stale.pk).update(content_html='old', excerpt='old', renderer_version=0)
+        BlogPost.objects.filter(pk=fresh.pk).update(content_html='kept')
+        out = io.StringIO()
+        call_command('render_content', workers=1, chunk_size=1, stdout=out)
+        self.assertIn('Rendered 1 posts', out.getvalue())
+        self.assertEqual(BlogPost.objects.get(pk=stale.pk).content_html, '<p><em>stale</em></p>')
+        self.assertEqual(BlogPost.objects.get(pk=fresh.pk).content_html, 'kept')
+        call_command('render_content', workers=1, all=True, stdout=io.StringIO())
+        self.assertEqual(BlogPost.objects.get(pk=fresh.pk).content_html, '<p><em>fresh</em></p>')
+
+    def test_render_content_command_skips_posts_edited_meanwhile(self):
+        post = make_post(self.author, content='*before*')
+        BlogPost.objects.filter(pk=post.pk).update(renderer_version=0)
+        render = rendering.render
+        edits = []
+
+        def edit_while_rendering(text):
+            if not edits:
+                # The edit renders through this too
+                edits.append(text)
+                edited = BlogPost.objects.get(pk=post.pk)
+                edited.content = '*after*'
+                edited.save()
+            return render(text)
+
+        out = io.StringIO()
+        with mock.patch.object(rendering, 'render', edit_while_rendering):
+            call_command('render_content', workers=1, stdout=out)
+        self.assertIn('(1 edited meanwhile and skipped)', out.getvalue())
+        self.assertEqual(BlogPost.objects.get(pk=post.pk).content_html, '<p><em>after</em></p>')
+
+
+@plain_static_files
+@override_settings(WRITORIA_RATE_LIMIT_ENABLED=False)
+class ViewerStateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('viewed-author', password='x')
+        cls.reader = User.objects.create_user('reader', password='x')
+        cls.posts = [make_post(cls.author, title=f'Post {i}') for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(self.reader)
+
+    def test_anonymous_viewers_need_no_queries(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        with self.assertNumQueries(0):
+            state = viewer_state.get_viewer_state(AnonymousUser(), [self.posts[0].pk, self.posts[0].pk])
+        self.assertEqual(state, {self.posts[0].pk: viewer_state.EMPTY_STATE})
+
+    def state(self, post):
+        """As a new request would see it"""
+        return viewer_state.get_viewer_state(User.objects.get(pk=self.reader.pk), [post.pk])[post.pk]
+
+    def test_a_page_is_read_with_one_query_per_table_then_remembered(self):
+        first, second, third = self.posts
+        Bookmark.objects.create(user=self.reader, post=first)
+        Vote.objects.create(user=self.reader, post=second, is_life=False)
+        ids = [post.pk for post in self.posts]
+        with self.assertNumQueries(2):
+            state = viewer_state.get_viewer_state(self.reader, ids)
+        self.assertEqual(state, {first.pk: (True, None), second.pk: (False, False), third.pk: (False, None)})
+        with self.assertNumQueries(0):
+            self.assertEqual(viewer_state.get_viewer_state(self.reader, ids[:2]),
+                             {first.pk: (True, None), second.pk: (False, False)})
+        # Other viewers have their own state
+        self.assertEqual(viewer_state.get_viewer_state(self.author, ids)[first.pk], viewer_state.EMPTY_STATE)
+
+    def test_changes_from_elsewhere_show_on_the_next_request(self):
+        post = self.posts[0]
+        self.assertEqual(self.state(post), viewer_state.EMPTY_STATE)
+        # As another process would, with nothing of this one to forget
+        Bookmark.objects.create(user=self.reader, post=post)
+        self.assertEqual(self.state(post), (True, None))
+
+    def test_bookmarking_and_voting_refresh_the_state(self):
+        post = self.posts[0]
+        viewer_state.get_viewer_state(self.reader, [post.pk])
+        Bookmark.objects.create(user=self.reader, post=post)
+        viewer_state.forget(self.reader, post.pk)
+        self.assertEqual(viewer_state.get_viewer_state(self.reader, [post.pk])[post.pk], (True, None))
+        self.client.post(f'/blog/{post.slug}/bookmark/')
+        self.client.post(f'/blog/{post.slug}/vote/')
+        self.assertEqual(self.state(post), (False, True))
+        self.client.post(f'/blog/{post.slug}/vote/')
+        self.assertEqual(self.state(post), (False, False))
+
+    def test_pages_show_each_cards_bookmark(self):
+        bookmarked = self.posts[1]
+        Bookmark.objects.create(user=self.reader, post=bookmarked)
+        for url in ('/blog/', f'/profile/{self.author.username}/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                marked = [post.pk for post in response.context['posts'] if post.is_bookmarked]
+                self.assertEqual(marked, [bookmarked.pk])
+                self.assertContains(response, f'class="bookmark-btn active" data-slug="{bookmarked.slug}"')
+        response = self.client.get(bookmarked.get_absolute_url())
+        self.assertTrue(response.context['is_bookmarked'])
+        self.assertIsNone(response.context['user_vote'])
+
+
+class AuthorStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('counted-author', password='x')
+        cls.reader = User.objects.create_user('counting-reader', password='x')
+
+    def totals(self):
+        stats = AuthorStats.objects.get(user=self.author)
+        return [getattr(stats, field) for field in AuthorStats.COUNTED_FIELDS]
+
+    def test_signals_keep_totals_equal_to_a_rebuild(self):
+        post = make_post(self.author)
+        vote = Vote.objects.create(post=post, user=self.reader, is_life=True)
+        Vote.objects.create(post=post, user=self.author, is_life=False)
+        comment = Comment.objects.create(post=post, author=self.reader, content='Hi')
+        Bookmark.objects.create(post=post, user=self.reader)
+        self.assertEqual(self.totals(), [1, 1, 1, 1])
+        vote.is_life = False
+        vote.save()
+        comment.delete()
+        self.assertEqual(self.totals(), [1, 0, 0, 1])
+        vote.is_life = True
+        vote.save()
+        make_post(self.author, title='Second')
+        incremental = self.totals()
+        AuthorStats.rebuild([self.author.pk])
+        self.assertEqual(self.totals(), incremental)
+        self.assertEqual(incremental, [2, 1, 0, 1])
+
+    def test_changes_are_single_row_updates(self):
+        post = make_post(self.author)
+        with self.assertNumQueries(1):
+            models.adjust_author_stats({'comments_received': 1}, post_id=post.pk)
+        with self.assertNumQueries(0):
+            models.adjust_author_stats({'comments_received': 0}, user_id=self.author.pk)
+
+    def test_missing_row_is_rebuilt_on_increment_only(self):
+        post = make_post(self.author)
+        Bookmark.objects.create(post=post, user=self.reader)
+        AuthorStats.objects.all().delete()
+        models.adjust_author_stats({'bookmarks_received': -1}, post_id=post.pk)
+        self.assertFalse(AuthorStats.objects.exists())
+        # The rebuild already counts the row whose save triggered it
+        Comment.objects.create(post=post, author=self.reader, content='Hi')
+        self.assertEqual(self.totals(), [1, 0, 1, 1])
+
+
+@plain_static_files
+class ProfilePaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('prolific', password='x')
+        created = django_timezone.now()
+        cls.posts = [make_post(cls.author, title=f'Post {i}') for i in range(7)]
+        # Equal timestamps are told apart by id
+        BlogPost.objects.filter(pk__in=[post.pk for post in cls.posts[2:5]]).update(created_at=created)
+        cls.ordered = list(BlogPost.objects.filter(author=cls.author).order_by('-created_at', '-id'))
+
+    def test_cursor_pages_walk_every_row_once(self):
+        rows, cursor, seen = None, None, []
+        while True:
+            rows, cursor = pagination.cursor_page(BlogPost.objects.all(), ('-created_at', '-id'), cursor, size=3)
+            seen.extend(rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.ordered)
+
+    def test_values_rows_use_the_key(self):
+        rows, cursor = pagination.cursor_page(
+            BlogPost.objects.values_list('id', flat=True), ('id',), size=4, key=lambda pk: [pk])
+        self.assertEqual(pagination.decode_cursor(cursor), [rows[-1]])
+
+    def test_malformed_cursors_start_from_the_first_page(self):
+        first, _ = pagination.cursor_page(BlogPost.objects.all(), ('-created_at', '-id'), size=2)
+        for cursor in ('!!!', pagination.encode_cursor({'a': 1}), pagination.encode_cursor(['not a date', 'x'])):
+            with self.subTest(cursor=cursor):
+                rows, _ = pagination.cursor_page(BlogPost.objects.all(), ('-created_at', '-id'), cursor, size=2)
+                self.assertEqual(rows, first)
+
+    def test_profile_pages_cost_the_same_at_any_depth(self):
+        AuthorStats.rebuild([self.author.pk])
+        self.client.get(f'/profile/{self.author.username}/')  # creates the missing UserProfile
+        cursor = pagination.encode_cursor([self.ordered[5].created_at, self.ordered[5].pk])
+        for query in ('', f'?cursor={cursor}'):
+            with self.subTest(query=query), self.assertNumQueries(2):
+                response = self.client.get(f'/profile/{self.author.username}/{query}')
+        self.assertEqual(list(response.context['posts']), self.ordered[6:])
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertEqual(response.context['stats'].post_count, 7)
+
+
+class RateLimitTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('limited-author', password='x')
+        cls.voter = User.objects.create_user('limited-voter', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate('10/m'), (10, 60))
+        self.assertEqual(ratelimit.parse_rate('5 / 10m'), (5, 600))
+        for rate in ('10', '10/w', 'ten/m'):
+            with self.subTest(rate=rate), self.assertRaises(ValueError):
+                ratelimit.parse_rate(rate)
+
+    def test_client_ip_trusts_only_configured_proxies(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 1.2.3.4')
+        self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')
+        with override_settings(WRITORIA_TRUSTED_PROXIES=1):
+            self.assertEqual(ratelimit.client_ip(request), '1.2.3.4')
+        with override_settings(WRITORIA_TRUSTED_PROXIES=3):
+            self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')
+
+    def test_sliding_window_weights_the_previous_window(self):
+        limiter = ratelimit.Limiter('test-window', 2, 60)
+        # Two hits fill the window; its 2 hits count for half as much 30s into the next one
+        self.assertEqual([limiter.hit('a', now=now) for now in (120, 121, 122)], [0, 0, 88])
+        # A third of the way in, 2 * 2/3 + 1 is still over the limit
+        self.assertEqual(limiter.hit('a', now=200), 10)
+        # Rejected hits are not counted, so retrying as told succeeds
+        self.assertEqual(limiter.hit('a', now=210), 0)
+        self.assertEqual(limiter.hit('a', now=211), 29)
+        self.assertEqual(limiter.hit('b', now=200), 0)
+
+    def limited_view(self, **options):
+        @ratelimit.ratelimit('test-view', rate='1/m', keys=('ip',), **options)
+        def view(request):
+            return HttpResponse('ok')
+        return view
+
+    def test_rejections_get_429_with_retry_after(self):
+        view = self.limited_view()
+        factory = RequestFactory()
+        rejected = ratelimit.RATE_LIMITED.value(policy='test-view')
+        self.assertEqual(view(factory.post('/')).status_code, 200)
+        response = view(factory.post('/'))
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(json.loads(response.content)['status'], 'error')
+        html = view(factory.post('/', HTTP_ACCEPT='text/html'))
+        self.assertEqual((html.status_code, html['Content-Type']), (429, 'text/plain; charset=utf-8'))
+        self.assertEqual(ratelimit.RATE_LIMITED.value(policy='test-view'), rejected + 2)
+        # Other methods are not counted
+        self.assertEqual(view(factory.get('/')).status_code, 200)
+
+    def test_settings_disable_or_override_limits(self):
+        view = self.limited_view()
+        factory = RequestFactory()
+        with override_settings(WRITORIA_RATE_LIMIT_ENABLED=False):
+            self.assertEqual([view(factory.post('/')).status_code for _ in range(3)], [200] * 3)
+        with override_settings(WRITORIA_RATE_LIMITS={'test-view': '3/m'}):
+            self.assertEqual([view(factory.post('/')).status_code for _ in range(4)], [200, 200, 200, 429])
+
+    def test_cache_failures_let_requests_through(self):
+        view = self.limited_view()
+        with mock.patch.object(ratelimit.Limiter, 'hit', side_effect=ConnectionError), \
+                mock.patch.object(ratelimit.logger, 'warning') as warning:
+            self.assertEqual([view(RequestFactory().post('/')).status_code for _ in range(2)], [200, 200])
+        self.assertEqual(warning.call_count, 2)
+
+    @override_settings(WRITORIA_RATE_LIMITS={'vote': '2/m'})
+    def test_votes_are_limited_per_user(self):
+        post = make_post(self.author)
+        self.client.force_login(self.voter)
+        statuses = [self.client.post(f'/blog/{post.slug}/vote/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.post(f'/blog/{post.slug}/vote/').status_code, 200)
+
+
+@plain_static_files
+@override_settings(WRITORIA_RATE_LIMIT_ENABLED=False, WRITORIA_PBKDF2_ITERATIONS=1000)
+class AuthTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('member', password='Quill-and-ink-42')
+
+    def count_hashes(self):
+        from django.contrib.auth import hashers as auth_hashers
+
+        return mock.patch.object(auth_hashers, 'pbkdf2', wraps=auth_hashers.pbkdf2)
+
+    def register(self, **fields):
+        data = {
+            'action': 'register', 'username': 'newcomer', 'email': 'new@example.com', 'contact_number': '5550000000',
+            'password1': 'Quill-and-ink-42', 'password2': 'Quill-and-ink-42', **fields,
+        }
+        return self.client.post('/auth/', data)
+
+    def test_new_passwords_use_the_configured_iterations(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_login_hashes_the_password_once(self):
+        with self.count_hashes() as pbkdf2:
+            response = self.client.post('/auth/', {'action': 'login', 'username': 'member', 'password': 'Quill-and-ink-42'})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertEqual(pbkdf2.call_count, 1)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+    def test_wrong_password_shows_the_error(self):
+        response = self.client.post('/auth/', {'action': 'login', 'username': 'member', 'password': 'wrong'})
+        self.assertContains(response, 'Invalid username or password.')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_login_rehashes_passwords_with_other_iterations(self):
+        with override_settings(WRITORIA_PBKDF2_ITERATIONS=1200):
+            self.client.post('/auth/', {'action': 'login', 'username': 'member', 'password': 'Quill-and-ink-42'})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1200$'))
+        self.assertTrue(self.user.check_password('Quill-and-ink-42'))
+
+    def test_partial_user_saves_leave_the_profile_alone(self):
+        self.user.last_login = django_timezone.now()
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+
+    def test_register_creates_the_profile_and_logs_in(self):
+        response = self.register()
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        user = User.objects.get(username='newcomer')
+        self.assertEqual(user.userprofile.contact_number, '5550000000')
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+
+    def test_taken_usernames_are_rejected(self):
+        self.assertContains(self.register(username='MEMBER'), 'A user with that username already exists.')
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_concurrent_signup_for_the_same_name_is_an_error(self):
+        from core.forms import CustomUserCreationForm
+
+        # As if the other signup committed after this one's checks
+        with mock.patch.object(CustomUserCreationForm, 'clean_username', lambda form: form.cleaned_data['username']):
+            response = self.register(username='member')
+        self.assertContains(response, 'This username is already taken.')
+        self.assertEqual(User.objects.count(), 1)
+
+
+@override_settings(WRITORIA_RATE_LIMIT_ENABLED=False)
+class LiveUpdateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('live-author', password='x')
+        cls.post = make_post(cls.author, slug='live')
+
+    def setUp(self):
+        self.broker = live.LocalBroker()
+        patcher = mock.patch.object(live, 'get_broker', return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stream(self, path, method='GET', until=None, events=()):
+        """
+        Run ``sse_app`` for ``path`` and return the ASGI messages it sent.
+        ``events`` are published once the stream is subscribed; the client
+        disconnects when ``until(messages)`` holds.
+        """
+        async def run():
+            sent, disconnected = [], asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            app = asyncio.ensure_future(live.sse_app({'type': 'http', 'path': path, 'method': method}, receive, send))
+            if until is not None:
+                while not self.broker.subscriber_count() and not app.done():
+                    await asyncio.sleep(0.001)
+                for event, data in events:
+                    self.broker.publish(live.post_channel(self.post.pk), event, data)
+                while not until(sent) and not app.done():
+                    await asyncio.sleep(0.001)
+                disconnected.set()
+            await asyncio.wait_for(app, 5)
+            return sent
+        return async_to_sync(run)()
+
+    def bodies(self, sent):
+        return [message['body'] for message in sent if message['type'] == 'http.response.body']
+
+    def test_encode_event(self):
+        self.assertEqual(live.encode_event('votes', {'votes': 3}), b'event: votes\ndata: {"votes":3}\n\n')
+
+    def test_events_are_published_when_the_transaction_commits(self):
+        with mock.patch.object(self.broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                comment = Comment.objects.create(post=self.post, author=self.author, content='<b>Hi</b>')
+                publish.assert_not_called()
+            comment_id = comment.pk
+            with self.captureOnCommitCallbacks(execute=True):
+                comment.delete()
+        channel = live.post_channel(self.post.pk)
+        self.assertEqual(publish.call_args_list, [
+            mock.call(channel, 'comment', {
+                'comment_id': comment_id, 'parent_id': None, 'author': 'live-author', 'content': '<b>Hi</b>',
+                'created_at': mock.ANY,
+            }),
+            mock.call(channel, 'comment_deleted', {'comment_id': comment_id}),
+        ])
+
+    def test_votes_publish_the_new_total(self):
+        self.client.force_login(self.author)
+        with mock.patch.object(self.broker, 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/blog/live/vote/')
+        publish.assert_called_once_with(live.post_channel(self.post.pk), 'votes', {'votes': 1})
+
+    def test_broker_failures_do_not_fail_the_request(self):
+        with mock.patch.object(self.broker, 'publish', side_effect=ConnectionError), \
+                mock.patch.object(live.logger, 'warning') as warning, self.captureOnCommitCallbacks(execute=True):
+            live.publish(self.post.pk, 'votes', {'votes': 1})
+        warning.assert_called_once()
+
+    def test_stream_delivers_events_until_the_reader_leaves(self):
+        sent = self.stream(f'/live/posts/{self.post.pk}/', events=[('votes', {'votes': 2})],
+                           until=lambda sent: len(sent) == 3)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertEqual(self.bodies(sent), [b'retry: 5000\n\n', b'event: votes\ndata: {"votes":2}\n\n'])
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    @override_settings(WRITORIA_LIVE_HEARTBEAT_SECONDS=0.01)
+    def test_idle_streams_are_pinged(self):
+        sent = self.stream(f'/live/posts/{self.post.pk}/', until=lambda sent: len(sent) == 3)
+        self.assertEqual(self.bodies(sent)[-1], live.PING)
+
+    @override_settings(WRITORIA_LIVE_QUEUE_SIZE=1)
+    def test_slow_readers_are_disconnected(self):
+        dropped = live.LIVE_SLOW_READERS.value()
+        # All three are queued before the stream gets to read the first
+        sent = self.stream(f'/live/posts/{self.post.pk}/', events=[('votes', {'votes': n}) for n in range(3)],
+                           until=lambda sent: False)
+        self.assertEqual(self.bodies(sent), [b'retry: 5000\n\n', b''])
+        self.assertEqual(live.LIVE_SLOW_READERS.value(), dropped + 1)
+
+    def test_unknown_posts_and_methods_are_refused(self):
+        self.assertEqual(self.stream('/live/posts/999999/')[0]['status'], 404)
+        self.assertEqual(self.stream('/live/elsewhere/')[0]['status'], 404)
+        self.assertEqual(self.stream(f'/live/posts/{self.post.pk}/', method='POST')[0]['status'], 405)
+        head = self.stream(f'/live/posts/{self.post.pk}/', method='HEAD')
+        self.assertEqual((head[0]['status'], self.bodies(head)), (200, [b'']))
+
+    def test_route_passes_other_paths_to_django(self):
+        calls = []
+
+        async def django_app(scope, receive, send):
+            calls.append(scope['path'])
+
+        application = live.route(django_app)
+        async_to_sync(application)({'type': 'http', 'path': '/blog/'}, None, None)
+        self.assertEqual(calls, ['/blog/'])
+
+
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('api-author', password='x')
+        cls.reader = User.objects.create_user('api-reader', password='x')
+        cls.posts = [
+            make_post(cls.author, title=f'Post {i}', content=f'*Body {i}*', category='arts' if i % 2 else 'tech')
+            for i in range(5)
+        ]
+        cls.newest = cls.posts[::-1]
+        first = cls.posts[0]
+        BlogImage.objects.bulk_create([
+            BlogImage(post=first, image='blog_images/b.png', caption='Second', order=1),
+            BlogImage(post=first, image='blog_images/a.png', caption='First', order=0),
+        ])
+        top = Comment.objects.create(post=first, author=cls.reader, content='Top')
+        cls.reply = Comment.objects.create(post=first, author=cls.author, content='Reply', parent=top)
+        AuthorStats.rebuild([cls.author.pk])
+
+    def get(self, path, status=200, **headers):
+        response = self.client.get(path, **headers)
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json() if response.content else None
+
+    def test_post_list_defaults(self):
+        with self.assertNumQueries(1):
+            body = self.get('/api/v1/posts/')
+        self.assertEqual([item['id'] for item in body['data']], [post.pk for post in self.newest])
+        item = body['data'][-1]
+        self.assertEqual(list(item), ['id', 'slug', 'title', 'url', 'author', 'category', 'excerpt', 'image', 'votes',
+                                      'created_at', 'updated_at'])
+        self.assertEqual(item['url'], self.posts[0].get_absolute_url())
+        self.assertEqual(item['author'], {'username': 'api-author', 'url': '/profile/api-author/', 'avatar': None})
+        self.assertEqual((item['excerpt'], item['image']), ('Body 0', None))
+        self.assertIsNone(body['next'])
+
+    def test_post_list_pages_and_filters(self):
+        seen, url = [], '/api/v1/posts/?limit=2&fields=id'
+        while url:
+            body = self.get(url)
+            self.assertLessEqual(len(body['data']), 2)
+            seen.extend(item['id'] for item in body['data'])
+            url = body['next']
+        self.assertEqual(seen, [post.pk for post in self.newest])
+        self.assertEqual(
+            [item['id'] for item in self.get('/api/v1/posts/?category=arts&fields=id')['data']],
+            [post.pk for post in self.newest if post.category == 'arts'],
+        )
+        self.assertEqual(self.get('/api/v1/posts/?author=api-reader')['data'], [])
+
+    def test_sparse_fields_and_errors(self):
+        body = self.get('/api/v1/posts/?fields=title,category_label&limit=1')
+        self.assertEqual(body['data'], [{'title': 'Post 4', 'category_label': 'Technology'}])
+        error = self.get('/api/v1/posts/?fields=title,password', status=400)['error']
+        self.assertIn('Unknown fields: password', error)
+        self.assertIn('content_html', error)
+        self.get('/api/v1/posts/?include=votes', status=400)
+        self.get('/api/v1/posts/?limit=many', status=400)
+
+    def test_include_images_is_one_query_per_page(self):
+        with self.assertNumQueries(2):
+            body = self.get('/api/v1/posts/?include=images&fields=id')
+        galleries = {item['id']: item['images'] for item in body['data']}
+        self.assertEqual(galleries[self.posts[0].pk], [
+            {'url': '/media/blog_images/a.png', 'caption': 'First'},
+            {'url': '/media/blog_images/b.png', 'caption': 'Second'},
+        ])
+        self.assertEqual(galleries[self.posts[1].pk], [])
+
+    def test_post_detail(self):
+        post = self.posts[0]
+        body = self.get(f'/api/v1/posts/{post.slug}/?fields=title,content_html&include=images')
+        self.assertEqual(body['data']['title'], 'Post 0')
+        self.assertEqual(body['data']['content_html'], '<p><em>Body 0</em></p>')
+        self.assertEqual(len(body['data']['images']), 2)
+        self.assertEqual(self.get('/api/v1/posts/no-such-post/', status=404), {'error': 'Not found'})
+
+    def test_stale_cached_slugs_are_resolved_again(self):
+        first, second = self.posts[:2]
+        slugs.cache.clear()
+        self.addCleanup(slugs.cache.clear)
+        self.get(f'/api/v1/posts/{first.slug}/')
+        # As another process would: the slug moves to another post without this one's cache hearing of it
+        BlogPost.objects.filter(pk=first.pk).update(slug='renamed')
+        BlogPost.objects.filter(pk=second.pk).update(slug=first.slug)
+        self.assertEqual(self.get(f'/api/v1/posts/{first.slug}/?fields=id')['data']['id'], second.pk)
+        self.assertEqual(slugs.cache.get(first.slug), second.pk)
+        BlogPost.objects.filter(pk=second.pk).update(slug='renamed-too')
+        self.get(f'/api/v1/posts/{first.slug}/', status=404)
+        slugs.cache.set(first.slug, first.pk)
+        BlogPost.objects.filter(pk=second.pk).update(slug=first.slug)
+        self.assertEqual(self.get(f'/api/v1/posts/{first.slug}/comments/')['data'], [])
+
+    def test_post_comments(self):
+        body = self.get(f'/api/v1/posts/{self.posts[0].slug}/comments/?limit=1')
+        self.assertEqual(body['data'][0]['id'], self.reply.pk)
+        self.assertEqual(body['data'][0]['author'], {'username': 'api-author', 'url': '/profile/api-author/'})
+        self.assertEqual(body['data'][0]['parent_id'], self.reply.parent_id)
+        self.assertEqual([item['content'] for item in self.get(body['next'])['data']], ['Top'])
+        self.get('/api/v1/posts/no-such-post/comments/', status=404)
+
+    def test_user_detail(self):
+        body = self.get('/api/v1/users/api-author/')
+        self.assertEqual((body['data']['post_count'], body['data']['comments_received']), (5, 2))
+        self.assertEqual(self.get('/api/v1/users/api-reader/?fields=post_count')['data'], {'post_count': 0})
+        User.objects.filter(pk=self.reader.pk).update(is_active=False)
+        self.get('/api/v1/users/api-reader/', status=404)
+
+    def test_etags_and_methods(self):
+        response = self.client.get('/api/v1/posts/')
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        cached = self.client.get('/api/v1/posts/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((cached.status_code, cached.content), (304, b''))
+        make_post(self.author, title='Newer')
+        self.assertEqual(self.client.get('/api/v1/posts/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.post('/api/v1/posts/').status_code, 405)
@@ -0,0 +1,270 @@
+"""
+Typeahead suggestions for the blog search box.
+
+``GET /search/suggest/?q=...`` answers from an in-memory prefix index over
+post titles, author usernames and category names; a keystroke touches
+the database only for the periodic version check below. The index is a sorted list of keys with a parallel
+array of entry ids, so a lookup is two bisections plus a scan of the
+matching range. Every word of a label starts a key (the rest of the label,
+truncated to ``MAX_KEY_LENGTH``), which lets "keeper" and "lighthouse kee"
+both find "The Lighthouse Keeper". Matches are ranked by whether they match
+the start of the label, then by popularity (votes, an author's posts, a
+category's posts).
+
+The index is built on the first suggestion a process serves and is never
+edited in place: it is rebuilt whole, in a background thread, while
+keystrokes keep being answered from the old one. At most every
+``WRITORIA_TYPEAHEAD_REFRESH_SECONDS`` a process rebuilds when it saved a
+post or user itself, or when the version read from the database moved
+(newest post edit or soft delete, post and active user counts, newest
+user), which every process sees alike. Changes the version cannot see,
+such as another process renaming a user or votes moving popularity, are
+picked up by a rebuild at least every ``WRITORIA_TYPEAHEAD_MAX_AGE``
+seconds.
+"""
+
+import bisect
+import heapq
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+
+from . import metrics
+
+logger = logging.getLogger('writoria.typeahead')
+
+MAX_KEY_LENGTH = 40
+MIN_QUERY_LENGTH = 2
+# Longer prefixes match few keys; this bounds the scan for short, common ones
+SCAN_LIMIT = 2000
+
+POST, AUTHOR, CATEGORY = 0, 1, 2
+KINDS = ('post', 'author', 'category')
+# Entry ids pack the kind into the low bits: post and user ids stay unique
+_KIND_BITS = 2
+_KIND_MASK = (1 << _KIND_BITS) - 1
+
+INDEX_BYTES = metrics.registry.gauge(
+    'writoria_typeahead_index_bytes', 'Approximate memory held by the typeahead index in this process.')
+INDEX_KEYS = metrics.registry.gauge(
+    'writoria_typeahead_index_keys', 'Keys in the typeahead index in this process.')
+INDEX_BUILD_SECONDS = metrics.registry.gauge(
+    'writoria_typeahead_build_seconds', 'Time taken by the last full typeahead index build.')
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Case- and accent-insensitive form used for keys and queries"""
+    if not text.isascii():
+        decomposed = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(text.casefold().split())
+
+
+def keys_for(label):
+    """
+    ``(keys, label_key)``: the label from each of its words on, so a query
+    can start at any word, and the key of the whole label.
+    """
+    text = normalize(label)
+    keys = {text[match.start():match.start() + MAX_KEY_LENGTH] for match in _WORD_RE.finditer(text)}
+    return keys, text[:MAX_KEY_LENGTH]
+
+
+class PrefixIndex:
+    """Sorted keys with parallel entry ids, replaced whole by ``load``; all access holds the lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._ids = array('q')
+        # entry id -> (label, target, popularity, key of the whole label)
+        self._entries = {}
+        self.version = None
+        self.built_at = 0.0
+        self.build_seconds = 0.0
+
+    @staticmethod
+    def entry_id(kind, pk):
+        return pk << _KIND_BITS | kind
+
+    def load(self, entries, version=None):
+        """Replace the contents with ``{entry_id: (label, target, popularity)}``"""
+        pairs = []
+        stored = {}
+        for entry_id, (label, target, popularity) in entries.items():
+            keys, label_key = keys_for(label)
+            stored[entry_id] = (label, target, popularity, label_key)
+            pairs.extend((key, entry_id) for key in keys)
+        pairs.sort()
+        keys = [key for key, _ in pairs]
+        ids = array('q', [entry_id for _, entry_id in pairs])
+        with self._lock:
+            self._keys, self._ids, self._entries = keys, ids, stored
+            self.version = version
+
+    def search(self, query, limit=8):
+        """``[(kind, label, target)]`` best first"""
+        prefix = normalize(query)[:MAX_KEY_LENGTH]
+        if len(prefix) < MIN_QUERY_LENGTH:
+            return []
+        with self._lock:
+            start = bisect.bisect_left(self._keys, prefix)
+            # Every key with this prefix sorts before prefix + the highest code point
+            end = min(bisect.bisect_left(self._keys, prefix + '\U0010ffff', start), start + SCAN_LIMIT)
+            entries = self._entries
+            # Matches at the start of a label rank first; an entry matched
+            # both ways keeps its better rank as the smaller tuple
+            ranks = {}
+            for key, entry_id in zip(self._keys[start:end], self._ids[start:end]):
+                label, _, popularity, label_key = entries[entry_id]
+                rank = (key != label_key, -popularity, label)
+                if entry_id not in ranks or rank < ranks[entry_id]:
+                    ranks[entry_id] = rank
+            best = heapq.nsmallest(limit, ranks, key=ranks.__getitem__)
+            return [(KINDS[entry_id & _KIND_MASK], *entries[entry_id][:2]) for entry_id in best]
+
+    def stats(self):
+        """Entry and key counts and an estimate of the bytes held"""
+        with self._lock:
+            size = sys.getsizeof(self._keys) + sum(sys.getsizeof(key) for key in self._keys)
+            size += sys.getsizeof(self._ids) + sys.getsizeof(self._entries)
+            for entry_id, entry in self._entries.items():
+                size += sys.getsizeof(entry_id) + sys.getsizeof(entry) + sum(sys.getsizeof(part) for part in entry)
+            return {'entries': len(self._entries), 'keys': len(self._keys), 'bytes': size,
+                    'build_seconds': self.build_seconds}
+
+
+def _load_entries():
+    """Every post, author and category, with its link target and popularity"""
+    from django.contrib.auth.models import User
+    from django.db.models import Count
+    from .models import BlogPost
+
+    post_path = reverse('blog_detail', kwargs={'slug': '__value__'}).split('__value__')
+    user_path = reverse('user_profile', kwargs={'username': '__value__'}).split('__value__')
+    entries = {}
+    posts = BlogPost.objects.values_list('pk', 'title', 'slug', 'votes').iterator(chunk_size=5000)
+    for pk, title, slug, votes in posts:
+        entries[PrefixIndex.entry_id(POST, pk)] = (title, post_path[0] + slug + post_path[1], votes)
+    authors = (User.objects.filter(is_active=True)
+               .values_list('pk', 'username', 'author_stats__post_count').iterator(chunk_size=5000))
+    for pk, username, post_count in authors:
+        entries[PrefixIndex.entry_id(AUTHOR, pk)] = (
+            username, user_path[0] + quote(username) + user_path[1], post_count or 0)
+    counts = dict(BlogPost.objects.values_list('category').annotate(n=Count('pk')).order_by())
+    for i, (code, label) in enumerate(BlogPost.CATEGORY_CHOICES):
+        entries[PrefixIndex.entry_id(CATEGORY, i)] = (label, f"{reverse('blog_list')}?category={code}",
+                                                      counts.get(code, 0))
+    return entries
+
+
+def _version():
+    """What the posts and users tables look like now; any change to the indexed rows moves it"""
+    from django.contrib.auth.models import User
+    from django.db.models import Count, Max
+    from .models import BlogPost
+
+    # The base manager, so hiding a post counts as a change
+    posts = BlogPost.all_objects.aggregate(updated=Max('updated_at'), deleted=Max('deleted_at'), count=Count('pk'))
+    users = User.objects.filter(is_active=True).aggregate(last=Max('pk'), count=Count('pk'))
+    return posts['updated'], posts['deleted'], posts['count'], users['last'], users['count']
+
+
+class Typeahead:
+    """The process's index, built on first use and rebuilt in the background when it is behind"""
+
+    def __init__(self):
+        self.index = None
+        self._build_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._checked = 0.0
+        self._changed = False
+
+    def get_index(self):
+        index = self.index
+        if index is None:
+            with self._build_lock:
+                return self.index or self.rebuild()
+        now = time.monotonic()
+        if now - self._checked >= getattr(settings, 'WRITORIA_TYPEAHEAD_REFRESH_SECONDS', 5):
+            self._checked = now
+            if (self._changed or now - index.built_at >= getattr(settings, 'WRITORIA_TYPEAHEAD_MAX_AGE', 600)
+                    or index.version != _version()):
+                # A keystroke never waits for a build; it gets the old index meanwhile
+                self.rebuild_in_background()
+        return index
+
+    def rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_thread, name='writoria-typeahead-build', daemon=True).start()
+
+    def _rebuild_in_thread(self):
+        try:
+            self.rebuild()
+        except Exception:
+            # Tried again at the next check
+            self._changed = True
+            logger.warning('Rebuilding the typeahead index failed', exc_info=True)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            close_old_connections()
+
+    def rebuild(self):
+        # Cleared and read before the rows, so a change made during the build leaves the index behind
+        self._changed = False
+        version = _version()
+        started = time.perf_counter()
+        index = PrefixIndex()
+        index.load(_load_entries(), version)
+        index.built_at = self._checked = time.monotonic()
+        index.build_seconds = time.perf_counter() - started
+        self.index = index
+        stats = index.stats()
+        INDEX_BYTES.set(stats['bytes'])
+        INDEX_KEYS.set(stats['keys'])
+        INDEX_BUILD_SECONDS.set(index.build_seconds)
+        logger.info('Built typeahead index: %(entries)d entries, %(keys)d keys, %(bytes)d bytes', stats)
+        return index
+
+    def changed(self):
+        """Rebuild at the next check once the transaction commits, even if the version cannot tell"""
+        transaction.on_commit(self._mark_changed)
+
+    def _mark_changed(self):
+        self._changed = True
+
+
+typeahead = Typeahead()
+
+
+@require_safe
+def suggest(request):
+    """``{"suggestions": [{"type", "label", "url"}]}`` for the search box"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    results = typeahead.get_index().search(request.GET.get('q', ''), limit)
+    response = JsonResponse({'suggestions': [
+        {'type': kind, 'label': label, 'url': url} for kind, label, url in results
+    ]})
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
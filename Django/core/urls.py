@@ -1,14 +1,13 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
-from django.conf import settings
-from django.conf.urls.static import static
+from . import api, feeds, typeahead, views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('about/', views.about, name='about'),
     path('team/', views.team, name='team'),
     path('blog/', views.BlogListView.as_view(), name='blog_list'),
+    path('search/suggest/', typeahead.suggest, name='search_suggest'),
     path('blog/new/', views.BlogCreateView.as_view(), name='blog_create'),
     path('blog/<slug:slug>/', views.BlogDetailView.as_view(), name='blog_detail'),
     path('blog/<slug:slug>/edit/', views.BlogUpdateView.as_view(), name='blog_update'),
@@ -16,6 +15,10 @@ urlpatterns = [
     path('blog/<slug:slug>/bookmark/', views.toggle_bookmark, name='toggle_bookmark'),
     path('blog/<slug:slug>/vote/', views.vote_post, name='vote_post'),
     path('blog/<slug:slug>/comment/', views.add_comment, name='add_comment'),
+    path('blog/<slug:slug>/views/', views.post_views, name='post_views'),
+    path('blog/<slug:slug>/autosave/', views.autosave_post, name='autosave_post'),
+    path('blog/<slug:slug>/revisions/', views.post_revisions, name='post_revisions'),
+    path('blog/<slug:slug>/revisions/<int:number>/', views.post_revision, name='post_revision'),
     path('comment/<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),
     path('profile/', views.profile, name='profile'),
     path('profile/<str:username>/', views.user_profile, name='user_profile'),
@@ -23,7 +26,15 @@ urlpatterns = [
     path('help/', views.help_center, name='help_center'),
     path('logout/', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
     path('suggestion/', views.suggestion_form, name='suggestion_form'),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('metrics', views.metrics_view, name='metrics'),
+    path('sitemap.xml', feeds.sitemap_index, name='sitemap'),
+    path('sitemap-static.xml', feeds.sitemap_static, name='sitemap_static'),
+    path('sitemap-posts-<int:page>.xml', feeds.sitemap_posts, name='sitemap_posts'),
+    path('feeds/atom.xml', feeds.site_feed, name='feed'),
+    path('feeds/category/<str:category>.xml', feeds.category_feed, name='category_feed'),
+    path('feeds/author/<str:username>.xml', feeds.author_feed, name='author_feed'),
+    path('api/v1/posts/', api.post_list, name='api_posts'),
+    path('api/v1/posts/<slug:slug>/', api.post_detail, name='api_post'),
+    path('api/v1/posts/<slug:slug>/comments/', api.post_comments, name='api_post_comments'),
+    path('api/v1/users/<str:username>/', api.user_detail, name='api_user'),
+]
\ No newline at end of file
@@ -3,20 +3,31 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib import messages
-from django.http import JsonResponse, Http404
+from django.http import JsonResponse, Http404, HttpResponse
+from django.conf import settings
 from django.contrib.auth.forms import AuthenticationForm
-from django.contrib.auth import login, authenticate
-from django.db.models import Q
+from django.contrib.auth import login
+from django.db import IntegrityError, transaction
 from django.views.decorators.csrf import csrf_exempt
-import requests
+import hmac
 import json
-from .models import BlogPost, UserProfile, Bookmark, BlogImage, Vote, Comment
+import logging
+from .models import BlogPost, UserProfile, Bookmark, BlogImage, Vote, Comment, AuthorStats, PostRevision
 from django.contrib.auth.models import User
 from .forms import BlogPostForm, UserProfileForm, CustomUserCreationForm, CommentForm
 from .services.api import APIClient
+from .services import gallery, viewer_state
+from . import analytics, duplicates, facets, live, metrics, revisions, slugs
+from .ratelimit import ratelimit
+from .pagination import cursor_page
+
+logger = logging.getLogger(__name__)
+
+PROFILE_POSTS_PER_PAGE = 12
 
 def home(request):
-    posts = BlogPost.objects.all().order_by('-created_at')[:6]
+    # Cards only show the excerpt, so the post bodies are not loaded
+    posts = BlogPost.objects.select_related('author').defer('content', 'content_html').order_by('-created_at')[:6]
     return render(request, 'core/home.html', {'posts': posts})
 
 def about(request):
@@ -32,6 +43,7 @@ def team(request):
     }
     return render(request, 'core/team.html', team_images)
 
+@ratelimit('auth', rate='10/m', keys=('ip',))
 def auth_view(request):
     login_form = AuthenticationForm()
     register_form = CustomUserCreationForm()
@@ -41,33 +53,27 @@ def auth_view(request):
         
         if action == 'login':
             login_form = AuthenticationForm(request, data=request.POST)
+            # is_valid() has already authenticated the user; authenticating again would hash twice
             if login_form.is_valid():
-                username = login_form.cleaned_data.get('username')
-                password = login_form.cleaned_data.get('password')
-                
-                user = authenticate(request, username=username, password=password)
-                if user is not None:
-                    login(request, user)
-                    messages.success(request, 'Successfully logged in!')
-                    return redirect('home')
-                else:
-                    messages.error(request, 'Invalid username or password.')
+                login(request, login_form.get_user())
+                messages.success(request, 'Successfully logged in!')
+                return redirect('home')
+            elif login_form.non_field_errors():
+                messages.error(request, 'Invalid username or password.')
             
         elif action == 'register':
             register_form = CustomUserCreationForm(request.POST)
+            # The form rejects taken usernames itself; a concurrent signup is caught by the unique constraint
             if register_form.is_valid():
-                username = register_form.cleaned_data['username']
-                
-                if User.objects.filter(username=username).exists():
+                try:
+                    with transaction.atomic():
+                        user = register_form.save()
+                except IntegrityError:
                     register_form.add_error('username', 'This username is already taken.')
                 else:
-                    try:
-                        user = register_form.save()
-                        login(request, user)
-                        messages.success(request, 'Account created successfully! Welcome to Writoria.')
-                        return redirect('home')
-                    except Exception as e:
-                        register_form.add_error(None, 'An error occurred during registration. Please try again.')
+                    login(request, user)
+                    messages.success(request, 'Account created successfully! Welcome to Writoria.')
+                    return redirect('home')
     
     return render(request, 'core/auth.html', {
         'login_form': login_form,
@@ -82,45 +88,64 @@ class BlogListView(ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('author').defer('content', 'content_html')
         search_query = self.request.GET.get('search', '')
         category = self.request.GET.get('category', '')
         
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(content__icontains=search_query)
-            )
+            queryset = queryset.filter(facets.search_filter(search_query))
         
         if category:
             queryset = queryset.filter(category=category)
         
         return queryset
 
+    def get_facet_counts(self):
+        if getattr(self, '_facet_counts', None) is None:
+            self._facet_counts = facets.counts_for(self.request.GET.get('search', ''))
+        return self._facet_counts
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['search_query'] = self.request.GET.get('search', '')
         context['selected_category'] = self.request.GET.get('category', '')
-        context['categories'] = BlogPost.CATEGORY_CHOICES
+        context['categories'] = facets.choices(self.get_facet_counts())
+        context['facet_total'] = facets.total(self.get_facet_counts())
+        context['posts'] = context['object_list'] = viewer_state.attach_viewer_state(
+            self.request.user, context['object_list']
+        )
         return context
 
-class BlogDetailView(DetailView):
+class PostObjectMixin:
+    """Resolves the URL slug through the slug cache and loads the post once per request"""
+
+    def get_object(self, queryset=None):
+        if getattr(self, '_post', None) is None:
+            slug = self.kwargs['slug']
+            queryset = self.get_queryset() if queryset is None else queryset
+            post = queryset.filter(pk=slugs.post_id_or_404(slug), slug=slug).first()
+            if post is None:
+                slugs.cache.forget(slug=slug)
+                post = get_object_or_404(queryset, slug=slug)
+            self._post = post
+        return self._post
+
+class BlogDetailView(PostObjectMixin, DetailView):
     model = BlogPost
     template_name = 'core/blog_detail.html'
     context_object_name = 'object'
 
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        analytics.record_view(request, self.object.pk)
+        return response
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
         if self.request.user.is_authenticated:
-            context['is_bookmarked'] = Bookmark.objects.filter(
-                user=self.request.user,
-                post=self.object
-            ).exists()
-            context['user_vote'] = Vote.objects.filter(
-                user=self.request.user,
-                post=self.object
-            ).first()
+            state = viewer_state.get_viewer_state(self.request.user, [self.object.pk])
+            context['is_bookmarked'], context['user_vote'] = state[self.object.pk]
             
         context['comments'] = self.object.comments.filter(parent=None)
         context['comment_form'] = CommentForm()
@@ -134,21 +159,12 @@ class BlogCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.author = self.request.user
         try:
-            response = super().form_valid(form)
-            
-            # Handle additional images
-            images = self.request.FILES.getlist('images')
-            captions = form.cleaned_data.get('image_captions', '').split('\n')
-            captions = [cap.strip() for cap in captions if cap.strip()]
-            
-            for i, image in enumerate(images):
-                caption = captions[i] if i < len(captions) else ''
-                BlogImage.objects.create(
-                    post=self.object,
-                    image=image,
-                    caption=caption,
-                    order=i
-                )
+            # Gallery files are written before the transaction opens
+            names = gallery.store_images(self.request.FILES.getlist('images'))
+            captions = gallery.split_captions(form.cleaned_data.get('image_captions'))
+            with transaction.atomic():
+                response = super().form_valid(form)
+                gallery.attach_images(self.object, names, captions)
             messages.success(self.request, 'Blog post created successfully!')
             return response
                 
@@ -156,51 +172,86 @@ class BlogCreateView(LoginRequiredMixin, CreateView):
             messages.error(self.request, f'Failed to create blog post: {str(e)}')
             return self.form_invalid(form)
 
-class BlogUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class BlogUpdateView(LoginRequiredMixin, UserPassesTestMixin, PostObjectMixin, UpdateView):
     model = BlogPost
     form_class = BlogPostForm
     template_name = 'core/blog_form.html'
 
     def form_valid(self, form):
         form.instance.author = self.request.user
-        response = super().form_valid(form)
-        
-        # Handle image updates
-        images = self.request.FILES.getlist('images')
-        captions = form.cleaned_data.get('image_captions', '').split('\n')
-        captions = [cap.strip() for cap in captions if cap.strip()]
-        
-        # Delete existing images if replace_images is checked
-        if form.cleaned_data.get('replace_images'):
-            BlogImage.objects.filter(post=self.object).delete()
-        
-        # Add new images
-        for i, image in enumerate(images):
-            caption = captions[i] if i < len(captions) else ''
-            BlogImage.objects.create(
-                post=self.object,
-                image=image,
-                caption=caption,
-                order=i + self.object.blogimage_set.count()
-            )
+        names = gallery.store_images(self.request.FILES.getlist('images'))
+        captions = gallery.split_captions(form.cleaned_data.get('image_captions'))
+
+        with transaction.atomic():
+            response = super().form_valid(form)
+            # Delete existing images if replace_images is checked
+            if form.cleaned_data.get('replace_images'):
+                BlogImage.objects.filter(post=self.object).delete()
+            else:
+                gallery.update_gallery(self.object, *self.gallery_edits())
+            gallery.attach_images(self.object, names, captions)
+            try:
+                revisions.save(self.object, self.request.user, content=self.object.content,
+                               title=self.object.title, published=True)
+            except revisions.RevisionConflict:
+                # An autosave took the number; the edit page records this version next time
+                pass
         messages.success(self.request, 'Blog post updated successfully!')
         return response
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        if self.request.method == 'GET':
+            # Reopen an unsaved draft; autosaves then send diffs against this revision
+            self.editing = revisions.editing_state(self.object)
+            kwargs['initial'] = {'title': self.editing['title'], 'content': self.editing['content']}
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        editing = getattr(self, 'editing', None)
+        if editing is None:
+            # A re-rendered invalid form holds unsaved text: the first autosave sends all of it
+            context['autosave_revision'] = revisions.latest_number(self.object.pk)
+            context['autosave_unsaved'] = True
+        else:
+            context['autosave_revision'] = editing['revision']
+        context['draft_saved_at'] = editing['draft'] if editing else None
+        return context
+
+    def gallery_edits(self):
+        """Read ``gallery_order_<id>`` and ``gallery_caption_<id>`` inputs for existing images"""
+        positions, captions = {}, {}
+        caption_length = BlogImage._meta.get_field('caption').max_length
+        for key, value in self.request.POST.items():
+            prefix, _, image_id = key.rpartition('_')
+            if prefix not in ('gallery_order', 'gallery_caption') or not image_id.isdigit():
+                continue
+            if prefix == 'gallery_caption':
+                captions[int(image_id)] = value.strip()[:caption_length]
+            elif value.strip().lstrip('-').isdigit():
+                positions[int(image_id)] = int(value)
+        order = sorted(positions, key=positions.get)
+        return order, captions
+
     def test_func(self):
         post = self.get_object()
         return self.request.user == post.author
 
-class BlogDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class BlogDeleteView(LoginRequiredMixin, UserPassesTestMixin, PostObjectMixin, DeleteView):
     model = BlogPost
     template_name = 'core/blog_confirm_delete.html'
     success_url = '/'
 
+    def form_valid(self, form):
+        # Hidden immediately; comments, votes and files are purged in the background
+        self.object.soft_delete()
+        messages.success(self.request, 'Blog post deleted successfully!')
+        return redirect(self.get_success_url())
+
     def delete(self, request, *args, **kwargs):
         self.object = self.get_object()
-        success_url = self.get_success_url()
-        self.object.delete()
-        messages.success(request, 'Blog post deleted successfully!')
-        return redirect(success_url)
+        return self.form_valid(None)
 
     def test_func(self):
         post = self.get_object()
@@ -208,57 +259,88 @@ class BlogDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
 
 @login_required
 def toggle_bookmark(request, slug):
-    post = get_object_or_404(BlogPost, slug=slug)
-    bookmark, created = Bookmark.objects.get_or_create(user=request.user, post=post)
+    post_id = slugs.post_id_or_404(slug)
+    with slugs.existing_post(post_id):
+        bookmark, created = Bookmark.objects.get_or_create(user=request.user, post_id=post_id)
     
     if not created:
         bookmark.delete()
+    viewer_state.forget(request.user, post_id)
         
     return JsonResponse({
         'is_bookmarked': created
     })
 
 @login_required
+@ratelimit('vote', rate='60/m', keys=('user',))
 def vote_post(request, slug):
     if request.method == 'POST':
-        post = get_object_or_404(BlogPost, slug=slug)
-        vote, created = Vote.objects.get_or_create(
-            user=request.user,
-            post=post,
-            defaults={'is_life': True}
-        )
+        post_id = slugs.post_id_or_404(slug)
+        with slugs.existing_post(post_id):
+            vote, created = Vote.objects.get_or_create(
+                user=request.user,
+                post_id=post_id,
+                defaults={'is_life': True}
+            )
         
         if not created:
             vote.is_life = not vote.is_life
-            vote.save()
+            vote.save(update_fields=['is_life'])
+        viewer_state.forget(request.user, post_id)
         
-        # Update post votes count
-        post.votes = Vote.objects.filter(post=post, is_life=True).count()
-        post.save()
+        # Update post votes count without loading or re-saving the whole post
+        votes = Vote.objects.filter(post_id=post_id, is_life=True).count()
+        BlogPost.objects.filter(pk=post_id).update(votes=votes)
+        live.publish(post_id, 'votes', {'votes': votes})
         
         return JsonResponse({
-            'votes': post.votes,
+            'votes': votes,
             'has_life': vote.is_life
         })
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
 @login_required
+@ratelimit('comment', rate='10/m', keys=('user',))
 def add_comment(request, slug):
-    post = get_object_or_404(BlogPost, slug=slug)
+    post_id = slugs.post_id_or_404(slug)
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             form = CommentForm({'content': data.get('content')})
             if form.is_valid():
                 comment = form.save(commit=False)
-                comment.post = post
+                comment.post_id = post_id
                 comment.author = request.user
                 parent_id = data.get('parent_id')
                 if parent_id:
                     parent_comment = Comment.objects.get(id=parent_id)
                     comment.parent = parent_comment
                 
-                comment.save()
+                # A resubmitted comment folds into the one already posted in the
+                # same place; the same text pasted onto other posts is refused
+                decision = duplicates.check(
+                    'comment', comment.content,
+                    fold=[('user_reply', request.user.pk, post_id, comment.parent_id)],
+                    reject=[('user', request.user.pk)],
+                )
+                if decision.action == duplicates.REJECT:
+                    return JsonResponse({'error': 'You just posted a very similar comment'}, status=409)
+                if decision.action == duplicates.FOLD:
+                    existing = Comment.objects.filter(pk=decision.ref, author=request.user).first()
+                    if existing is not None:
+                        return JsonResponse({
+                            'status': 'success',
+                            'comment_id': existing.id,
+                            'author': request.user.username,
+                            'content': existing.content,
+                            'created_at': existing.created_at.strftime('%b %d, %Y %H:%M'),
+                            'parent_id': existing.parent_id,
+                            'duplicate': True,
+                        })
+                
+                with slugs.existing_post(post_id):
+                    comment.save()
+                decision.accept(comment.pk)
                 return JsonResponse({
                     'status': 'success',
                     'comment_id': comment.id,
@@ -273,6 +355,87 @@ def add_comment(request, slug):
             return JsonResponse({'error': 'Parent comment not found'}, status=404)
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
+@login_required
+def post_views(request, slug):
+    """Daily views and unique viewers of a post, for its author and staff"""
+    post = get_object_or_404(BlogPost.objects.only('id', 'author_id'), pk=slugs.post_id_or_404(slug))
+    if request.user.pk != post.author_id and not request.user.is_staff:
+        raise Http404
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 365)
+    except ValueError:
+        days = 30
+    return JsonResponse({
+        'days': [
+            {'day': row['day'].isoformat(), 'views': row['views'], 'uniques': row['uniques']}
+            for row in analytics.daily_views(post.pk, days)
+        ],
+        'total': analytics.view_totals([post.pk], days).get(post.pk, {'views': 0, 'uniques': 0}),
+    })
+
+def _own_post_or_404(request, slug, *fields, allow_staff=True):
+    post = get_object_or_404(BlogPost.objects.only('id', 'author_id', *fields), pk=slugs.post_id_or_404(slug))
+    if request.user.pk != post.author_id and not (allow_staff and request.user.is_staff):
+        raise Http404
+    return post
+
+@login_required
+@ratelimit('autosave', rate='30/m', keys=('user',))
+def autosave_post(request, slug):
+    """Save a draft revision from ``{"base", "ops", "length", "title"}`` or ``{"base", "content", "title"}``"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=400)
+    post = _own_post_or_404(request, slug, 'title', allow_staff=False)
+    try:
+        payload = json.loads(request.body)
+        if not isinstance(payload, dict):
+            raise ValueError
+        title = payload.get('title')
+        if 'ops' in payload:
+            changes = {'ops': payload['ops'], 'base': payload.get('base'), 'length': payload.get('length')}
+        else:
+            changes = {'content': str(payload['content']), 'base': payload.get('base')}
+    except (ValueError, KeyError):
+        return JsonResponse({'error': 'Invalid autosave payload'}, status=400)
+    if title is not None and not isinstance(title, str):
+        return JsonResponse({'error': 'Invalid autosave payload'}, status=400)
+    try:
+        number, created = revisions.save(post, request.user, title=title, **changes)
+    except revisions.RevisionConflict as conflict:
+        return JsonResponse({'error': 'conflict', 'revision': conflict.latest}, status=409)
+    return JsonResponse({'revision': number, 'created': created})
+
+@login_required
+def post_revisions(request, slug):
+    """The post's revision history, newest first, for its author and staff"""
+    post = _own_post_or_404(request, slug)
+    return JsonResponse({'revisions': [
+        {
+            'number': row['number'],
+            'title': row['title'],
+            'author': row['author__username'],
+            'length': row['length'],
+            'published': row['published'],
+            'snapshot': row['is_snapshot'],
+            'created_at': row['created_at'].isoformat(),
+        }
+        for row in revisions.history(post.pk)
+    ]})
+
+@login_required
+def post_revision(request, slug, number):
+    post = _own_post_or_404(request, slug)
+    revision = PostRevision.objects.filter(post_id=post.pk, number=number).values('title', 'published', 'created_at').first()
+    if revision is None:
+        raise Http404
+    return JsonResponse({
+        'number': number,
+        'title': revision['title'],
+        'published': revision['published'],
+        'created_at': revision['created_at'].isoformat(),
+        'content': revisions.rebuild(post.pk, number),
+    })
+
 @login_required
 def delete_comment(request, comment_id):
     comment = get_object_or_404(Comment, id=comment_id, author=request.user)
@@ -293,7 +456,7 @@ def profile(request):
         form = UserProfileForm(instance=profile)
     
     user_posts = BlogPost.objects.filter(author=request.user).order_by('-created_at')
-    bookmarks = Bookmark.objects.filter(user=request.user).order_by('-created_at')
+    bookmarks = Bookmark.objects.filter(user=request.user, post__deleted_at__isnull=True).order_by('-created_at')
     
     return render(request, 'core/profile.html', {
         'form': form,
@@ -302,8 +465,17 @@ def profile(request):
     })
 
 def user_profile(request, username):
-    user = get_object_or_404(User, username=username)
-    profile, created = UserProfile.objects.get_or_create(user=user)
+    # Profile and stats come with the user: one query for the whole header
+    user = get_object_or_404(User.objects.select_related('userprofile', 'author_stats'), username=username)
+    try:
+        profile = user.userprofile
+    except UserProfile.DoesNotExist:
+        profile = UserProfile.objects.create(user=user)
+    try:
+        stats = user.author_stats
+    except AuthorStats.DoesNotExist:
+        AuthorStats.rebuild([user.pk])
+        stats = AuthorStats.objects.get(pk=user.pk)
     
     # Calculate profile completion
     completion_fields = {
@@ -312,54 +484,70 @@ def user_profile(request, username):
         'website': bool(profile.website)
     }
     profile_completion = (sum(completion_fields.values()) / len(completion_fields)) * 100
+
+    posts, next_cursor = cursor_page(
+        BlogPost.objects.filter(author=user).defer('content', 'content_html'),
+        ('-created_at', '-id'),
+        cursor=request.GET.get('cursor'),
+        size=PROFILE_POSTS_PER_PAGE,
+    )
     
     return render(request, 'core/user_profile.html', {
         'profile': profile,
-        'profile_completion': profile_completion
+        'profile_completion': profile_completion,
+        'stats': stats,
+        'posts': viewer_state.attach_viewer_state(request.user, posts),
+        'next_cursor': next_cursor,
     })
 
+@ratelimit('contact', rate='5/h', keys=('ip',))
 def help_center(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            name = data.get('name')
-            email = data.get('email')
-            subject = data.get('subject', 'No Subject')
-            message = data.get('message')
+            if not isinstance(data, dict):
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'Invalid JSON data'
+                }, status=400)
+            # The transport validates the fields and folds a repeated message
+            api_response, status_code = APIClient.submit_contact_form(
+                name=data.get('name'),
+                email=data.get('email'),
+                subject=data.get('subject', 'No Subject'),
+                message=data.get('message')
+            )
             
-            if name and email and message:
-                # Submit to Flask API only
-                api_response, status_code = APIClient.submit_contact_form(
-                    name=name,
-                    email=email,
-                    subject=subject,
-                    message=message
-                )
-                
-                if status_code == 201:
-                    messages.success(request, 'Your message has been sent successfully! We\'ll get back to you soon.')
-                    return JsonResponse({
-                        'status': 'success',
-                        'message': 'Your message has been sent successfully! We\'ll get back to you soon.',
-                        'redirect_url': '/'
-                    })
-                else:
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': api_response.get('message', 'An error occurred. Please try again.')
-                    }, status=400)
-            else:
+            if status_code == 201:
+                messages.success(request, 'Your message has been sent successfully! We\'ll get back to you soon.')
+                return JsonResponse({
+                    'status': 'success',
+                    'message': 'Your message has been sent successfully! We\'ll get back to you soon.',
+                    'redirect_url': '/'
+                })
+            elif status_code == 400:
                 return JsonResponse({
                     'status': 'error',
                     'message': 'Please fill in all required fields.'
                 }, status=400)
+            elif status_code >= 500:
+                # The contact service is down or failed to store it: nothing the visitor typed was wrong
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'We could not send your message right now. Please try again later.'
+                }, status=503)
+            else:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': api_response.get('message', 'An error occurred. Please try again.')
+                }, status=400)
         except json.JSONDecodeError:
             return JsonResponse({
                 'status': 'error',
                 'message': 'Invalid JSON data'
             }, status=400)
-        except Exception as e:
-            print(f"Error in help_center view: {str(e)}")  # Debug print
+        except Exception:
+            logger.exception('Error in help_center view')
             return JsonResponse({
                 'status': 'error',
                 'message': 'An unexpected error occurred'
@@ -367,31 +555,48 @@ def help_center(request):
             
     return render(request, 'core/help_center.html')
 
+@ratelimit('contact', rate='5/h', keys=('ip',))
 def suggestion_form(request):
     if request.method == 'POST':
-        try:
-            response = requests.post(
-                'http://localhost:5000/api/contact',
-                json={
-                    'name': request.POST.get('name'),
-                    'email': request.POST.get('email'),
-                    'subject': request.POST.get('subject', 'Site Suggestion'),
-                    'message': request.POST.get('message')
-                }
-            )
-            if response.status_code == 201:
-                return JsonResponse({
-                    'status': 'success',
-                    'message': 'Thank you for your suggestion!'
-                })
-            else:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Something went wrong. Please try again.'
-                }, status=400)
-        except requests.RequestException:
+        _, status_code = APIClient.submit_contact_form(
+            name=request.POST.get('name'),
+            email=request.POST.get('email'),
+            subject=request.POST.get('subject', 'Site Suggestion'),
+            message=request.POST.get('message')
+        )
+        if status_code == 201:
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Thank you for your suggestion!'
+            })
+        elif status_code == 400:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Please fill in all required fields.'
+            }, status=400)
+        elif status_code >= 500:
             return JsonResponse({
                 'status': 'error',
                 'message': 'Could not connect to the server. Please try again later.'
             }, status=503)
+        else:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Something went wrong. Please try again.'
+            }, status=400)
     return render(request, 'core/suggestion_form.html')
+
+def _metrics_scrape_allowed(request):
+    token = getattr(settings, 'WRITORIA_METRICS_TOKEN', None)
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if token and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), token.encode()):
+        return True
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'WRITORIA_METRICS_SCRAPE_ADDRESSES', ()):
+        return True
+    return request.user.is_staff
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; see WRITORIA_METRICS_TOKEN for who may scrape it"""
+    if not _metrics_scrape_allowed(request):
+        raise Http404
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -13,4 +13,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "writoria.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up; live update streams are served outside the request cycle
+from core import analytics, live  # noqa: E402
+
+application = live.route(django_application)
+# Buffered post views are written when the worker exits
+analytics.flush_on_exit()
@@ -67,17 +67,46 @@ JAZZMIN_SETTINGS = {
 
 
 MIDDLEWARE = [
+    "core.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.StaticAssetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 ROOT_URLCONF = "writoria.urls"
 
+# Request instrumentation (core.middleware.InstrumentationMiddleware)
+WRITORIA_SLOW_REQUEST_SECONDS = 0.5
+WRITORIA_SLOW_REQUEST_TOP_QUERIES = 5
+# /metrics answers staff, scrapers sending "Authorization: Bearer <token>" and
+# peers connecting from WRITORIA_METRICS_SCRAPE_ADDRESSES. Only list
+# addresses no proxy in front of the site connects from: a request relayed
+# by a local proxy arrives from the proxy's address.
+WRITORIA_METRICS_TOKEN = None
+WRITORIA_METRICS_SCRAPE_ADDRESSES = []
+
+# Request profiling (core.middleware.ProfilingMiddleware). Staff can always
+# profile a request with ?_profile=1; this fraction is profiled at random.
+WRITORIA_PROFILE_SAMPLE_RATE = 0.0
+WRITORIA_PROFILE_KEEP = 50
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "writoria": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -127,6 +156,18 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# The first hasher encodes new passwords; the rest only verify older hashes.
+# Changing WRITORIA_PBKDF2_ITERATIONS rehashes each password at its next login.
+PASSWORD_HASHERS = [
+    "core.hashers.ConfigurablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+WRITORIA_PBKDF2_ITERATIONS = None
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -146,10 +187,110 @@ STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 
+# collectstatic writes content-hashed copies plus .gz/.br variants, which
+# core.middleware.StaticAssetMiddleware serves with far-future caching.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "core.storage.CompressedManifestStaticFilesStorage",
+    },
+    # Avatars and blog images are deduplicated by content; see gc_media
+    "uploads": {
+        "BACKEND": "core.storage.ContentAddressedStorage",
+    },
+}
+# Cache lifetime (seconds) for static files that are not content-hashed
+WRITORIA_STATIC_MAX_AGE = 60
+
 # Media files (Uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media serving (core.media.serve_media). Set WRITORIA_MEDIA_OFFLOAD to
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache) to let the front proxy
+# stream files; the nginx location must be internal and alias MEDIA_ROOT.
+WRITORIA_MEDIA_OFFLOAD = None
+WRITORIA_MEDIA_ACCEL_PREFIX = '/protected-media/'
+WRITORIA_MEDIA_MAX_AGE = 86400
+
+# Unreferenced uploads are kept this long before gc_media deletes them. Run
+# `manage.py gc_media` from cron; only a post purge frees files by itself.
+WRITORIA_MEDIA_GC_GRACE_HOURS = 24
+
+# Threads used to write a post's gallery uploads (core.services.gallery)
+WRITORIA_GALLERY_WRITE_WORKERS = 4
+
+# Per-process LRU of blog post slug -> id (core.slugs)
+WRITORIA_SLUG_CACHE_SIZE = 1024
+
+# Post view counting (core.analytics): buffered per process, flushed to the
+# daily rollup table WRITORIA_VIEW_FLUSH_SECONDS after views start waiting,
+# once this many (post, day) pairs are pending, and when a worker exits
+WRITORIA_VIEW_COUNTING = True
+WRITORIA_VIEW_FLUSH_SECONDS = 60
+WRITORIA_VIEW_BUFFER_KEYS = 1000
+
+# Rate limits (core.ratelimit), counted in the default cache (per process unless
+# CACHES points at a shared backend). WRITORIA_RATE_LIMITS entries override a
+# policy's rate, e.g. {'chat': '20/m'}; policies are chat, comment, vote,
+# contact and auth. Set WRITORIA_TRUSTED_PROXIES to the number of reverse
+# proxies in front of the app to take client IPs from X-Forwarded-For.
+WRITORIA_RATE_LIMIT_ENABLED = True
+WRITORIA_RATE_LIMITS = {}
+WRITORIA_TRUSTED_PROXIES = 0
+
+# Sitemaps and Atom feeds (core.feeds): posts per sitemap file, entries per
+# feed, how long generated documents stay cached (saving a post invalidates
+# them sooner) and the max-age sent to crawlers and feed readers
+WRITORIA_SITEMAP_PAGE_SIZE = 10000
+WRITORIA_FEED_ITEMS = 20
+WRITORIA_FEED_CACHE_SECONDS = 3600
+WRITORIA_FEED_MAX_AGE = 300
+
+# Live comment/vote updates (core.live), served as server-sent events by the
+# ASGI app. LocalBroker only reaches streams in the publishing process; use
+# 'core.live.RedisBroker' (needs the redis package) with several workers or
+# when pages are served over WSGI.
+WRITORIA_LIVE_BROKER = 'core.live.LocalBroker'
+WRITORIA_LIVE_REDIS_URL = 'redis://localhost:6379/0'
+WRITORIA_LIVE_HEARTBEAT_SECONDS = 25
+WRITORIA_LIVE_QUEUE_SIZE = 64
+
+# Deleted posts are hidden at once and purged by core.deletion: dependents are
+# removed this many rows per transaction, pausing between chunks. Turn the
+# background thread off to purge only via `manage.py purge_deleted_posts`.
+WRITORIA_PURGE_IN_BACKGROUND = True
+WRITORIA_PURGE_CHUNK_SIZE = 500
+WRITORIA_PURGE_PAUSE_SECONDS = 0.05
+
+# Post revisions (core.revisions) are stored as compressed deltas, with a full
+# snapshot every this many revisions; a lower value rebuilds old revisions
+# faster at the cost of storage.
+WRITORIA_REVISION_SNAPSHOT_INTERVAL = 20
+
+# Search suggestions (core.typeahead) come from an in-memory index in each
+# process. Processes check this often whether the posts or users changed and
+# rebuild at least every MAX_AGE seconds for changes the check cannot see.
+WRITORIA_TYPEAHEAD_REFRESH_SECONDS = 5
+WRITORIA_TYPEAHEAD_MAX_AGE = 600
+
+# Near-duplicate comments and contact messages (core.duplicates) are folded or
+# refused before they are written: a submission at least this similar (0-1)
+# to one accepted from the same user or email in the window matches.
+WRITORIA_DUPLICATE_DETECTION_ENABLED = True
+WRITORIA_DUPLICATE_WINDOW_SECONDS = 600
+WRITORIA_DUPLICATE_MIN_SIMILARITY = 0.6
+
+# Contact form submissions (core.services.api) go to the Flask contact
+# service over HTTP by default. When Django runs beside it, the SQLAlchemy
+# transport (needs the sqlalchemy package) writes its database directly; the
+# URL must point at the database the service uses.
+WRITORIA_CONTACT_TRANSPORT = 'core.services.api.HTTPContactTransport'
+WRITORIA_CONTACT_API_URL = 'http://localhost:5000/api'
+WRITORIA_CONTACT_DATABASE_URL = 'sqlite:///' + str(BASE_DIR.parent / 'Flask' / 'flask_app' / 'instance' / 'database.db')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "writoria.settings")
 
 application = get_wsgi_application()
+
+# Imported once Django is set up; buffered post views are written when the worker exits
+from core import analytics  # noqa: E402
+
+analytics.flush_on_exit()
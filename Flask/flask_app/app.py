@@ -3,6 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from datetime import datetime
 import os
+import metrics
 
 app = Flask(__name__, instance_relative_config=True)
 
@@ -14,14 +15,22 @@ except OSError:
 
 # Configure SQLAlchemy to use the instance folder
 db_path = os.path.join(app.instance_path, 'database.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+# Django's in-process contact transport writes the same database; see
+# WRITORIA_CONTACT_DATABASE_URL there
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('CONTACT_DATABASE_URL', 'sqlite:///' + db_path)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['DEBUG'] = True
+# Who may scrape /metrics; see metrics.py
+app.config['METRICS_TOKEN'] = os.environ.get('WRITORIA_METRICS_TOKEN')
+app.config['METRICS_SCRAPE_ADDRESSES'] = [
+    address.strip() for address in os.environ.get('WRITORIA_METRICS_SCRAPE_ADDRESSES', '').split(',') if address.strip()
+]
 
 # Enable CORS for all domains in development
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
 db = SQLAlchemy(app)
+metrics.init_app(app)
 
 class Contact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -34,14 +43,17 @@ class Contact(db.Model):
 @app.route('/api/contact', methods=['POST'])
 def contact():
     try:
-        print("Received contact form submission")  # Debug print
-        data = request.get_json()
-        print(f"Request data: {data}")  # Debug print
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'message': 'Expected a JSON object'}), 400
         
-        if not all([data.get('name'), data.get('email'), data.get('message')]):
-            print("Missing required fields")  # Debug print
+        if not all(isinstance(data.get(field), str) and data[field] for field in ('name', 'email', 'message')):
+            app.logger.info("Contact submission missing required fields")
             return jsonify({'message': 'Name, email and message are required'}), 400
-            
+        if not isinstance(data.get('subject', ''), (str, type(None))):
+            return jsonify({'message': 'Subject must be text'}), 400
+
+        # Repeats are folded by the Django app's contact transport (core.duplicates) before they get here
         contact = Contact(
             name=data['name'],
             email=data['email'],
@@ -51,12 +63,12 @@ def contact():
         
         db.session.add(contact)
         db.session.commit()
-        print(f"Successfully saved contact: {contact.id}")  # Debug print
+        app.logger.debug("Saved contact %s", contact.id)
             
         return jsonify({'message': 'Message sent successfully'}), 201
     except Exception as e:
         db.session.rollback()
-        print(f"Error processing contact form: {str(e)}")
+        app.logger.exception("Error processing contact form")
         return jsonify({'message': f'An error occurred processing your request: {str(e)}'}), 500
 
 if __name__ == '__main__':
@@ -0,0 +1,149 @@
+"""
+Request metrics for the Flask API, exposed in the Prometheus text format.
+
+Mirrors the Django instrumentation middleware: per-endpoint latency
+histograms, SQL query counts/time and a slow request log.
+
+``/metrics`` answers scrapers sending ``Authorization: Bearer <token>`` with
+the app's ``METRICS_TOKEN`` (the ``WRITORIA_METRICS_TOKEN`` environment
+variable) and peers connecting from ``METRICS_SCRAPE_ADDRESSES``
+(``WRITORIA_METRICS_SCRAPE_ADDRESSES``, comma separated); anyone else gets
+a 404.
+"""
+
+import bisect
+import heapq
+import hmac
+import logging
+import threading
+import time
+
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_REQUEST_SECONDS = 0.5
+SLOW_REQUEST_TOP_QUERIES = 5
+
+logger = logging.getLogger('writoria.flask.performance')
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+HELP = {
+    'writoria_flask_request_duration_seconds': ('histogram', 'Time spent handling a request, by endpoint.'),
+    'writoria_flask_db_time_seconds': ('histogram', 'Time spent in SQL per request, by endpoint.'),
+    'writoria_flask_requests_total': ('counter', 'Requests handled, by endpoint and status code.'),
+    'writoria_flask_db_queries_total': ('counter', 'SQL queries issued, by endpoint.'),
+}
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+def observe(name, labels, amount):
+    index = bisect.bisect_left(BUCKETS, amount)
+    with _lock:
+        state = _histograms.setdefault((name, labels), [[0] * len(BUCKETS), 0, 0.0])
+        if index < len(BUCKETS):
+            state[0][index] += 1
+        state[1] += 1
+        state[2] += amount
+
+
+def inc(name, labels, amount=1):
+    with _lock:
+        _counters[(name, labels)] = _counters.get((name, labels), 0) + amount
+
+
+def render():
+    lines = []
+    with _lock:
+        histograms = sorted((key, (list(s[0]), s[1], s[2])) for key, s in _histograms.items())
+        counters = sorted(_counters.items())
+    for name, (kind, documentation) in sorted(HELP.items()):
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            for (metric, labels), (buckets, count, total) in histograms:
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS, buckets):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", repr(bound)),))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {count}')
+                lines.append(f'{name}_count{_labels(labels)} {count}')
+                lines.append(f'{name}_sum{_labels(labels)} {total}')
+        else:
+            for (metric, labels), value in counters:
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('writoria_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['writoria_query_start'].pop()
+    sql = g.get('writoria_sql') if has_request_context() else None
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += elapsed
+        # Only the slowest are logged, so only they are held: a min-heap on duration
+        slowest = sql[2]
+        if len(slowest) < SLOW_REQUEST_TOP_QUERIES:
+            heapq.heappush(slowest, (elapsed, statement))
+        elif elapsed > slowest[0][0]:
+            heapq.heapreplace(slowest, (elapsed, statement))
+
+
+def _scrape_allowed(app):
+    token = app.config.get('METRICS_TOKEN')
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if token and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), token.encode()):
+        return True
+    return request.remote_addr in app.config.get('METRICS_SCRAPE_ADDRESSES', ())
+
+
+def init_app(app):
+    @app.before_request
+    def _start_timer():
+        g.writoria_start = time.perf_counter()
+        # [queries, seconds, slowest (seconds, sql)]
+        g.writoria_sql = [0, 0.0, []]
+
+    @app.after_request
+    def _record(response):
+        start = g.get('writoria_start')
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unresolved'
+        query_count, sql_time, slowest = g.get('writoria_sql', (0, 0.0, []))
+
+        observe('writoria_flask_request_duration_seconds', (('endpoint', endpoint), ('method', request.method)), elapsed)
+        observe('writoria_flask_db_time_seconds', (('endpoint', endpoint),), sql_time)
+        inc('writoria_flask_requests_total', (('endpoint', endpoint), ('status', response.status_code)))
+        inc('writoria_flask_db_queries_total', (('endpoint', endpoint),), query_count)
+
+        if elapsed >= app.config.get('SLOW_REQUEST_SECONDS', SLOW_REQUEST_SECONDS):
+            logger.warning(
+                'Slow request %s %s took %.1fms: %d queries in %.1fms%s',
+                request.method, request.path, elapsed * 1000, query_count, sql_time * 1000,
+                ''.join(f'\n  {duration * 1000:.1f}ms {sql}' for duration, sql in sorted(slowest, reverse=True)),
+            )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        if not _scrape_allowed(app):
+            abort(404)
+        return Response(render(), content_type='text/plain; version=0.0.4; charset=utf-8')